@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Author, Series, Tag, Article
+from .models import Author, Series, Tag, Article, ImageJob, get_latest_series
 
 # Register your models here.
 admin.site.register(Author)
@@ -19,7 +19,20 @@ class ArticleAdmin(admin.ModelAdmin):
     list_display = ('slug', 'series', 'author', 'publish_date', 'date_modified', "enabled")
     fields = ('title', 'enabled','series', 'shortline', 'author', 
         'publish_date', 'tags', 'image_raw', 'image_full', 'image_thumbnail', 
-        'image_thumbnail_transparent', 'audio', 'content',)
+        'image_thumbnail_transparent', 'images_pending', 'audio', 'content',)
+    readonly_fields = ('images_pending',)
     filter_horizontal = ['tags']
     list_filter = ('series', 'enabled', 'author', 'publish_date', 'date_modified', 'tags')
     #inlines = [TagInline, SeriesInline]
+
+    def get_changeform_initial_data(self, request):
+        # New Articles go in the latest Series unless another is chosen.
+        initial = super().get_changeform_initial_data(request)
+        initial.setdefault("series", get_latest_series())
+        return initial
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('model', 'object_id', 'status', 'attempts', 'date_created', 'date_started', 'date_finished')
+    list_filter = ('status', 'model')
+    readonly_fields = ('model', 'object_id', 'attempts', 'error', 'date_created', 'date_started', 'date_finished')
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class ArticlesConfig(AppConfig):
     name = 'articles'
+
+    def ready(self):
+        """
+        Connects the signal receivers in `articles.signals`.
+        """
+
+        #pylint: disable=W0611
+        from . import signals
@@ -0,0 +1,335 @@
+import time
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from functools import wraps
+from typing import Union
+
+CONTENT_VERSION_KEY = "articles:content_version"
+CONTENT_CHANGED_KEY = "articles:content_changed"
+PAGE_CACHE_HITS_KEY = "articles:page_cache:hits"
+PAGE_CACHE_MISSES_KEY = "articles:page_cache:misses"
+
+
+def _new_content_version() -> int:
+    """
+    Returns a fresh content version, based on the current time in ms.
+
+    Versions are seeded from the clock rather than starting at 1, so that a
+    version lost to cache eviction or a restart can never be reused and
+    match entries cached under the old one.
+
+    Returns:
+        int: A new content version.
+    """
+
+    return int(time.time() * 1000)
+
+def get_content_version() -> int:
+    """
+    Returns the current content version.
+
+    The content version changes whenever an Article, Series, or Author is
+    saved or deleted. Anything cached from the database should include the
+    version in its key, so that changing content makes the old entries
+    unreachable instead of having to find and delete them.
+
+    Returns:
+        int: The current content version.
+    """
+
+    return get_version(CONTENT_VERSION_KEY)
+
+def bump_content_version():
+    """
+    Changes the content version, invalidating everything keyed by it.
+
+    The time of the change is kept as well, for `Last-Modified`.
+    """
+
+    bump_version(CONTENT_VERSION_KEY)
+    cache.set(CONTENT_CHANGED_KEY, int(time.time()), None)
+
+def get_version(key: str) -> int:
+    """
+    Returns the version kept in the cache under `key`, creating it if needed.
+
+    Like the content version, but for caches that should only be
+    invalidated by some changes, such as the feeds of one Series.
+
+    Args:
+        key (str): The cache key of the version.
+
+    Returns:
+        int: The current version.
+    """
+
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_content_version(), None)
+        version = cache.get(key, _new_content_version())
+    return version
+
+def bump_version(key: str):
+    """
+    Changes the version kept in the cache under `key`.
+
+    Args:
+        key (str): The cache key of the version.
+    """
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The key was evicted or never set.
+        cache.set(key, _new_content_version(), None)
+
+def seconds_until(moment: Union[datetime.datetime, None], default: int) -> int:
+    """
+    Returns how many seconds cached content is allowed to live.
+
+    Visible content changes on its own when a scheduled Article's
+    `publish_date` passes, so anything depending on the visible Articles
+    must not be cached past that point.
+
+    Args:
+        moment (Union[datetime.datetime, None]): The time the cached content
+            will go stale, usually the next scheduled `publish_date`. None if
+            nothing is scheduled.
+        default (int): The timeout to use if `moment` is None or further
+            away than this.
+
+    Returns:
+        int: The timeout, in seconds. At least 1.
+    """
+
+    from .models import now
+
+    if moment is None:
+        return default
+    remaining = int((moment - now()).total_seconds()) + 1
+    return max(1, min(default, remaining))
+
+def get_page_state(request) -> dict:
+    """
+    Returns what every page's freshness is derived from, with one query.
+
+    A single aggregate over the enabled Articles finds the newest
+    `date_modified` and `publish_date` of the visible ones, how many are
+    visible, and the next scheduled `publish_date`. Together with the 
+    content version these change whenever any page could, including when a
+    scheduled Article becomes visible without anything being saved. The
+    result is cached under the content version until the next scheduled 
+    `publish_date`, and memoized on the request.
+
+    Args:
+        request (HttpRequest): The current request.
+
+    Returns:
+        dict: The `etag` (a weak ETag), `last_modified` (a timestamp, or 
+            None if there's no content) and `next_publish` (a datetime, or 
+            None).
+    """
+
+    from django.db.models import Count, Max, Min, Q
+    from .models import Article, now
+
+    state = getattr(request, "_page_state", None)
+    if state is not None:
+        return state
+
+    version = get_content_version()
+    key = "articles:page_state:{0}".format(version)
+    state = cache.get(key)
+    if state is None:
+        moment = now()
+        visible = Q(publish_date__lte=moment)
+        #pylint: disable=E1101
+        aggregate = Article.objects.filter(enabled=True).aggregate(
+            modified = Max("date_modified", filter=visible),
+            published = Max("publish_date", filter=visible),
+            count = Count("pk", filter=visible),
+            next_publish = Min("publish_date", filter=~visible)
+        )
+        validator = "{0}:{1}:{2}:{3}".format(
+            version,
+            aggregate["modified"] and aggregate["modified"].isoformat(),
+            aggregate["published"] and aggregate["published"].isoformat(),
+            aggregate["count"]
+        )
+        times = [
+            int(t.timestamp()) for t in (aggregate["modified"], aggregate["published"]) 
+            if t is not None
+        ]
+        changed = cache.get(CONTENT_CHANGED_KEY)
+        if changed is not None:
+            times.append(changed)
+        state = {
+            "etag": 'W/"{0}"'.format(hashlib.md5(validator.encode()).hexdigest()),
+            "last_modified": max(times) if times else None,
+            "next_publish": aggregate["next_publish"],
+        }
+        cache.set(key, state, seconds_until(
+            state["next_publish"],
+            getattr(settings, "PAGE_CACHE_TIMEOUT", 300) or 300
+        ))
+    request._page_state = state
+    return state
+
+def conditional_page(view):
+    """
+    Decorator adding validators and a `Cache-Control` policy to a view.
+
+    The `ETag` and `Last-Modified` come from `get_page_state`, so they're
+    found with one aggregate query before the view runs, and a matching
+    `If-None-Match` or `If-Modified-Since` gets a 304 without the view being
+    run at all. Since every page shows the latest Articles in its sidebar,
+    all pages share the same validators.
+
+    Anonymous responses are marked `public`, with a `max-age` for browsers
+    set by `PAGE_MAX_AGE` in settings (defaulting to 0, so browsers always
+    revalidate) and an `s-maxage` for shared caches such as a CDN of
+    `PAGE_CACHE_TIMEOUT`, capped at the next scheduled `publish_date`. 
+    Responses to logged in users are `private`. All vary on `Cookie`.
+
+    Args:
+        view: The view function to wrap.
+
+    Returns:
+        The wrapped view function.
+    """
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        from django.utils.cache import (get_conditional_response, 
+            patch_cache_control, patch_vary_headers)
+        from django.utils.http import http_date
+
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+        state = get_page_state(request)
+        response = get_conditional_response(
+            request,
+            etag = state["etag"],
+            last_modified = state["last_modified"]
+        )
+        if response is None:
+            response = view(request, *args, **kwargs)
+        if response.status_code not in (200, 304):
+            return response
+
+        response["ETag"] = state["etag"]
+        if state["last_modified"] is not None:
+            response["Last-Modified"] = http_date(state["last_modified"])
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response,
+                public = True,
+                max_age = getattr(settings, "PAGE_MAX_AGE", 0),
+                s_maxage = seconds_until(
+                    state["next_publish"],
+                    getattr(settings, "PAGE_CACHE_TIMEOUT", 300)
+                )
+            )
+        patch_vary_headers(response, ("Cookie",))
+        return response
+
+    return wrapped
+
+def _count(key: str):
+    """
+    Increments a counter kept in the cache, creating it if needed.
+    """
+
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between the add and the incr.
+            cache.set(key, 1, None)
+
+def get_page_cache_stats() -> dict:
+    """
+    Returns how often `cache_anonymous_page` has been hit and missed.
+
+    The counters are kept in the cache, so they cover every process sharing
+    it, and restart from 0 if they are evicted.
+
+    Returns:
+        dict: The counts, as `hits` and `misses`.
+    """
+
+    return {
+        "hits": cache.get(PAGE_CACHE_HITS_KEY, 0),
+        "misses": cache.get(PAGE_CACHE_MISSES_KEY, 0),
+    }
+
+def reset_page_cache_stats():
+    """
+    Sets the page cache's hit and miss counters back to 0.
+    """
+
+    cache.delete_many([PAGE_CACHE_HITS_KEY, PAGE_CACHE_MISSES_KEY])
+
+def cache_anonymous_page(view):
+    """
+    Decorator caching a view's whole response for anonymous visitors.
+
+    Responses are keyed by the content version and the full path, including
+    the query string (so each `?page=` is its own entry), which means saving
+    or deleting any Article, Series, or Author invalidates every page. The
+    timeout may be set with `PAGE_CACHE_TIMEOUT` in settings, defaulting to
+    300 seconds, or 0 to turn the cache off. Like the site chrome, it is
+    always capped at the next scheduled `publish_date`.
+
+    Only successful GET and HEAD responses which don't set cookies are
+    cached, and logged in users always get a fresh page, as do requests
+    with a true `skip_page_cache` attribute, such as those of
+    `build_static`, which renders each page once. Every response
+    gets an `X-Page-Cache` header of "HIT" or "MISS", and the counts are
+    kept for `get_page_cache_stats`.
+
+    Args:
+        view: The view function to wrap.
+
+    Returns:
+        The wrapped view function.
+    """
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        timeout = getattr(settings, "PAGE_CACHE_TIMEOUT", 300)
+        user = getattr(request, "user", None)
+        if timeout <= 0 or request.method not in ("GET", "HEAD") \
+                or (user is not None and user.is_authenticated) \
+                or getattr(request, "skip_page_cache", False):
+            return view(request, *args, **kwargs)
+
+        key = "articles:page:{0}:{1}".format(
+            get_content_version(),
+            hashlib.md5(request.get_full_path().encode()).hexdigest()
+        )
+        response = cache.get(key)
+        if response is not None:
+            _count(PAGE_CACHE_HITS_KEY)
+            response["X-Page-Cache"] = "HIT"
+            return response
+
+        _count(PAGE_CACHE_MISSES_KEY)
+        response = view(request, *args, **kwargs)
+        response["X-Page-Cache"] = "MISS"
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return response
+        timeout = seconds_until(get_page_state(request)["next_publish"], timeout)
+        if hasattr(response, "render") and callable(response.render):
+            response.add_post_render_callback(lambda r: cache.set(key, r, timeout))
+        else:
+            cache.set(key, response, timeout)
+        return response
+
+    return wrapped
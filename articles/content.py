@@ -0,0 +1,230 @@
+import hashlib
+import html
+import json
+import re
+
+from django.conf import settings
+from django.utils.text import slugify
+from html.parser import HTMLParser
+
+# Change whenever `render_content` changes what it outputs, so that
+# `render_content` the management command re-renders every Article.
+PIPELINE_VERSION = 2
+
+# Tags kept in rendered content. Any other tag is removed, but what's inside
+# it is kept, unless the tag is in `DROPPED_TAGS`.
+ALLOWED_TAGS = {
+    "a", "abbr", "audio", "b", "blockquote", "br", "caption", "cite", "code",
+    "dd", "del", "div", "dl", "dt", "em", "figcaption", "figure", "h1", "h2",
+    "h3", "h4", "h5", "h6", "hr", "i", "img", "ins", "kbd", "li", "mark",
+    "ol", "p", "pre", "q", "s", "small", "source", "span", "strong", "sub",
+    "sup", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "u", "ul",
+    "video",
+}
+
+# Tags removed along with everything inside them.
+DROPPED_TAGS = {"script", "style", "iframe", "object", "embed", "template", "noscript"}
+
+# Attributes kept on every allowed tag, and those kept only on some.
+GLOBAL_ATTRIBUTES = {"id", "class", "title", "lang", "dir"}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "rel", "target"},
+    "img": {"src", "alt", "width", "height", "loading", "srcset", "sizes"},
+    "audio": {"src", "controls", "preload", "loop"},
+    "video": {"src", "controls", "preload", "loop", "poster", "width", "height"},
+    "source": {"src", "type", "srcset", "media"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan", "scope"},
+    "ol": {"start", "reversed"},
+}
+
+# Attributes holding URLs, which must use an allowed scheme.
+URL_ATTRIBUTES = {"href", "src", "poster"}
+ALLOWED_SCHEMES = {"http", "https", "mailto"}
+
+HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+VOID_TAGS = {"br", "hr", "img", "source"}
+SCHEME_RE = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.-]*):")
+# Browsers ignore tabs and newlines anywhere in a URL, and control
+# characters around it, so "java&#x09;script:" is "javascript:". All control
+# characters are removed from URLs before their scheme is checked.
+URL_CONTROL_RE = re.compile(r"[\x00-\x1f\x7f]")
+
+
+def get_media_url_rewrite() -> tuple:
+    """
+    Returns the prefix media URLs in content are rewritten from, and to.
+
+    Set `CONTENT_MEDIA_URL` to serve media linked from Articles from
+    somewhere else, such as a CDN; links starting with `MEDIA_URL` are
+    rewritten to start with it instead.
+
+    Returns:
+        tuple: `MEDIA_URL` and `CONTENT_MEDIA_URL`, or (None, None) if media
+            URLs are left alone.
+    """
+
+    target = getattr(settings, "CONTENT_MEDIA_URL", None)
+    source = getattr(settings, "MEDIA_URL", None)
+    if not target or not source:
+        return None, None
+    return source, target
+
+def content_hash(content: str) -> str:
+    """
+    Returns a hash of `content` and everything that changes how it renders.
+
+    Args:
+        content (str): The raw HTML of an Article.
+
+    Returns:
+        str: A SHA-256 hex digest.
+    """
+
+    data = json.dumps([PIPELINE_VERSION, content, get_media_url_rewrite()])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class ContentRenderer(HTMLParser):
+    """
+    Renders the HTML of an Article for display. See `render_content`.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.out = []
+        self.dropping = 0
+        self.heading = None
+        self.ids = set()
+        self.media_from, self.media_to = get_media_url_rewrite()
+
+    def clean_url(self, value: str) -> str:
+        """
+        Returns `value`, rewritten if it's a media URL, or None if it uses a
+        scheme that isn't allowed, such as "javascript:".
+
+        Control characters, such as tabs and newlines, are removed first, so
+        the scheme is checked as a browser would read it.
+        """
+
+        value = URL_CONTROL_RE.sub("", value).strip()
+        scheme = SCHEME_RE.match(value)
+        if scheme and scheme.group(1).lower() not in ALLOWED_SCHEMES:
+            return None
+        if self.media_from and value.startswith(self.media_from):
+            value = self.media_to + value[len(self.media_from):]
+        return value
+
+    def clean_attrs(self, tag: str, attrs: list) -> dict:
+        allowed = GLOBAL_ATTRIBUTES | ALLOWED_ATTRIBUTES.get(tag, set())
+        cleaned = {}
+        for name, value in attrs:
+            name = name.lower()
+            if name not in allowed:
+                continue
+            value = "" if value is None else value
+            if name in URL_ATTRIBUTES:
+                value = self.clean_url(value)
+                if value is None:
+                    continue
+            elif name == "srcset" and self.media_from:
+                value = value.replace(self.media_from, self.media_to)
+            cleaned[name] = value
+        if tag == "img":
+            cleaned.setdefault("loading", "lazy")
+        if tag == "a" and cleaned.get("target") == "_blank":
+            cleaned["rel"] = "noopener noreferrer"
+        if "id" in cleaned:
+            self.ids.add(cleaned["id"])
+        return cleaned
+
+    def format_tag(self, tag: str, attrs: dict, close: bool = False) -> str:
+        parts = [tag] + [
+            '{0}="{1}"'.format(name, html.escape(value, quote=True))
+            for name, value in attrs.items()
+        ]
+        return "<{0}{1}>".format(" ".join(parts), " /" if close else "")
+
+    def write(self, text: str):
+        if self.dropping:
+            return
+        self.out.append(text)
+        if self.heading is not None:
+            self.heading["text"].append(text)
+
+    def handle_starttag(self, tag, attrs, close=False):
+        if tag in DROPPED_TAGS:
+            if not close:
+                self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        attrs = self.clean_attrs(tag, attrs)
+        if tag in HEADINGS and "id" not in attrs and self.heading is None and not close:
+            # The id comes from the heading's text, which hasn't been read
+            # yet, so the tag is written once the heading ends.
+            self.heading = {"tag": tag, "attrs": attrs, "index": len(self.out), "text": []}
+            self.out.append("")
+            return
+        self.write(self.format_tag(tag, attrs, close=close and tag in VOID_TAGS))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, close=True)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(0, self.dropping - 1)
+            return
+        if self.dropping or tag not in ALLOWED_TAGS or tag in VOID_TAGS:
+            return
+        if self.heading is not None and tag == self.heading["tag"]:
+            heading, self.heading = self.heading, None
+            text = re.sub(r"<[^>]*>", "", "".join(heading["text"]))
+            base = slugify(html.unescape(text)) or "section"
+            anchor = base
+            number = 2
+            while anchor in self.ids:
+                anchor = "{0}-{1}".format(base, number)
+                number += 1
+            self.ids.add(anchor)
+            heading["attrs"]["id"] = anchor
+            self.out[heading["index"]] = self.format_tag(tag, heading["attrs"])
+        self.write("</{0}>".format(tag))
+
+    def handle_data(self, data):
+        self.write(data.replace("<", "&lt;").replace(">", "&gt;"))
+
+    def handle_entityref(self, name):
+        self.write("&{0};".format(name))
+
+    def handle_charref(self, name):
+        self.write("&#{0};".format(name))
+
+    def render(self, content: str) -> str:
+        self.feed(content)
+        self.close()
+        if self.heading is not None:
+            # An unclosed heading keeps its tag, without an id.
+            self.out[self.heading["index"]] = self.format_tag(
+                self.heading["tag"], self.heading["attrs"]
+            )
+        return "".join(self.out)
+
+def render_content(content: str) -> str:
+    """
+    Renders the HTML of an Article for display.
+
+    Run when an Article is saved, rather than on every request. Tags and
+    attributes not in the allowed lists are removed, as are comments,
+    scripts, styles and embedded frames, and URLs using schemes such as
+    "javascript:". Images load lazily, headings get an `id` to link to, and
+    media URLs are rewritten to `CONTENT_MEDIA_URL` if it's set.
+
+    Args:
+        content (str): The raw HTML of an Article.
+
+    Returns:
+        str: The HTML to display.
+    """
+
+    return ContentRenderer().render(content or "")
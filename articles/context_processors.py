@@ -1,10 +1,99 @@
-from django.utils import timezone
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache
 from django.http.request import HttpRequest
 from django.conf import settings
 
+from .caching import get_content_version, seconds_until
 from .models import Article, Series
 
+WYVERNS_SERIES_NAME = "Wyverns and Whimsy"
+ABOUT_ME_TITLE = "About Me"
+PORTFOLIO_TITLE = "Portfolio"
+
+def _build_site_chrome() -> dict:
+    """
+    Queries everything the navigation, sidebar, and midbar need.
+
+    The sidebar Articles are loaded together with their Series, so rendering
+    their URLs does not cost a query per Article. Their content is deferred
+    since it is never shown in the chrome and only bloats the cache entry.
+
+    Returns:
+        dict: The full context for `site_chrome`.
+    """
+
+    #pylint: disable=E1101
+    latest_articles = list(
+        Article.get_available_articles().select_related("series").defer(
+            "content"
+        )[:5]
+    )
+    nav_articles = {
+        a.title: a.get_absolute_url()
+        for a in Article.objects.select_related("series").filter(
+            title__in = [ABOUT_ME_TITLE, PORTFOLIO_TITLE]
+        ).only("title", "slug", "series__slug")
+    }
+    wyverns = Series.objects.filter(name=WYVERNS_SERIES_NAME).first()
+
+    return {
+        "latest_articles": latest_articles if latest_articles else "",
+        "latest_article": latest_articles[0] if latest_articles else "",
+        "wyverns_link": wyverns.get_absolute_url() if wyverns else "#",
+        "about_link": nav_articles.get(ABOUT_ME_TITLE, "#"),
+        "portfolio_link": nav_articles.get(PORTFOLIO_TITLE, "#"),
+    }
+
+def get_site_chrome(request: HttpRequest) -> dict:
+    """
+    Returns the context shared by every page: nav links and latest Articles.
+
+    The result is cached under the current content version, so it is built
+    at most once per content change (or scheduled publish) across all
+    processes sharing the cache, and is memoized on the request so the
+    individual context processors below share a single cache lookup.
+
+    The cache timeout may be set with `SITE_CHROME_CACHE_TIMEOUT` in 
+    settings, and defaults to 300 seconds. It is always capped at the next
+    scheduled `publish_date`, so new Articles appear on time.
+    
+    Args:
+        request (HttpRequest): The incoming request.
+
+    Returns:
+        dict: The keys of `latest_articles`, `wyverns_and_whimsy_link`,
+            `about_me_link`, and `portfolio_link` combined.
+    """
+
+    chrome = getattr(request, "_site_chrome", None)
+    if chrome is None:
+        key = "articles:site_chrome:{0}".format(get_content_version())
+        chrome = cache.get(key)
+        if chrome is None:
+            chrome = _build_site_chrome()
+            timeout = seconds_until(
+                Article.get_next_publish_date(),
+                getattr(settings, "SITE_CHROME_CACHE_TIMEOUT", 300)
+            )
+            cache.set(key, chrome, timeout)
+        request._site_chrome = chrome
+    return chrome
+
+def site_chrome(request: HttpRequest) -> dict:
+    """
+    Adds the nav links, latest articles, and latest article to context.
+
+    This replaces `latest_articles`, `wyverns_and_whimsy_link`, 
+    `about_me_link`, and `portfolio_link` with a single context processor.
+    
+    Args:
+        request (HttpRequest): The incoming request.
+
+    Returns:
+        dict: See `get_site_chrome`.
+    """
+
+    return dict(get_site_chrome(request))
+
 def latest_articles(request: HttpRequest) -> dict:
     """
     Gets the newest five articles and the absolute newest article.
@@ -18,16 +107,9 @@ def latest_articles(request: HttpRequest) -> dict:
             if they exist. Otherwise each are empty strings.
     """
 
-    #pylint: disable=E1101
-    try:
-        latest_articles = Article.get_available_articles()[:5]
-        latest_article = latest_articles[0]
-    except IndexError:
-        latest_articles = ""
-        latest_article = ""
-
-    return {"latest_articles": latest_articles, 
-            "latest_article": latest_article}
+    chrome = get_site_chrome(request)
+    return {"latest_articles": chrome["latest_articles"], 
+            "latest_article": chrome["latest_article"]}
 
 def site_title(request: HttpRequest) -> dict:
     """
@@ -61,12 +143,7 @@ def wyverns_and_whimsy_link(request: HttpRequest) -> dict:
             an octothorpe.
     """
 
-    #pylint: disable=E1101
-    try:
-        w = Series.objects.get(name="Wyverns and Whimsy")
-    except ObjectDoesNotExist:
-        return {"wyverns_link": "#"}
-    return {"wyverns_link": w.get_absolute_url()}
+    return {"wyverns_link": get_site_chrome(request)["wyverns_link"]}
 
 def about_me_link(request: HttpRequest) -> dict:
     """
@@ -80,12 +157,7 @@ def about_me_link(request: HttpRequest) -> dict:
             `about_link`, if it exists. Otherwise an octothorpe.
     """
 
-    #pylint: disable=E1101
-    try:
-        a = Article.objects.get(title="About Me")
-    except ObjectDoesNotExist:
-        return {"about_link": "#"}
-    return {"about_link": a.get_absolute_url()}
+    return {"about_link": get_site_chrome(request)["about_link"]}
 
 def portfolio_link(request: HttpRequest) -> dict:
     """
@@ -99,9 +171,4 @@ def portfolio_link(request: HttpRequest) -> dict:
             `portfolio_link`, if it exists. Otherwise an octothorpe.
     """
 
-    #pylint: disable=E1101
-    try:
-        a = Article.objects.get(title="Portfolio")
-    except ObjectDoesNotExist:
-        return {"portfolio_link": "#"}
-    return {"portfolio_link": a.get_absolute_url()}
\ No newline at end of file
+    return {"portfolio_link": get_site_chrome(request)["portfolio_link"]}
\ No newline at end of file
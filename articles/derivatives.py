@@ -0,0 +1,242 @@
+import datetime
+import logging
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.utils import timezone
+from typing import Union
+
+SYNC = "sync"
+THREAD = "thread"
+WORKER = "worker"
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+def get_executor() -> str:
+    """
+    Returns the name of the configured executor.
+
+    The executor is set with `IMAGE_DERIVATIVE_EXECUTOR` in settings:
+
+        "sync": Images are created while the model is saved. Meant for
+            tests and scripts.
+        "thread" (default): An `ImageJob` is queued, and run by a small
+            thread pool in the same process once the save is committed. The
+            pool size is set by `IMAGE_DERIVATIVE_THREADS`, defaulting to 2.
+        "worker": An `ImageJob` is queued and left for a separate worker
+            process, run with `python3 manage.py process_image_jobs`.
+
+    Jobs are always stored in the database, so anything a thread pool did
+    not get to (say, because the server restarted) can still be picked up
+    by `process_image_jobs`, including jobs left running; see
+    `requeue_stalled_jobs`.
+
+    Returns:
+        str: One of `SYNC`, `THREAD` or `WORKER`.
+    """
+
+    return getattr(settings, "IMAGE_DERIVATIVE_EXECUTOR", THREAD)
+
+def is_synchronous() -> bool:
+    """
+    Returns whether images should be created while the model is saved.
+
+    Returns:
+        bool: True if the `SYNC` executor is configured.
+    """
+
+    return get_executor() == SYNC
+
+def get_job_timeout() -> float:
+    """
+    Returns how many seconds a job may run before it's thought to have died.
+
+    Set with `IMAGE_JOB_TIMEOUT` in settings, defaulting to 600.
+
+    Returns:
+        float: The number of seconds.
+    """
+
+    return getattr(settings, "IMAGE_JOB_TIMEOUT", 600)
+
+def _stalled_jobs() -> models.QuerySet:
+    """
+    Returns the jobs which have been `RUNNING` for longer than the timeout.
+    """
+
+    #pylint: disable=E1101
+    ImageJob = apps.get_model("articles", "ImageJob")
+    started_before = timezone.now() - datetime.timedelta(seconds=get_job_timeout())
+    return ImageJob.objects.filter(status=ImageJob.RUNNING).filter(
+        models.Q(date_started__lt=started_before) | models.Q(date_started__isnull=True)
+    )
+
+def requeue_stalled_jobs() -> int:
+    """
+    Moves jobs which have been `RUNNING` for longer than `get_job_timeout`
+    back to `PENDING`, so they're run again.
+
+    A job stays `RUNNING` if whatever ran it died part way, such as a
+    thread pool when the server restarts.
+
+    Returns:
+        int: How many jobs were queued again.
+    """
+
+    #pylint: disable=E1101
+    ImageJob = apps.get_model("articles", "ImageJob")
+    return _stalled_jobs().update(status=ImageJob.PENDING)
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers = getattr(settings, "IMAGE_DERIVATIVE_THREADS", 2),
+            thread_name_prefix = "image-derivatives"
+        )
+    return _pool
+
+def enqueue(instance: models.Model) -> Union[models.Model, None]:
+    """
+    Queues an `ImageJob` for `instance`, unless one is already waiting.
+
+    A job which has been running for longer than `get_job_timeout` doesn't
+    count; it's marked `FAILED` and a new one is queued. With the `THREAD`
+    executor, the job is also handed to the thread pool as soon as the
+    current transaction commits.
+
+    Args:
+        instance (models.Model): A saved Author, Series, or Article.
+
+    Returns:
+        Union[ImageJob, None]: The new job, or None if the instance already
+            had one pending or running.
+    """
+
+    #pylint: disable=E1101
+    ImageJob = apps.get_model("articles", "ImageJob")
+    label = instance._meta.label_lower
+    _stalled_jobs().filter(model=label, object_id=instance.pk).update(
+        status = ImageJob.FAILED,
+        error = "Still running after {0} seconds.".format(get_job_timeout()),
+        date_finished = timezone.now()
+    )
+    waiting = ImageJob.objects.filter(
+        model = label,
+        object_id = instance.pk,
+        status__in = [ImageJob.PENDING, ImageJob.RUNNING]
+    )
+    if waiting.exists():
+        return None
+    job = ImageJob.objects.create(model=label, object_id=instance.pk)
+    if get_executor() == THREAD:
+        transaction.on_commit(lambda: _get_pool().submit(_run_in_thread, job.pk))
+    return job
+
+def _run_in_thread(job_pk: int):
+    try:
+        run_job(job_pk)
+    except Exception:
+        logger.exception("Image job %s failed", job_pk)
+    finally:
+        # Connections are per thread; don't leave this one open.
+        connections.close_all()
+
+def run_job(job_pk: int) -> bool:
+    """
+    Claims and runs a single pending `ImageJob`.
+
+    A job is claimed by moving it from `PENDING` to `RUNNING` in a single
+    conditional update, so several workers may safely share one queue. When
+    it was claimed is kept in `date_started`.
+
+    Args:
+        job_pk (int): The primary key of the job.
+
+    Returns:
+        bool: True if this call ran the job, False if another worker had
+            already claimed it.
+    """
+
+    # Imported here since models imports this module.
+    from .models import create_images
+
+    #pylint: disable=E1101
+    ImageJob = apps.get_model("articles", "ImageJob")
+    claimed = ImageJob.objects.filter(
+        pk = job_pk,
+        status = ImageJob.PENDING
+    ).update(
+        status = ImageJob.RUNNING,
+        attempts = models.F("attempts") + 1,
+        date_started = timezone.now()
+    )
+    if not claimed:
+        return False
+
+    job = ImageJob.objects.get(pk=job_pk)
+    try:
+        model = apps.get_model(job.model)
+        instance = model.objects.filter(pk=job.object_id).first()
+        if instance is not None and instance.image_raw:
+            create_images(instance)
+            instance.images_pending = False
+            instance.save(update_fields=[
+                "image_thumbnail",
+                "image_thumbnail_transparent",
+                "image_full",
+                "image_hash",
+                "images_pending"
+            ])
+    except Exception:
+        job.status = ImageJob.FAILED
+        job.error = traceback.format_exc()
+        job.date_finished = timezone.now()
+        job.save(update_fields=["status", "error", "date_finished"])
+        raise
+    job.status = ImageJob.DONE
+    job.error = ""
+    job.date_finished = timezone.now()
+    job.save(update_fields=["status", "error", "date_finished"])
+    return True
+
+def run_pending_jobs(limit: Union[int, None] = None) -> int:
+    """
+    Runs pending jobs, oldest first, until none are left or `limit` is hit.
+
+    Stalled jobs are queued again first (see `requeue_stalled_jobs`).
+    Failed jobs are logged and skipped.
+
+    Args:
+        limit (Union[int, None], optional): Defaults to None. The most jobs
+            to run. None for no limit.
+
+    Returns:
+        int: How many jobs were run, whether they succeeded or not.
+    """
+
+    #pylint: disable=E1101
+    ImageJob = apps.get_model("articles", "ImageJob")
+    requeued = requeue_stalled_jobs()
+    if requeued:
+        logger.warning("Queued %s stalled image job(s) again", requeued)
+    ran = 0
+    while limit is None or ran < limit:
+        job_pk = ImageJob.objects.filter(
+            status = ImageJob.PENDING
+        ).values_list("pk", flat=True).first()
+        if job_pk is None:
+            break
+        try:
+            if not run_job(job_pk):
+                continue
+        except Exception:
+            logger.exception("Image job %s failed", job_pk)
+        ran += 1
+    return ran
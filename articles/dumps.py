@@ -0,0 +1,91 @@
+import json
+
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from typing import Iterator, TextIO
+
+# How many characters are read from a dump at a time.
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_dump(file: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Yields the objects of a JSON data dump one at a time.
+
+    Both the JSON array written by `dumpdata` and newline delimited JSON,
+    with one object per line, are read. The dump is decoded a chunk at a
+    time, so only one object needs to be in memory at once, however large
+    the dump is.
+
+    Args:
+        file (TextIO): The dump, opened as text.
+        chunk_size (int, optional): Defaults to `CHUNK_SIZE`. How many
+            characters to read at a time.
+
+    Raises:
+        ValueError: Raised if the dump isn't valid JSON.
+
+    Yields:
+        dict: Each object in the dump, such as {"model": "articles.article",
+            "pk": 1, "fields": {...}}.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+
+    def fill() -> bool:
+        nonlocal buffer, position
+        chunk = file.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        return bool(chunk)
+
+    def skip(characters: str) -> bool:
+        # Moves past whitespace and `characters`, reading more as needed;
+        # returns False at the end of the file.
+        nonlocal position
+        while True:
+            while position < len(buffer) and (
+                    buffer[position].isspace() or buffer[position] in characters):
+                position += 1
+            if position < len(buffer) or not fill():
+                return position < len(buffer)
+
+    if not skip(""):
+        return
+    in_array = buffer[position] == "["
+    if in_array:
+        position += 1
+    while skip(","):
+        if in_array and buffer[position] == "]":
+            return
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # The object runs past the end of the buffer.
+                if not fill():
+                    raise
+                continue
+            break
+        position = end
+        yield obj
+
+def dump_objects(instances: list) -> Iterator[str]:
+    """
+    Yields each instance as a line of newline delimited JSON.
+
+    Objects are written the way `dumpdata` writes them, so `iter_dump` and
+    `loaddata` can read them back. Many to many fields use whatever was
+    prefetched with `prefetch_related`, instead of a query per instance.
+
+    Args:
+        instances (list): Model instances to write.
+
+    Yields:
+        str: Each instance as JSON, ending in a newline.
+    """
+
+    for obj in serializers.serialize("python", instances):
+        yield json.dumps(obj, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
@@ -0,0 +1,226 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min
+from django.http import HttpRequest
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+
+from .caching import bump_version, get_version, seconds_until
+
+FEED_VERSION_KEY = "articles:feed_version:{0}"
+# Bumped when any Series or Author changes, since feeds show their names and
+# are found by their slugs.
+ALL_FEEDS = "all"
+SITE_FEED = "site"
+
+# The feed generators for each format, by URL suffix.
+FEED_FORMATS = {
+    "rss": Rss201rev2Feed,
+    "atom": Atom1Feed,
+}
+
+
+def get_feed_count() -> int:
+    """
+    Returns how many of the newest Articles a feed has.
+
+    Set with `FEED_ARTICLES` in settings, defaulting to 20.
+
+    Returns:
+        int: The number of Articles in each feed.
+    """
+
+    return getattr(settings, "FEED_ARTICLES", 20)
+
+def get_feed_version(scope: str) -> int:
+    """
+    Returns the current version of the feeds of `scope`.
+
+    Like the content version (see `articles.caching.get_content_version`),
+    but there's one for the site-wide feed, one for each Series and one for
+    each Author, so saving an Article only invalidates the feeds it's in.
+
+    Args:
+        scope (str): "site", "series:<pk>", "author:<pk>", or "all".
+
+    Returns:
+        int: The current version.
+    """
+
+    return get_version(FEED_VERSION_KEY.format(scope))
+
+def bump_feed_versions(scopes: set):
+    """
+    Changes the versions of the feeds of each of `scopes`, invalidating them.
+
+    Args:
+        scopes (set): Scopes, as for `get_feed_version`.
+    """
+
+    for scope in scopes:
+        bump_version(FEED_VERSION_KEY.format(scope))
+
+def article_scopes(series_id: int, author_id: int) -> set:
+    """
+    Returns the scopes of the feeds an Article in a Series by an Author is in.
+
+    Args:
+        series_id (int): The primary key of the Series, or None.
+        author_id (int): The primary key of the Author, or None.
+
+    Returns:
+        set: The scopes, as for `get_feed_version`.
+    """
+
+    scopes = {SITE_FEED}
+    if series_id is not None:
+        scopes.add("series:{0}".format(series_id))
+    if author_id is not None:
+        scopes.add("author:{0}".format(author_id))
+    return scopes
+
+def _find_scope(kind: str, slug: str):
+    """
+    Returns the Series or Author with `slug` and the scope of its feeds.
+
+    Which primary key a slug belongs to is cached under the "all" version,
+    since it only changes when a Series or Author is saved or deleted, so
+    polling a cached feed doesn't touch the database.
+
+    Args:
+        kind (str): "series" or "author".
+        slug (str): The slug of the Series or Author.
+
+    Returns:
+        tuple: The scope, and the Series or Author if it was loaded (else
+            None). The scope is None if there's no such Series or Author.
+    """
+
+    #pylint: disable=E1101
+    from .models import Author, Series
+
+    key = "articles:feed_scope:{0}:{1}:{2}".format(get_feed_version(ALL_FEEDS), kind, slug)
+    pk = cache.get(key)
+    if pk is not None:
+        return "{0}:{1}".format(kind, pk), None
+    instance = {"series": Series, "author": Author}[kind].objects.filter(slug=slug).first()
+    if instance is None:
+        return None, None
+    cache.set(key, instance.pk, None)
+    return "{0}:{1}".format(kind, instance.pk), instance
+
+def _build_feed(request: HttpRequest, feed_format: str, kind: str, slug: str,
+        instance) -> dict:
+    """
+    Renders a feed of the newest visible Articles of a scope.
+
+    Args:
+        request (HttpRequest): The request, for absolute URLs.
+        feed_format (str): A key of `FEED_FORMATS`.
+        kind (str): "series", "author" or None for the site-wide feed.
+        slug (str): The slug of the Series or Author, if any.
+        instance: The Series or Author, if already loaded.
+
+    Returns:
+        dict: The `content` (bytes), `content_type`, `etag` (a strong ETag
+            of the content), `last_modified` (a datetime, or None if there
+            are no Articles) and `next_publish` (a datetime, or None).
+    """
+
+    #pylint: disable=E1101
+    from .models import Article, Author, Series, now
+
+    articles = Article.get_available_articles()
+    scheduled = Article.objects.filter(enabled=True, publish_date__gt=now())
+    if kind is None:
+        title = settings.SITE_TITLE
+        link = request.build_absolute_uri("/")
+        description = "The newest Articles from {0}.".format(settings.SITE_TITLE)
+    else:
+        if instance is None:
+            model = {"series": Series, "author": Author}[kind]
+            instance = model.objects.get(slug=slug)
+        articles = articles.filter(**{kind: instance})
+        scheduled = scheduled.filter(**{kind: instance})
+        title = "{0} | {1}".format(instance, settings.SITE_TITLE)
+        link = request.build_absolute_uri(instance.get_absolute_url())
+        description = getattr(instance, "description", "") or getattr(instance, "bio", "")
+
+    feed = FEED_FORMATS[feed_format](
+        title = title,
+        link = link,
+        description = description,
+        feed_url = request.build_absolute_uri(request.path),
+        language = settings.LANGUAGE_CODE
+    )
+    articles = articles.select_related("series", "author").order_by("-publish_date", "-pk")
+    for article in articles[:get_feed_count()]:
+        url = request.build_absolute_uri(article.get_absolute_url())
+        feed.add_item(
+            title = article.title,
+            link = url,
+            description = article.rendered_content,
+            unique_id = url,
+            unique_id_is_permalink = True,
+            pubdate = article.publish_date,
+            updateddate = article.date_modified,
+            author_name = str(article.author) if article.author else None
+        )
+    content = feed.writeString("utf-8").encode("utf-8")
+    return {
+        "content": content,
+        "content_type": feed.content_type,
+        "etag": '"{0}"'.format(hashlib.md5(content).hexdigest()),
+        "last_modified": feed.latest_post_date() if feed.items else None,
+        "next_publish": scheduled.aggregate(next_publish=Min("publish_date"))["next_publish"],
+    }
+
+def get_feed(request: HttpRequest, feed_format: str, kind: str = None,
+        slug: str = None) -> dict:
+    """
+    Returns a rendered feed, from the cache if it's there.
+
+    Feeds are cached under the version of their scope, which changes when
+    an Article in it is saved or deleted (see `article_scopes`), so a
+    cached feed is served without a query. They're also keyed by their
+    absolute URL without the query string, since links in them include the
+    host. Entries expire at the next scheduled `publish_date` in the scope,
+    or after `FEED_CACHE_TIMEOUT` seconds (defaulting to 86400) if nothing
+    is scheduled.
+
+    Args:
+        request (HttpRequest): The request.
+        feed_format (str): A key of `FEED_FORMATS`.
+        kind (str, optional): Defaults to None, meaning the site-wide feed.
+            "series" or "author" for the feed of one of those.
+        slug (str, optional): Defaults to None. The slug of the Series or
+            Author.
+
+    Returns:
+        dict: As from `_build_feed`, or None if there's no such feed.
+    """
+
+    if feed_format not in FEED_FORMATS:
+        return None
+    instance = None
+    scope = SITE_FEED
+    if kind is not None:
+        scope, instance = _find_scope(kind, slug)
+        if scope is None:
+            return None
+    key = "articles:feed:{0}:{1}:{2}:{3}:{4}".format(
+        get_feed_version(ALL_FEEDS),
+        scope,
+        get_feed_version(scope),
+        feed_format,
+        hashlib.md5(request.build_absolute_uri(request.path).encode()).hexdigest()
+    )
+    feed = cache.get(key)
+    if feed is None:
+        feed = _build_feed(request, feed_format, kind, slug, instance)
+        cache.set(key, feed, seconds_until(
+            feed["next_publish"],
+            getattr(settings, "FEED_CACHE_TIMEOUT", 86400)
+        ))
+    return feed
@@ -0,0 +1,386 @@
+import hashlib
+import logging
+import time
+
+from collections import namedtuple
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from PIL import Image
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+# Default encoder options for each output format. May be overridden per
+# format with `IMAGE_FORMAT_OPTIONS` in settings.
+FORMAT_OPTIONS = {
+    "PNG": {},
+    "JPEG": {"quality": 82, "optimize": True, "progressive": True},
+    "WEBP": {"quality": 80},
+    "AVIF": {"quality": 60},
+}
+
+FORMAT_EXTENSIONS = {
+    "PNG": "png",
+    "JPEG": "jpg",
+    "WEBP": "webp",
+    "AVIF": "avif",
+}
+
+FORMAT_CONTENT_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "AVIF": "image/avif",
+}
+
+# Formats which can't store an alpha layer.
+OPAQUE_FORMATS = ("JPEG",)
+
+# Alternate formats created for each derivative, on top of the PNG stored
+# in the derivative's own field. May be overridden with
+# `IMAGE_DERIVATIVE_FORMATS` in settings.
+DERIVATIVE_FORMATS = {
+    "image_thumbnail": ["WEBP", "JPEG"],
+    "image_thumbnail_transparent": ["WEBP"],
+    "image_full": ["WEBP", "JPEG"],
+}
+
+# Narrower widths, in pixels, to also create the alternate formats of each
+# derivative in, for `srcset`. Only widths smaller than the derivative
+# itself are used. May be overridden with `IMAGE_SRCSET_WIDTHS` in settings.
+SRCSET_WIDTHS = {
+    "image_full": [320, 640],
+}
+
+
+class DerivativeSpec(namedtuple(
+        "DerivativeSpec",
+        ["field", "size", "suffix", "set_alpha", "formats", "widths"],
+        defaults = [()]
+    )):
+    """
+    Describes one image derived from `image_raw`.
+
+    Attributes:
+        field (str): The name of the model field the image is stored in.
+        size (tuple): The dimensions the image must fit within.
+        suffix (str): Appended to the name of `image_raw` to name the image.
+        set_alpha (bool): Whether a 50% alpha layer is added to the image.
+        formats (tuple): Alternate formats to also encode the image in,
+            stored as `ImageRendition`s. The field itself is always a PNG.
+        widths (tuple): Narrower widths to also encode each alternate format
+            in, for `srcset`. Defaults to none.
+    """
+
+    __slots__ = ()
+
+
+def format_supported(image_format: str) -> bool:
+    """
+    Returns whether the installed Pillow can encode `image_format`.
+
+    AVIF, for instance, needs a recent Pillow or the `pillow-avif-plugin`
+    package.
+
+    Args:
+        image_format (str): A Pillow format name, such as "WEBP".
+
+    Returns:
+        bool: True if images can be saved in that format.
+    """
+
+    Image.init()
+    return image_format in Image.SAVE and image_format in FORMAT_EXTENSIONS
+
+def get_format_options(image_format: str) -> dict:
+    """
+    Returns the encoder options used when saving in `image_format`.
+
+    Args:
+        image_format (str): A Pillow format name, such as "WEBP".
+
+    Returns:
+        dict: Keyword arguments for `Image.save`.
+    """
+
+    options = dict(FORMAT_OPTIONS.get(image_format, {}))
+    options.update(
+        getattr(settings, "IMAGE_FORMAT_OPTIONS", {}).get(image_format, {})
+    )
+    return options
+
+def get_derivative_formats(field: str, set_alpha: bool) -> tuple:
+    """
+    Returns the alternate formats that should be created for `field`.
+
+    Formats the installed Pillow can't encode are skipped, as are formats
+    without alpha support for derivatives that need alpha.
+
+    Args:
+        field (str): The name of the derivative's field.
+        set_alpha (bool): Whether the derivative has an alpha layer.
+
+    Returns:
+        tuple: The Pillow format names.
+    """
+
+    configured = getattr(
+        settings, "IMAGE_DERIVATIVE_FORMATS", DERIVATIVE_FORMATS
+    ).get(field, [])
+    formats = []
+    for image_format in configured:
+        image_format = image_format.upper()
+        if set_alpha and image_format in OPAQUE_FORMATS:
+            continue
+        if not format_supported(image_format):
+            logger.warning("Pillow can't save %s images; skipping", image_format)
+            continue
+        formats.append(image_format)
+    return tuple(formats)
+
+def get_srcset_widths(field: str) -> tuple:
+    """
+    Returns the narrower widths the alternate formats of `field` come in.
+
+    Args:
+        field (str): The name of the derivative's field.
+
+    Returns:
+        tuple: The widths in pixels, smallest first.
+    """
+
+    configured = getattr(
+        settings, "IMAGE_SRCSET_WIDTHS", SRCSET_WIDTHS
+    ).get(field, [])
+    return tuple(sorted(set(int(width) for width in configured)))
+
+def get_ladder(widths: tuple, full_width: int) -> list:
+    """
+    Returns every width an image `full_width` wide is offered in.
+
+    Args:
+        widths (tuple): The configured narrower widths, as from
+            `get_srcset_widths`.
+        full_width (int): The width of the derivative itself.
+
+    Returns:
+        list: The widths narrower than `full_width`, smallest first, followed
+            by `full_width` itself.
+    """
+
+    return [width for width in sorted(widths) if width < full_width] + [full_width]
+
+def resize_to_width(image: Image.Image, width: int) -> Image.Image:
+    """
+    Returns a copy of `image` scaled down to `width`, keeping its aspect ratio.
+
+    Args:
+        image (Image.Image): The image to scale.
+        width (int): The new width, in pixels.
+
+    Returns:
+        Image.Image: The scaled copy.
+    """
+
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+def get_derivative_specs() -> list:
+    """
+    Returns the specs of every image derived from `image_raw`.
+
+    The settings file must have the attributes `IMAGE_THUMBNAIL_SIZE` and
+    `IMAGE_FULL_SIZE`, each a tuple of the dimensions of those images.
+
+    Returns:
+        list: A `DerivativeSpec` for each derived image field.
+    """
+
+    specs = [
+        ("image_thumbnail", settings.IMAGE_THUMBNAIL_SIZE, "thumbnail", False),
+        ("image_thumbnail_transparent", settings.IMAGE_THUMBNAIL_SIZE,
+            "thumbnail_transparent", True),
+        ("image_full", settings.IMAGE_FULL_SIZE, "full", False),
+    ]
+    return [
+        DerivativeSpec(
+            field,
+            tuple(size),
+            suffix,
+            set_alpha,
+            get_derivative_formats(field, set_alpha),
+            get_srcset_widths(field)
+        )
+        for field, size, suffix, set_alpha in specs
+    ]
+
+def source_hash(data: bytes, specs: list) -> str:
+    """
+    Returns a hash identifying the images `specs` would derive from `data`.
+
+    Covers the source image's bytes, the specs, and the encoder options of
+    every format they use, so changing `IMAGE_FULL_SIZE` or a format's 
+    quality changes the hash as well as uploading a new image does.
+
+    Args:
+        data (bytes): The contents of `image_raw`.
+        specs (list): The `DerivativeSpec`s of the images.
+
+    Returns:
+        str: A 64 character hex digest.
+    """
+
+    digest = hashlib.sha256(data)
+    formats = sorted({"PNG"}.union(*(spec.formats for spec in specs)))
+    digest.update(repr((
+        sorted(tuple(spec) for spec in specs),
+        [(f, sorted(get_format_options(f).items())) for f in formats]
+    )).encode())
+    return digest.hexdigest()
+
+def _pixel_bytes(image: Image.Image) -> int:
+    """
+    Returns roughly how much memory the decoded pixels of `image` take.
+
+    Pillow allocates pixel buffers outside of Python's allocator, so they
+    can't be measured with `tracemalloc`; this counts one byte per band per
+    pixel instead, which is what Pillow uses for the common modes.
+    """
+
+    return image.width * image.height * len(image.getbands())
+
+def encode_image(image: Image.Image, name: str, image_format: str) -> InMemoryUploadedFile:
+    """
+    Encodes `image` in `image_format`, ready to be set to a file field.
+
+    Args:
+        image (Image.Image): The image to encode.
+        name (str): The name of the new file, without an extension.
+        image_format (str): A Pillow format name, such as "WEBP".
+
+    Returns:
+        InMemoryUploadedFile: The encoded image, saved in memory.
+    """
+
+    if image_format in OPAQUE_FORMATS and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    output = BytesIO() # Don't want to write to disk, so we use memory instead.
+    image.save(output, format=image_format, **get_format_options(image_format))
+    size = output.tell()
+    output.seek(0)
+    return InMemoryUploadedFile(
+        output,
+        'ImageField',
+        "{0}.{1}".format(name, FORMAT_EXTENSIONS[image_format]),
+        FORMAT_CONTENT_TYPES[image_format],
+        size,
+        None
+    )
+
+def build_derivatives(source, base_name: str, specs: list) -> tuple:
+    """
+    Creates every image in `specs` from a single decode of `source`.
+
+    Parts of this were originally modified from
+    https://djangosnippets.org/snippets/10597/
+
+    `source` is opened once. For JPEG sources Pillow's `draft` is used, so
+    the decoder itself downscales by up to 8x to the smallest size still
+    large enough for the biggest derivative, instead of decoding the full
+    resolution. The decoded image is then shrunk in-place to fit the
+    biggest derivative, and all derivatives are resized from that shared
+    intermediate, each size only once. Each derivative is encoded as a PNG
+    for its field, plus once for each of its alternate `formats`. Those
+    formats are also encoded at each of the spec's narrower `widths`, scaled
+    from the derivative, so `srcset` can offer small screens a small file.
+
+    Wall time, the peak memory held by decoded pixels, and the encoded size
+    are recorded for the decode and each derivative, logged at INFO level
+    to the `articles.images` logger, and returned.
+
+    Args:
+        source: A file, or file-like object such as a FieldFile, holding the
+            image to derive from.
+        base_name (str): The name of the new images, before the suffix of
+            each spec is appended.
+        specs (list): The `DerivativeSpec`s of the images to create.
+
+    Returns:
+        tuple: A dict of the new PNG images (as InMemoryUploadedFile) by
+            field name; a list of alternate renditions at every width, as
+            dicts with `field`, `format`, `width`, `height` and `file` keys;
+            and a list of stats dicts with `derivative`, `seconds`,
+            `peak_bytes` and `output_bytes` keys.
+    """
+
+    stats = []
+    started = time.perf_counter()
+    image = Image.open(source)
+    fit = (
+        max(spec.size[0] for spec in specs),
+        max(spec.size[1] for spec in specs)
+    )
+    image.draft(None, fit) # Only JPEGs support this; a no-op otherwise.
+    image.load()
+    peak = _pixel_bytes(image)
+    image.thumbnail(fit, Image.LANCZOS) # Thumbnail modifies in-place.
+    stats.append({
+        "derivative": "decode",
+        "seconds": time.perf_counter() - started,
+        "peak_bytes": peak,
+        "output_bytes": 0,
+    })
+
+    created = {}
+    renditions = []
+    resized = {}
+    for spec in sorted(specs, key=lambda s: s.size, reverse=True):
+        started = time.perf_counter()
+        if spec.size not in resized:
+            if image.size[0] <= spec.size[0] and image.size[1] <= spec.size[1]:
+                resized[spec.size] = image
+            else:
+                smaller = image.copy()
+                smaller.thumbnail(spec.size, Image.LANCZOS)
+                resized[spec.size] = smaller
+        derivative = resized[spec.size]
+        if spec.set_alpha:
+            derivative = derivative.copy()
+            derivative.putalpha(127) # Putalpha also modifies in-place.
+
+        name = "{0}_{1}".format(base_name, spec.suffix)
+        created[spec.field] = encode_image(derivative, name, "PNG")
+        output_bytes = created[spec.field].size
+        for width in get_ladder(spec.widths, derivative.width):
+            if width == derivative.width:
+                scaled, scaled_name = derivative, name
+            else:
+                scaled = resize_to_width(derivative, width)
+                scaled_name = "{0}_{1}w".format(name, width)
+            for image_format in spec.formats:
+                encoded = encode_image(scaled, scaled_name, image_format)
+                output_bytes += encoded.size
+                renditions.append({
+                    "field": spec.field,
+                    "format": image_format,
+                    "width": scaled.width,
+                    "height": scaled.height,
+                    "file": encoded,
+                })
+
+        alive = {id(i): i for i in [image, derivative, scaled, *resized.values()]}
+        peak = sum(_pixel_bytes(i) for i in alive.values())
+        stats.append({
+            "derivative": spec.field,
+            "seconds": time.perf_counter() - started,
+            "peak_bytes": peak + output_bytes,
+            "output_bytes": output_bytes,
+        })
+
+    for stat in stats:
+        logger.info(
+            "%s: %s took %.3fs, peak %d bytes, %d bytes encoded",
+            base_name, stat["derivative"], stat["seconds"],
+            stat["peak_bytes"], stat["output_bytes"]
+        )
+    return created, renditions, stats
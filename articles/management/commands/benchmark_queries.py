@@ -0,0 +1,209 @@
+import datetime
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from articles.models import Author, Series, Article
+
+
+class Rollback(Exception):
+    """
+    Raised to roll back everything the benchmark created.
+    """
+
+
+class Command(BaseCommand):
+    """
+    Times the queries visitors make most, with and without the indexes on
+    Article and Series.
+
+    Seeds `--articles` Articles across `--series` Series and `--authors`
+    Authors, then prints the query plan and latency of each query, first with
+    the indexes from `Article.Meta.indexes` and `Series.Meta.indexes`, and
+    again after dropping them. It all runs in one transaction that is rolled
+    back at the end, so the database is left as it was. That needs a
+    database with transactional DDL, such as SQLite or PostgreSQL.
+    """
+
+    help = "Seeds Articles and compares query plans and latencies with and without indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--articles",
+            type = int,
+            default = 50000,
+            help = "How many Articles to seed. Defaults to 50000."
+        )
+        parser.add_argument(
+            "--series",
+            type = int,
+            default = 200,
+            help = "How many Series to seed. Defaults to 200."
+        )
+        parser.add_argument(
+            "--authors",
+            type = int,
+            default = 20,
+            help = "How many Authors to seed. Defaults to 20."
+        )
+        parser.add_argument(
+            "--repeat",
+            type = int,
+            default = 20,
+            help = "How many times to run each query. Defaults to 20."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                series, author = self.seed(options)
+                queries = self.get_queries(series, author)
+                with_indexes = self.run(queries, options["repeat"], "With indexes")
+                self.drop_indexes()
+                without = self.run(queries, options["repeat"], "Without indexes")
+                self.stdout.write("\nMedian latency (ms):")
+                for name in queries:
+                    self.stdout.write("  {0:<32} {1:>9.3f} {2:>9.3f}  ({3:.1f}x)".format(
+                        name,
+                        without[name],
+                        with_indexes[name],
+                        without[name] / with_indexes[name] if with_indexes[name] else 0
+                    ))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options) -> tuple:
+        """
+        Creates the Authors, Series and Articles to query.
+
+        Articles are inserted with `bulk_create`, so none of the usual save
+        logic runs. Roughly one in ten is disabled and one in twenty is
+        scheduled in the future, so the visibility filter has work to do.
+
+        Returns:
+            tuple: A Series and an Author, for the per-Series and per-Author
+                queries.
+        """
+
+        #pylint: disable=E1101
+        started = time.perf_counter()
+        Author.objects.bulk_create([
+            Author(name="Benchmark Author {0}".format(i), bio="benchmark",
+                slug="benchmark-author-{0}".format(i))
+            for i in range(options["authors"])
+        ])
+        Series.objects.bulk_create([
+            Series(name="Benchmark Series {0}".format(i), description="benchmark",
+                slug="benchmark-series-{0}".format(i))
+            for i in range(options["series"])
+        ])
+        # Not every database returns primary keys from bulk_create.
+        authors = list(Author.objects.filter(slug__startswith="benchmark-author-"))
+        series = list(Series.objects.filter(slug__startswith="benchmark-series-"))
+
+        now = timezone.now()
+        batch = []
+        for i in range(options["articles"]):
+            publish_date = now - datetime.timedelta(hours=i)
+            if i % 20 == 0:
+                publish_date = now + datetime.timedelta(days=i % 365 + 1)
+            batch.append(Article(
+                title = "Benchmark Article {0}".format(i),
+                slug = "benchmark-article-{0}".format(i),
+                content = self.article_text(i),
+                shortline = "benchmark",
+                author = authors[i % len(authors)],
+                series = series[(i * 7) % len(series)],
+                publish_date = publish_date,
+                enabled = i % 10 != 0,
+            ))
+            if len(batch) >= 1000:
+                Article.objects.bulk_create(batch)
+                batch = []
+        Article.objects.bulk_create(batch)
+        for index, each in enumerate(series):
+            each.latest_article_date = now - datetime.timedelta(hours=index)
+        Series.objects.bulk_update(series, ["latest_article_date"], batch_size=1000)
+        self.stdout.write("Seeded {0} Articles in {1:.1f}s.".format(
+            options["articles"], time.perf_counter() - started
+        ))
+        return series[0], authors[0]
+
+    def article_text(self, index: int) -> str:
+        """
+        Returns the content of the `index`th seeded Article.
+        """
+
+        return "benchmark"
+
+    def get_queries(self, series, author) -> dict:
+        """
+        Returns the queries to time, by name.
+
+        These are the queries behind the Article list, Series and Author
+        pages, the Series list, and the sidebar.
+        """
+
+        #pylint: disable=E1101
+        visible = Article.get_available_articles()
+        return {
+            "Article list, first page": visible[:7],
+            "Article list, page 100": visible[693:700],
+            "Series detail": visible.filter(series=series)[:7],
+            "Author detail": visible.filter(author=author)[:7],
+            "Series list": Series.objects.all()[:20],
+            "Next publish date": Article.objects.filter(
+                enabled = True,
+                publish_date__gt = timezone.now()
+            ).order_by("publish_date")[:1],
+        }
+
+    def run(self, queries: dict, repeat: int, title: str) -> dict:
+        """
+        Prints the plan of each query and returns its median latency.
+        """
+
+        self.stdout.write("\n{0}\n{1}".format(title, "=" * len(title)))
+        latencies = {}
+        for name, queryset in queries.items():
+            self.stdout.write("\n{0}:\n{1}".format(name, self.explain(queryset, title)))
+            timings = []
+            for _ in range(max(1, repeat)):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            latencies[name] = statistics.median(timings)
+        return latencies
+
+    def explain(self, queryset, title: str) -> str:
+        """
+        Returns the query plan of `queryset`.
+
+        Like `QuerySet.explain`, except the SQL is tagged with `title`. The
+        sqlite3 module caches statements by their text, and would otherwise
+        return the plan from before the indexes were dropped.
+        """
+
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("{0} {1} -- {2}".format(
+                connection.ops.explain_query_prefix(), sql, title
+            ), params)
+            return "\n".join(" ".join(str(c) for c in row) for row in cursor.fetchall())
+
+    def drop_indexes(self):
+        """
+        Drops the indexes from `Meta.indexes` of Article and Series.
+        """
+
+        # Not entered as a context manager: SQLite's schema editor refuses to
+        # be inside a transaction, but dropping an index doesn't need what it
+        # sets up.
+        editor = connection.schema_editor()
+        for model in (Article, Series):
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
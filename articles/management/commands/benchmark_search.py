@@ -0,0 +1,129 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.db import transaction
+
+from articles import search
+from articles.models import Article
+from . import benchmark_queries
+
+SYLLABLES = ["ka", "lo", "mi", "ren", "tas", "vu", "bel", "dor", "fi", "gan", "sho", "pra"]
+
+
+class Command(benchmark_queries.Command):
+    """
+    Times searches against a seeded corpus of Articles.
+
+    Seeds Articles as `benchmark_queries` does, but with a few hundred words
+    of content each, drawn from a made up vocabulary in which a few words
+    are common and most are rare, as in real writing. The Articles are
+    indexed, and then each search is timed the way the search page runs
+    it: counting the matches and fetching a page of them. Like
+    `benchmark_queries`, everything is rolled back at the end.
+    """
+
+    help = "Seeds Articles with varied content and times searches against the search index."
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--words",
+            type = int,
+            default = 200,
+            help = "How many words of content each Article has. Defaults to 200."
+        )
+        parser.add_argument(
+            "--target",
+            type = float,
+            default = 50,
+            help = "The latency each search should stay under, in milliseconds. Defaults to 50."
+        )
+
+    def handle(self, *args, **options):
+        search.forget_backend()
+        backend = search.get_backend()
+        self.words = options["words"]
+        self.vocabulary = ["".join(parts) for parts in itertools.product(SYLLABLES, repeat=3)]
+        # Zipf's law: the nth most common word is n times rarer than the
+        # most common.
+        self.cum_weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(self.vocabulary) + 1)
+        ))
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                started = time.perf_counter()
+                indexed = 0
+                articles = Article.objects.filter(
+                    slug__startswith = "benchmark-article-"
+                ).order_by("pk").prefetch_related("tags")
+                last = 0
+                while True:
+                    batch = list(articles.filter(pk__gt=last)[:1000])
+                    if not batch:
+                        break
+                    indexed += search.index_articles(batch)
+                    last = batch[-1].pk
+                search.optimize_index()
+                self.stdout.write("Indexed {0} Articles with the {1} backend in {2:.1f}s.".format(
+                    indexed, backend, time.perf_counter() - started
+                ))
+                self.time_searches(options["repeat"], options["target"])
+                raise benchmark_queries.Rollback
+        except benchmark_queries.Rollback:
+            pass
+
+    def article_text(self, index: int) -> str:
+        """
+        Returns `--words` words from the vocabulary, the same for each
+        `index` every run.
+        """
+
+        rng = random.Random(index)
+        return " ".join(rng.choices(self.vocabulary, cum_weights=self.cum_weights, k=self.words))
+
+    def get_searches(self) -> dict:
+        """
+        Returns the searches to time, by name.
+        """
+
+        common, middling, rare = self.vocabulary[0], self.vocabulary[50], self.vocabulary[1500]
+        return {
+            "Common word": common,
+            "Middling word": middling,
+            "Rare word": rare,
+            "Two words": "{0} {1}".format(middling, self.vocabulary[60]),
+            "Prefix, as typed": middling[:4],
+            "Title": "Benchmark Article 4242",
+            "No matches": "zzzzzz",
+        }
+
+    def time_searches(self, repeat: int, target: float):
+        """
+        Prints the median and slowest latency of each search, counting the
+        matches and fetching the first page, and then the tenth.
+        """
+
+        self.stdout.write("\n{0:<20} {1:<28} {2:>9} {3:>10} {4:>10} {5:>10}".format(
+            "Search", "Query", "Matches", "Median ms", "Max ms", "Page 10 ms"
+        ))
+        slowest = 0
+        for name, query in self.get_searches().items():
+            timings = {1: [], 10: []}
+            for _ in range(max(1, repeat)):
+                for number in timings:
+                    started = time.perf_counter()
+                    results = search.SearchResults(query)
+                    count = results.count()
+                    list(results[(number - 1) * 7:number * 7])
+                    timings[number].append((time.perf_counter() - started) * 1000)
+            slowest = max(slowest, max(timings[1]), max(timings[10]))
+            self.stdout.write("{0:<20} {1:<28} {2:>9} {3:>10.2f} {4:>10.2f} {5:>10.2f}".format(
+                name, query, count, statistics.median(timings[1]), max(timings[1]),
+                statistics.median(timings[10])
+            ))
+        self.stdout.write("\nSlowest search took {0:.2f}ms; the target is {1:.0f}ms. {2}".format(
+            slowest, target, "OK" if slowest <= target else "Too slow."
+        ))
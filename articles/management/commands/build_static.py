@@ -0,0 +1,495 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import time
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import chain
+from urllib.parse import unquote, urlsplit
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Page
+from django.db import connections, models
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from articles.feeds import FEED_FORMATS
+from articles.models import Article, Author, ImageRendition, RelatedArticle, Series, Tag
+from articles.sitemaps import get_shard
+
+MANIFEST_NAME = "build_static.json"
+
+# Links to numbered pages, as `pagination.html` writes them.
+PAGE_LINK = re.compile(r'href="(/[^"?]*)\?page=(\d+)"')
+
+
+def page_file(path: str, number: int = 1) -> str:
+    """
+    Returns the file a page of `path` is written to, relative to the output.
+
+    Pages are written as `<path>.html`, and later pages of a list as
+    `<path>/page/<number>.html`, so a web server can serve them at the same
+    URLs without the extension. Feeds and sitemaps keep their names.
+
+    Args:
+        path (str): The URL path, such as "/articles".
+        number (int, optional): Defaults to 1. The page number.
+
+    Returns:
+        str: The file name.
+    """
+
+    name = path.strip("/")
+    if not name:
+        return "index.html"
+    if number > 1:
+        return "{0}/page/{1}.html".format(name, number)
+    if os.path.splitext(name)[1]:
+        return name
+    return name + ".html"
+
+def _page_link(match) -> str:
+    """
+    Rewrites a `?page=` link to the URL of the page's file.
+    """
+
+    path, number = match.group(1), int(match.group(2))
+    if number == 1:
+        return 'href="{0}"'.format(path)
+    return 'href="{0}/page/{1}"'.format(path.rstrip("/"), number)
+
+def _count_pages(response) -> int:
+    """
+    Returns how many pages the list a response shows has, from its context.
+    """
+
+    for value in (getattr(response, "context_data", None) or {}).values():
+        if isinstance(value, Page):
+            return value.paginator.num_pages
+    return 1
+
+def write_file(output: str, name: str, content: bytes):
+    """
+    Writes `content` to `name` in `output`, replacing it only once complete.
+    """
+
+    path = os.path.join(output, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as file:
+        file.write(content)
+    os.replace(path + ".tmp", path)
+
+def render_unit(output: str, base_url: str, path: str) -> tuple:
+    """
+    Renders every page of `path` to files, by calling its view directly.
+
+    Runs in the worker processes, so it only takes and returns plain
+    values.
+
+    Args:
+        output (str): The directory to write to.
+        base_url (str): The scheme and host pages are rendered for.
+        path (str): The URL path to render.
+
+    Returns:
+        tuple: The path, the files written, and an error message, or None if
+            every page rendered.
+    """
+
+    url = urlsplit(base_url)
+    factory = RequestFactory()
+    files = []
+    number = pages = 1
+    try:
+        match = resolve(path)
+        while number <= pages:
+            request = factory.get(
+                path,
+                {"page": number} if number > 1 else {},
+                secure = url.scheme == "https",
+                HTTP_HOST = url.netloc
+            )
+            request.skip_page_cache = True
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, "render") and callable(response.render):
+                response.render()
+            if response.status_code != 200:
+                return path, files, "page {0} returned {1}".format(number, response.status_code)
+            content = response.content
+            if response["Content-Type"].startswith("text/html"):
+                content = PAGE_LINK.sub(
+                    _page_link, content.decode(response.charset)
+                ).encode(response.charset)
+            name = page_file(path, number)
+            write_file(output, name, content)
+            files.append(name)
+            if number == 1:
+                pages = _count_pages(response)
+            number += 1
+    except Exception as e: #pylint: disable=W0703
+        # Reported, so that one broken page doesn't stop the build.
+        return path, files, "page {0} raised {1!r}".format(number, e)
+    return path, files, None
+
+
+class Command(BaseCommand):
+    """
+    Renders the public site to HTML files, for serving without Django.
+
+    Every URL a visitor can reach is rendered: the index, the Article,
+    Series and Tag lists, each visible Article, each Series, Author and
+    Tag, every page of each paginated list (written to `<path>/page/<n>`),
+    and the feeds and sitemaps. Pages are rendered by calling their views,
+    in a pool of `--workers` processes, with `?page=` links rewritten to
+    the written pages. The media they show, such as image renditions and
+    audio, and the static files are copied alongside; files already copied
+    are skipped.
+
+    What was built is saved to `build_static.json` in the output. The next
+    build only renders the pages affected by Articles modified, published,
+    hidden or deleted since: their own pages, the lists, feeds and sitemap
+    shards they're in, the pages of their Series, Author and Tags, and the
+    Articles listing them as related. Pages which are no longer reachable
+    are deleted. If the latest Articles in the sidebar have changed, every
+    page shows them, so everything is rendered again, as with `--full`.
+    Changes to Series, Authors or Tags alone aren't noticed; use `--full`.
+    """
+
+    help = "Renders every public page to HTML files in parallel, incrementally."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output",
+            help = "The directory to write the site to."
+        )
+        parser.add_argument(
+            "--base-url",
+            default = "http://localhost",
+            help = "The scheme and host the site will be served from, for links in feeds and "
+                "sitemaps. Must be in ALLOWED_HOSTS. Defaults to http://localhost."
+        )
+        parser.add_argument(
+            "--workers",
+            type = int,
+            default = os.cpu_count() or 1,
+            help = "How many processes to render pages with. Defaults to the number of CPUs."
+        )
+        parser.add_argument(
+            "--full",
+            action = "store_true",
+            help = "Render every page, not only those affected by changes since the last build."
+        )
+        parser.add_argument(
+            "--no-media",
+            action = "store_true",
+            help = "Don't copy media or static files."
+        )
+
+    def handle(self, *args, **options):
+        self.output = options["output"]
+        base_url = options["base_url"].rstrip("/")
+        if not urlsplit(base_url).netloc:
+            raise CommandError("--base-url must include a scheme and host, such as https://example.com.")
+        os.makedirs(self.output, exist_ok=True)
+        started = timezone.now()
+        timer = time.perf_counter()
+        manifest = self.read_manifest()
+
+        # Pages are found by number, so they can be enumerated and written
+        # to files.
+        with override_settings(KEYSET_PAGINATION=False):
+            state = self.site_state()
+            units = self.find_units(state)
+            incremental = not options["full"] and manifest.get("base_url") == base_url \
+                and manifest.get("sidebar") == state["sidebar"]
+            built = manifest.get("units", {}) if incremental else {}
+            if incremental:
+                affected = self.affected(manifest, state)
+                render = [path for path in units if path not in built or path in affected]
+            else:
+                render = units
+            results = self.render_all(render, base_url, max(1, options["workers"]))
+
+        failed = []
+        for path, files, error in results:
+            old = set(built.get(path, ()))
+            if error is not None:
+                failed.append(path)
+                self.stderr.write("Failed to render {0}: {1}".format(path, error))
+                files = sorted(old | set(files))
+            else:
+                self.delete_files(old - set(files))
+            built[path] = files
+        reachable = set(units)
+        for path in [path for path in built if path not in reachable]:
+            self.delete_files(built.pop(path))
+
+        copied = 0
+        if not options["no_media"]:
+            copied = self.copy_media(state) + self.copy_static()
+
+        self.save_manifest({
+            "built": started.isoformat(),
+            "base_url": base_url,
+            "sidebar": state["sidebar"],
+            "articles": state["articles"],
+            "failed": failed,
+            "units": built,
+        })
+        self.stdout.write(
+            "Rendered {0} of {1} URL(s) ({2} failed) and copied {3} file(s) in {4:.1f}s.".format(
+                len(render), len(units), len(failed), copied, time.perf_counter() - timer
+            )
+        )
+
+    def read_manifest(self) -> dict:
+        path = os.path.join(self.output, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except ValueError as e:
+            raise CommandError("{0} is corrupt: {1}".format(path, e))
+
+    def save_manifest(self, manifest: dict):
+        """
+        Writes the manifest, replacing the old one only once it's complete.
+        """
+
+        path = os.path.join(self.output, MANIFEST_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(manifest, file)
+        os.replace(path + ".tmp", path)
+
+    def site_state(self) -> dict:
+        """
+        Returns what deciding which pages to render needs, in a few queries.
+
+        Returns:
+            dict: The `articles` (each visible Article's Series, Author, Tags
+                and URL, by primary key as a str), the `series`, `authors`
+                and `tags` (slugs by primary key) and a hash of the latest
+                Articles in the `sidebar`.
+        """
+
+        #pylint: disable=E1101
+        visible = Article.get_available_articles()
+        tags = {}
+        for article_id, tag_id in Article.tags.through.objects.filter(
+                article__in = visible.values("pk")).values_list("article_id", "tag_id"):
+            tags.setdefault(article_id, []).append(tag_id)
+        articles = {}
+        rows = visible.order_by("pk").values_list("pk", "series_id", "author_id", "series__slug", "slug")
+        for pk, series_id, author_id, series_slug, slug in rows.iterator():
+            articles[str(pk)] = [
+                series_id,
+                author_id,
+                sorted(tags.get(pk, [])),
+                reverse("article-detail", args=[series_slug, slug])
+            ]
+        sidebar = list(visible.values_list("pk", "title", "date_modified")[:5])
+        return {
+            "articles": articles,
+            "series": dict(Series.objects.values_list("pk", "slug")),
+            "authors": dict(Author.objects.values_list("pk", "slug")),
+            "tags": dict(Tag.objects.in_cloud().values_list("pk", "slug")),
+            "sidebar": hashlib.md5(repr(sidebar).encode()).hexdigest(),
+        }
+
+    def find_units(self, state: dict) -> list:
+        """
+        Returns the path of every reachable URL, other than later pages of
+        lists, which are found as the first pages are rendered.
+        """
+
+        units = [reverse(name) for name in
+            ("index", "article-list", "series-list", "tag-list", "sitemap", "sitemap-pages")]
+        units += [reverse("feed", args=[feed_format]) for feed_format in FEED_FORMATS]
+        units += [reverse("sitemap-shard", args=[shard]) for shard in sorted({
+            get_shard(int(pk)) for pk in state["articles"]
+        })]
+        units += [article[3] for article in state["articles"].values()]
+        for pk in state["series"]:
+            units += self.scope_units("series", state["series"][pk])
+        for pk in state["authors"]:
+            units += self.scope_units("author", state["authors"][pk])
+        units += [reverse("tag-detail", args=[slug]) for slug in state["tags"].values()]
+        return units
+
+    def scope_units(self, kind: str, slug: str) -> list:
+        """
+        Returns the paths of the page and feeds of a Series or Author.
+        """
+
+        return [reverse("{0}-detail".format(kind), args=[slug])] + [
+            reverse("{0}-feed".format(kind), args=[slug, feed_format])
+            for feed_format in FEED_FORMATS
+        ]
+
+    def affected(self, manifest: dict, state: dict) -> set:
+        """
+        Returns the paths of the pages which may have changed since the last
+        build, according to the Articles which have.
+
+        Articles which have been published, hidden or deleted since are
+        found by comparing the visible Articles with those of the last
+        build, and those which were edited by `date_modified`.
+        """
+
+        #pylint: disable=E1101
+        old, new = manifest.get("articles", {}), state["articles"]
+        changed = set(old.keys() ^ new.keys())
+        changed.update(str(pk) for pk in Article.objects.filter(
+            date_modified__gt = parse_datetime(manifest["built"])
+        ).values_list("pk", flat=True))
+        paths = set(manifest.get("failed", []))
+        if not changed:
+            return paths
+        paths.update(reverse(name) for name in
+            ("index", "article-list", "series-list", "tag-list", "sitemap", "sitemap-pages"))
+        paths.update(reverse("feed", args=[feed_format]) for feed_format in FEED_FORMATS)
+        series, authors, tags = set(), set(), set()
+        for pk in changed:
+            for article in (old.get(pk), new.get(pk)):
+                if article is not None:
+                    series.add(article[0])
+                    authors.add(article[1])
+                    tags.update(article[2])
+            if pk in new:
+                paths.add(new[pk][3])
+            paths.add(reverse("sitemap-shard", args=[get_shard(int(pk))]))
+        listing = RelatedArticle.objects.filter(related__in=[int(pk) for pk in changed])
+        for pk in listing.values_list("article_id", flat=True):
+            if str(pk) in new:
+                paths.add(new[str(pk)][3])
+        for pk in series & state["series"].keys():
+            paths.update(self.scope_units("series", state["series"][pk]))
+        for pk in authors & state["authors"].keys():
+            paths.update(self.scope_units("author", state["authors"][pk]))
+        paths.update(reverse("tag-detail", args=[state["tags"][pk]])
+            for pk in tags & state["tags"].keys())
+        return paths
+
+    def render_all(self, units: list, base_url: str, workers: int) -> list:
+        """
+        Renders `units` with `render_unit`, in a pool of `workers` processes.
+
+        The processes are forked, so they share Django's setup, and open
+        their own database connections. Where forking isn't available,
+        threads are used instead.
+        """
+
+        render = partial(render_unit, self.output, base_url)
+        if workers == 1 or len(units) < 2:
+            return [render(path) for path in units]
+        connections.close_all()
+        if "fork" in multiprocessing.get_all_start_methods():
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+        else:
+            pool = ThreadPoolExecutor(workers)
+        with pool:
+            return list(pool.map(render, units, chunksize=max(1, len(units) // (workers * 8))))
+
+    def delete_files(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.output, name))
+            except FileNotFoundError:
+                pass
+
+    def copy_file(self, storage, name: str, destination: str) -> bool:
+        """
+        Copies a stored file into the output, unless a copy of the same size
+        is already there.
+
+        Returns:
+            bool: True if the file was copied.
+        """
+
+        path = os.path.join(self.output, destination)
+        try:
+            if os.path.exists(path) and os.path.getsize(path) == storage.size(name):
+                return False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with storage.open(name, "rb") as source, open(path + ".tmp", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.replace(path + ".tmp", path)
+        except (OSError, NotImplementedError) as e:
+            self.stderr.write("Skipped {0}: {1}".format(name, e))
+            return False
+        return True
+
+    def copy_media(self, state: dict) -> int:
+        """
+        Copies the media the pages show: the images of Authors, Series and
+        visible Articles, their renditions, and Articles' audio, which is
+        written where `article_audio` serves it.
+
+        Files with absolute URLs, such as those on S3, are already served
+        from elsewhere and aren't copied.
+
+        Returns:
+            int: How many files were copied.
+        """
+
+        #pylint: disable=E1101
+        copied = 0
+        renditions = ImageRendition.objects.exclude(
+            model = Article._meta.model_name,
+        ) | ImageRendition.objects.filter(
+            model = Article._meta.model_name,
+            object_id__in = [int(pk) for pk in state["articles"]]
+        )
+        instances = chain(
+            Author.objects.all(),
+            Series.objects.all(),
+            Article.get_available_articles().select_related("series"),
+            renditions.iterator()
+        )
+        for instance in instances:
+            for field in instance._meta.concrete_fields:
+                if not isinstance(field, models.FileField) or field.name == "image_raw":
+                    continue
+                file = getattr(instance, field.attname)
+                if not file:
+                    continue
+                if field.name == "audio":
+                    url = reverse("article-audio", args=[instance.series.slug, instance.slug])
+                else:
+                    url = file.url
+                if not url.startswith("/"):
+                    continue
+                destination = unquote(urlsplit(url).path).lstrip("/")
+                copied += self.copy_file(file.storage, file.name, destination)
+        return copied
+
+    def copy_static(self) -> int:
+        """
+        Copies the static files, such as the style sheets, from wherever
+        `collectstatic` would find them.
+
+        Returns:
+            int: How many files were copied.
+        """
+
+        if not apps.is_installed("django.contrib.staticfiles") \
+                or not settings.STATIC_URL.startswith("/"):
+            return 0
+        from django.contrib.staticfiles.finders import get_finders
+
+        copied = 0
+        prefix = settings.STATIC_URL.strip("/")
+        for finder in get_finders():
+            for path, storage in finder.list(["CVS", ".*", "*~"]):
+                name = os.path.join(getattr(storage, "prefix", None) or "", path)
+                copied += self.copy_file(storage, path, os.path.join(prefix, name))
+        return copied
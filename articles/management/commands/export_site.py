@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import tarfile
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from articles.dumps import dump_objects
+
+# The models exported, in the order `import_articles` needs them.
+EXPORT_ORDER = ["articles.author", "articles.series", "articles.tag", "articles.article"]
+
+CHECKPOINT_NAME = "checkpoint.json"
+
+
+class HashingReader:
+    """
+    Reads a file while keeping a SHA-256 of everything read.
+
+    Lets a file be checksummed as it's copied into the archive, without
+    reading it twice.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.hash.update(data)
+        return data
+
+
+class Command(BaseCommand):
+    """
+    Exports Authors, Series, Tags and Articles along with their media.
+
+    Each export writes three files to the output directory, named after the
+    time it started: the rows as newline delimited JSON, which
+    `import_articles` and `loaddata` read; a tar archive of the files the
+    rows refer to, such as `image_raw` and `audio`; and a `sha256sum` style
+    list of the checksums of those files. Rows are read `--chunk-size` at a
+    time, by primary key, and files are streamed into the archive, so memory
+    use doesn't grow with the size of the site.
+
+    Progress is saved to `checkpoint.json` after every chunk. An export that
+    was interrupted is resumed from there, unless `--restart` is given. Once
+    an export has finished, the next one only includes Articles modified
+    since it started, unless `--full` is given; Authors, Series and Tags have
+    no modification date and are always included in full. Deleted Articles
+    aren't recorded by incremental exports.
+    """
+
+    help = "Streams Articles and their media into an NDJSON file and a tar archive, incrementally."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output",
+            help = "The directory to write the export and checkpoint to."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type = int,
+            default = 500,
+            help = "How many rows to read at a time. Defaults to 500."
+        )
+        parser.add_argument(
+            "--full",
+            action = "store_true",
+            help = "Export every Article, not only those modified since the last export."
+        )
+        parser.add_argument(
+            "--restart",
+            action = "store_true",
+            help = "Start a new export instead of resuming an interrupted one."
+        )
+
+    def handle(self, *args, **options):
+        self.output = options["output"]
+        self.chunk_size = max(1, options["chunk_size"])
+        os.makedirs(self.output, exist_ok=True)
+        checkpoint = self.read_checkpoint()
+
+        if checkpoint.get("current") and not options["restart"]:
+            self.state = checkpoint["current"]
+            self.stdout.write("Resuming export {0}.".format(self.state["name"]))
+        else:
+            started = timezone.now()
+            since = None if options["full"] else checkpoint.get("last_export")
+            self.state = {
+                "name": "export-{0}".format(started.strftime("%Y%m%dT%H%M%S")),
+                "started": started.isoformat(),
+                "since": since,
+                "model": 0,
+                "pk": None,
+                "rows": 0,
+                "files": 0,
+                "data_offset": 0,
+                "media_offset": 0,
+                "checksums_offset": 0,
+            }
+        self.checkpoint = checkpoint
+        self.checkpoint["current"] = self.state
+        self.save_checkpoint()
+
+        data_path, media_path, checksums_path = self.paths()
+        for path, offset in ((data_path, "data_offset"), (media_path, "media_offset"),
+                (checksums_path, "checksums_offset")):
+            # Anything written after the last checkpoint is written again.
+            with open(path, "ab") as file:
+                file.truncate(self.state[offset])
+        if self.state["media_offset"]:
+            # tarfile only appends to archives that end properly.
+            with open(media_path, "ab") as file:
+                file.write(tarfile.NUL * tarfile.BLOCKSIZE * 2)
+
+        with open(data_path, "a", encoding="utf-8") as data, \
+                open(checksums_path, "a", encoding="utf-8") as checksums, \
+                tarfile.open(media_path, "a" if self.state["media_offset"] else "w") as media:
+            self.archived = set(media.getnames())
+            while self.state["model"] < len(EXPORT_ORDER):
+                label = EXPORT_ORDER[self.state["model"]]
+                instances = self.next_chunk(apps.get_model(label))
+                if not instances:
+                    self.state["model"] += 1
+                    self.state["pk"] = None
+                    continue
+                for line in dump_objects(instances):
+                    data.write(line)
+                for instance in instances:
+                    self.archive(instance, media, checksums)
+                self.state["pk"] = instances[-1].pk
+                self.state["rows"] += len(instances)
+                data.flush()
+                checksums.flush()
+                media.fileobj.flush()
+                self.state["data_offset"] = data.tell()
+                self.state["checksums_offset"] = checksums.tell()
+                self.state["media_offset"] = media.offset
+                self.save_checkpoint()
+
+        self.checkpoint["last_export"] = self.state["started"]
+        self.checkpoint["current"] = None
+        self.save_checkpoint()
+        self.stdout.write("Exported {0} row(s) and {1} file(s) to {2}{3}.".format(
+            self.state["rows"],
+            self.state["files"],
+            os.path.join(self.output, self.state["name"]),
+            ", modified since {0}".format(self.state["since"]) if self.state["since"] else ""
+        ))
+
+    def paths(self) -> tuple:
+        base = os.path.join(self.output, self.state["name"])
+        return base + ".ndjson", base + ".tar", base + ".sha256"
+
+    def read_checkpoint(self) -> dict:
+        path = os.path.join(self.output, CHECKPOINT_NAME)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except ValueError as e:
+            raise CommandError("{0} is corrupt: {1}".format(path, e))
+
+    def save_checkpoint(self):
+        """
+        Writes the checkpoint, replacing the old one only once it's complete.
+        """
+
+        path = os.path.join(self.output, CHECKPOINT_NAME)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(self.checkpoint, file, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def next_chunk(self, model) -> list:
+        """
+        Returns the next `--chunk-size` rows of `model` after the checkpoint.
+
+        Rows are read in primary key order, seeking past the last one
+        exported, so each chunk is one indexed query, however far in.
+        """
+
+        #pylint: disable=E1101
+        queryset = model.objects.order_by("pk")
+        if self.state["pk"] is not None:
+            queryset = queryset.filter(pk__gt=self.state["pk"])
+        if model._meta.label_lower == "articles.article":
+            if self.state["since"]:
+                queryset = queryset.filter(date_modified__gt=parse_datetime(self.state["since"]))
+            queryset = queryset.prefetch_related("tags")
+        return list(queryset[:self.chunk_size])
+
+    def archive(self, instance: models.Model, media: tarfile.TarFile, checksums):
+        """
+        Adds the files `instance` refers to to the archive, with checksums.
+
+        Files already in the archive, such as images shared by several
+        instances, are only added once. Missing files are reported and
+        skipped.
+        """
+
+        for field in instance._meta.concrete_fields:
+            if not isinstance(field, models.FileField):
+                continue
+            file = getattr(instance, field.attname)
+            if not file or file.name in self.archived:
+                continue
+            try:
+                info = tarfile.TarInfo(file.name)
+                info.size = file.storage.size(file.name)
+                info.mtime = int(file.storage.get_modified_time(file.name).timestamp())
+                with file.storage.open(file.name, "rb") as source:
+                    reader = HashingReader(source)
+                    media.addfile(info, reader)
+            except (OSError, NotImplementedError) as e:
+                self.stderr.write("Skipped {0} of {1} {2}: {3}".format(
+                    file.name, instance._meta.verbose_name, instance.pk, e
+                ))
+                continue
+            checksums.write("{0}  {1}\n".format(reader.hash.hexdigest(), file.name))
+            self.archived.add(file.name)
+            self.state["files"] += 1
@@ -0,0 +1,284 @@
+import json
+import sys
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers import python
+from django.db import connection, models, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from articles.caching import bump_content_version
+from articles.dumps import iter_dump
+from articles.feeds import ALL_FEEDS, bump_feed_versions
+from articles.models import (Article, Series, Tag, ImageJob, forget_latest_series,
+    forget_tag_counts, images_missing, unique_slug)
+from articles.search import index_articles
+from articles.sitemaps import ALL_SITEMAPS, bump_sitemap_versions
+
+# The models that are imported, in the order their rows are inserted, so
+# that rows are inserted after those they refer to.
+IMPORT_ORDER = ["articles.author", "articles.series", "articles.tag", "articles.article"]
+
+# The field each model's slug is made from, for rows without one.
+SLUG_SOURCES = {
+    "articles.author": "name",
+    "articles.series": "name",
+    "articles.tag": "name",
+    "articles.article": "title",
+}
+
+
+@contextmanager
+def keep_dates(model_classes: list):
+    """
+    Stops `auto_now` and `auto_now_add` fields overwriting imported dates.
+
+    Args:
+        model_classes (list): The models whose date fields are kept.
+    """
+
+    changed = []
+    for model in model_classes:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.DateField) and (field.auto_now or field.auto_now_add):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+class Command(BaseCommand):
+    """
+    Imports Authors, Series, Tags and Articles from a JSON data dump.
+
+    `loaddata` saves each object in turn, running all of the save logic for
+    each one. This reads the dump as a stream, so memory use doesn't grow
+    with its size, and inserts rows with `bulk_create` in batches of
+    `--batch-size`, along with the Tags of each Article. Objects of other
+    models are skipped.
+
+    Dates are imported as they are, missing slugs are filled in, content is
+    rendered for display, and the images of objects with an `image_raw` but
+    no derived images are queued as `ImageJob`s for `process_image_jobs`,
+    instead of being built during the import. Each batch of Articles is
+    added to the search index. Afterwards each Series' `latest_article_date`
+    and each Tag's `article_count` is recalculated and cached pages are
+    invalidated.
+
+    Every object must have a primary key, as `dumpdata` writes by default.
+    The whole import is a single transaction.
+    """
+
+    help = "Streams a JSON data dump of Articles into the database with bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "dump",
+            help = (
+                "The dump to import, either a dumpdata JSON array or one "
+                "object per line. Use - to read from stdin."
+            )
+        )
+        parser.add_argument(
+            "--batch-size",
+            type = int,
+            default = 500,
+            help = "How many rows to insert at a time. Defaults to 500."
+        )
+        parser.add_argument(
+            "--ignore-conflicts",
+            action = "store_true",
+            help = "Skip rows whose primary key or slug already exists, instead of failing."
+        )
+        parser.add_argument(
+            "--no-images",
+            action = "store_true",
+            help = "Don't queue image jobs for imported images."
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = max(1, options["batch_size"])
+        self.ignore_conflicts = options["ignore_conflicts"]
+        self.queue_images = not options["no_images"]
+        self.verbosity = options["verbosity"]
+        self.models = {label: apps.get_model(label) for label in IMPORT_ORDER}
+        self.pending = {label: [] for label in IMPORT_ORDER}
+        self.tag_links = []
+        self.image_jobs = []
+        self.series_ids = set()
+        self.counts = Counter()
+        self.jobs_queued = 0
+        skipped = 0
+        started = time.perf_counter()
+
+        if options["dump"] == "-":
+            file = sys.stdin
+        else:
+            try:
+                file = open(options["dump"], encoding="utf-8")
+            except OSError as e:
+                raise CommandError("Can't open {0}: {1}".format(options["dump"], e))
+        try:
+            with transaction.atomic(), keep_dates(self.models.values()):
+                for data in iter_dump(file):
+                    label = str(data.get("model", "")).lower()
+                    if label not in self.pending:
+                        skipped += 1
+                        continue
+                    self.add(label, data)
+                    if len(self.pending[label]) >= self.batch_size:
+                        self.flush()
+                self.flush()
+                self.finish()
+        except json.JSONDecodeError as e:
+            raise CommandError("The dump isn't valid JSON: {0}".format(e))
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        elapsed = time.perf_counter() - started
+        total = sum(self.counts.values())
+        self.stdout.write(
+            "Imported {0} row(s) in {1:.1f}s ({2:.0f}/s): {3}. Skipped {4} "
+            "object(s) of other models.".format(
+                total,
+                elapsed,
+                total / elapsed if elapsed else 0,
+                ", ".join(
+                    "{0} {1}".format(self.counts[label], self.models[label]._meta.verbose_name_plural)
+                    for label in IMPORT_ORDER
+                ),
+                skipped
+            )
+        )
+        if self.jobs_queued:
+            self.stdout.write(
+                "Queued {0} image job(s); run process_image_jobs to build them.".format(
+                    self.jobs_queued
+                )
+            )
+
+    def add(self, label: str, data: dict):
+        """
+        Converts one object of the dump to an unsaved instance, and queues it
+        to be inserted with the next batch.
+        """
+
+        if data.get("pk") is None:
+            raise CommandError(
+                "Objects must have primary keys; found a {0} without one.".format(label)
+            )
+        try:
+            deserialized = next(python.Deserializer([data], ignorenonexistent=True))
+        except Exception as e:
+            raise CommandError("Can't import {0} {1}: {2}".format(label, data["pk"], e))
+        instance = deserialized.object
+        for field in instance._meta.concrete_fields:
+            if isinstance(field, models.DateField) and getattr(instance, field.attname) is None \
+                    and not field.null:
+                setattr(instance, field.attname, timezone.now())
+        if self.queue_images and hasattr(instance, "image_raw") and images_missing(instance):
+            instance.images_pending = True
+            self.image_jobs.append(ImageJob(model=label, object_id=instance.pk))
+        if label == "articles.article":
+            instance.update_rendered_content()
+            self.series_ids.add(instance.series_id)
+            through = instance._meta.get_field("tags").remote_field.through
+            self.tag_links.extend(
+                through(article_id=instance.pk, tag_id=tag)
+                for tag in deserialized.m2m_data.get("tags", [])
+            )
+        self.pending[label].append(instance)
+
+    def flush(self):
+        """
+        Inserts every queued row, in `IMPORT_ORDER`, then the Tags of the
+        Articles and the image jobs, and indexes the Articles for search.
+        """
+
+        #pylint: disable=E1101
+        article_ids = [row.pk for row in self.pending["articles.article"]]
+        for label in IMPORT_ORDER:
+            rows = self.pending[label]
+            if rows:
+                self.fill_slugs(label, rows)
+                self.models[label].objects.bulk_create(
+                    rows,
+                    batch_size = self.batch_size,
+                    ignore_conflicts = self.ignore_conflicts
+                )
+                self.counts[label] += len(rows)
+                self.pending[label] = []
+        if self.tag_links:
+            self.tag_links[0].__class__.objects.bulk_create(
+                self.tag_links,
+                batch_size = self.batch_size,
+                ignore_conflicts = self.ignore_conflicts
+            )
+            self.tag_links = []
+        if self.image_jobs:
+            ImageJob.objects.bulk_create(self.image_jobs, batch_size=self.batch_size)
+            self.jobs_queued += len(self.image_jobs)
+            self.image_jobs = []
+        if article_ids:
+            index_articles(Article.objects.filter(pk__in=article_ids).prefetch_related("tags"))
+        if self.verbosity > 1:
+            self.stdout.write("{0} row(s) so far".format(sum(self.counts.values())))
+
+    def fill_slugs(self, label: str, rows: list):
+        """
+        Gives the rows without a slug one, checking the whole batch against
+        the database at once. Only slugs which are already taken, in the
+        database or by an earlier row of the batch, fall back to
+        `unique_slug`, which checks one at a time.
+        """
+
+        #pylint: disable=E1101
+        missing = [row for row in rows if not row.slug]
+        if not missing:
+            return
+        for row in missing:
+            row.slug = slugify(getattr(row, SLUG_SOURCES[label]))[:row._meta.get_field("slug").max_length]
+        taken = set(self.models[label].objects.filter(
+            slug__in = [row.slug for row in missing]
+        ).values_list("slug", flat=True))
+        taken.update(row.slug for row in rows if row not in missing)
+        for row in missing:
+            if not row.slug or row.slug in taken:
+                row.slug = unique_slug(row, getattr(row, SLUG_SOURCES[label]), taken)
+            taken.add(row.slug)
+
+    def finish(self):
+        """
+        Brings everything that depends on the imported rows up to date.
+        """
+
+        #pylint: disable=E1101
+        self.series_ids.discard(None)
+        if self.series_ids:
+            Series.objects.filter(pk__in=self.series_ids).update_latest_article_date()
+        if self.counts["articles.article"] or self.counts["articles.tag"]:
+            Tag.objects.update_article_count()
+        # Rows were inserted with their primary keys, so sequences (on
+        # databases that have them) must be moved past them.
+        statements = connection.ops.sequence_reset_sql(no_style(), list(self.models.values()))
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+        transaction.on_commit(bump_content_version)
+        # Rows are inserted without signals, which feeds and sitemaps rely on.
+        transaction.on_commit(lambda: bump_feed_versions({ALL_FEEDS}))
+        transaction.on_commit(lambda: bump_sitemap_versions({ALL_SITEMAPS}))
+        transaction.on_commit(forget_latest_series)
+        # Imported Articles may be scheduled; see `refresh_tag_counts`.
+        transaction.on_commit(forget_tag_counts)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from articles.caching import get_page_cache_stats, reset_page_cache_stats
+
+
+class Command(BaseCommand):
+    """
+    Prints the hit and miss counts of the anonymous page cache.
+    """
+
+    help = "Prints how often the anonymous page cache was hit and missed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action = "store_true",
+            help = "Set the counters back to 0 after printing them."
+        )
+
+    def handle(self, *args, **options):
+        stats = get_page_cache_stats()
+        total = stats["hits"] + stats["misses"]
+        self.stdout.write("{0} hit(s), {1} miss(es), {2:.1%} hit rate.".format(
+            stats["hits"],
+            stats["misses"],
+            stats["hits"] / total if total else 0
+        ))
+        if options["reset"]:
+            reset_page_cache_stats()
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from articles.derivatives import run_pending_jobs
+from articles.models import ImageJob
+
+
+class Command(BaseCommand):
+    """
+    Worker that generates queued image derivatives.
+
+    Runs until stopped, checking for new jobs every `--interval` seconds, or
+    just once with `--once`. Any number of these may run at the same time.
+    """
+
+    help = "Generates the images queued by saving Authors, Series, and Articles."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action = "store_true",
+            help = "Run the jobs currently queued, then exit."
+        )
+        parser.add_argument(
+            "--interval",
+            type = float,
+            default = 5.0,
+            help = "Seconds to wait between checks for new jobs. Defaults to 5."
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action = "store_true",
+            help = "Queue failed jobs again before starting."
+        )
+
+    def handle(self, *args, **options):
+        #pylint: disable=E1101
+        if options["retry_failed"]:
+            retried = ImageJob.objects.filter(
+                status = ImageJob.FAILED
+            ).update(status=ImageJob.PENDING)
+            self.stdout.write("Queued {0} failed job(s) again.".format(retried))
+
+        while True:
+            ran = run_pending_jobs()
+            if ran:
+                self.stdout.write("Ran {0} image job(s).".format(ran))
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
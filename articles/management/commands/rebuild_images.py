@@ -0,0 +1,328 @@
+import datetime
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from io import BytesIO
+
+from articles.images import build_derivatives, get_derivative_specs, source_hash
+from articles.models import (Author, Series, Article, ImageRendition, 
+    ImageSource, reuse_images, release_file, HASH_NAME_LENGTH)
+
+
+def render(data: bytes, base_name: str, specs: list) -> tuple:
+    """
+    Builds the derived images of one source, in a worker process.
+
+    The encoded images are returned as (name, bytes) tuples rather than
+    files, so they can be sent back to the main process.
+
+    Args:
+        data (bytes): The contents of `image_raw`.
+        base_name (str): Passed on to `build_derivatives`.
+        specs (list): Passed on to `build_derivatives`.
+
+    Returns:
+        tuple: The results of `build_derivatives`, with files as tuples.
+    """
+
+    created, renditions, stats = build_derivatives(BytesIO(data), base_name, specs)
+    created = {
+        field: (image.name, image.read()) for field, image in created.items()
+    }
+    for rendition in renditions:
+        rendition["file"] = (rendition["file"].name, rendition["file"].read())
+    return created, renditions, stats
+
+
+class Command(BaseCommand):
+    """
+    Regenerates the derived images of every Author, Series, and Article.
+
+    Saving only creates derived images for empty fields, so changing
+    `IMAGE_THUMBNAIL_SIZE`, `IMAGE_FULL_SIZE` or the format settings leaves
+    existing images as they were. This rebuilds them.
+
+    Sources are read and results stored through the default storage in this
+    process, while decoding and encoding runs in a pool of `--jobs` worker
+    processes, so it works the same with local storage and `MediaStorage`.
+    Instances whose `image_hash` still matches their source and the current
+    settings are skipped, unless `--force` is given. Sources which already
+    have images registered as an `ImageSource`, including identical sources
+    met earlier in the same run, share those instead of being built again.
+    With `--force` each source is built once, and its `ImageSource` is
+    replaced, with the new images stored under the same names.
+    """
+
+    help = "Regenerates the images derived from image_raw, skipping unchanged ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--jobs",
+            type = int,
+            default = os.cpu_count() or 1,
+            help = "How many worker processes to use. Defaults to the CPU count."
+        )
+        parser.add_argument(
+            "--dry-run",
+            action = "store_true",
+            help = "List what would be rebuilt, without changing anything."
+        )
+        parser.add_argument(
+            "--since",
+            help = (
+                "Only include Articles modified on or after this date or "
+                "datetime. Authors and Series are always included."
+            )
+        )
+        parser.add_argument(
+            "--force",
+            action = "store_true",
+            help = "Rebuild images even if their hash hasn't changed."
+        )
+
+    def handle(self, *args, **options):
+        since = self.parse_since(options["since"])
+        jobs = max(1, options["jobs"])
+        specs = get_derivative_specs()
+        self.verbosity = options["verbosity"]
+        self.rebuilt = 0
+        self.failed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        # Digests built in this run, which later instances may share even
+        # with `--force`.
+        self.built = set()
+        skipped = 0
+        started = time.perf_counter()
+
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        pool = None if options["dry_run"] else ProcessPoolExecutor(max_workers=jobs)
+        pending = {}
+        waiting = {}
+        try:
+            for instance in self.get_instances(since):
+                data = self.read(instance)
+                digest = source_hash(data, specs)
+                if digest == instance.image_hash and not options["force"] \
+                        and all(getattr(instance, s.field) for s in specs):
+                    skipped += 1
+                    continue
+                if pool is None:
+                    self.stdout.write("Would rebuild {0}".format(self.describe(instance)))
+                    self.rebuilt += 1
+                    continue
+                if digest in waiting:
+                    # The same source is already being built; share it.
+                    waiting[digest].append(instance)
+                    continue
+                if (not options["force"] or digest in self.built) \
+                        and ImageSource.objects.filter(hash=digest).exists():
+                    self.store(None, instance, digest, specs)
+                    continue
+                base_name = digest[:HASH_NAME_LENGTH]
+                future = pool.submit(render, data, base_name, specs)
+                pending[future] = (instance, digest)
+                waiting[digest] = []
+                if len(pending) >= jobs * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.store(future, *pending.pop(future), specs, waiting)
+            for future in list(pending):
+                self.store(future, *pending.pop(future), specs, waiting)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        if options["dry_run"]:
+            self.stdout.write("Would rebuild {0} image(s); {1} unchanged.".format(
+                self.rebuilt, skipped
+            ))
+            return
+        self.stdout.write(
+            "Rebuilt {0} image(s) in {1:.1f}s ({2:.2f}/s); {3} unchanged, "
+            "{4} failed. {5} bytes before, {6} after, {7} saved.".format(
+                self.rebuilt,
+                elapsed,
+                self.rebuilt / elapsed if elapsed else 0,
+                skipped,
+                self.failed,
+                self.bytes_before,
+                self.bytes_after,
+                self.bytes_before - self.bytes_after
+            )
+        )
+
+    def parse_since(self, value):
+        """
+        Parses `--since` into an aware datetime, or None if it wasn't given.
+        """
+
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError("--since must be a date or datetime, such as 2020-01-31.")
+            parsed = datetime.datetime.combine(day, datetime.time())
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def get_instances(self, since):
+        """
+        Yields every Author, Series, and Article with an `image_raw`.
+        """
+
+        #pylint: disable=E1101
+        for model in (Author, Series, Article):
+            instances = model.objects.exclude(image_raw="").order_by("pk")
+            if since is not None and model is Article:
+                instances = instances.filter(date_modified__gte=since)
+            yield from instances.iterator()
+
+    def describe(self, instance) -> str:
+        return "{0} {1} ({2})".format(
+            instance._meta.verbose_name, instance.pk, instance
+        )
+
+    def read(self, instance) -> bytes:
+        instance.image_raw.open("rb")
+        try:
+            return instance.image_raw.read()
+        finally:
+            instance.image_raw.close()
+
+    def stored_bytes(self, instance, specs) -> int:
+        """
+        Returns the size of the derived images `instance` has now.
+        """
+
+        #pylint: disable=E1101
+        total = sum(
+            ImageRendition.objects.filter(
+                model = instance._meta.label_lower,
+                object_id = instance.pk
+            ).values_list("size", flat=True)
+        )
+        for spec in specs:
+            image = getattr(instance, spec.field)
+            if image:
+                try:
+                    total += image.size
+                except Exception:
+                    # Storage backends raise their own errors for missing
+                    # files; a missing image just counts as nothing.
+                    pass
+        return total
+
+    def discard_source(self, digest: str) -> set:
+        """
+        Deletes the `ImageSource` for `digest`, before images rebuilt with
+        `--force` are registered in its place.
+
+        Returns:
+            set: The (name, storage) of each of its files, for
+                `clear_target` and to release once the rebuilt images are
+                stored.
+        """
+
+        #pylint: disable=E1101
+        source = ImageSource.objects.filter(hash=digest).first()
+        if source is None:
+            return set()
+        renditions = ImageRendition.objects.filter(
+            model = ImageSource._meta.label_lower,
+            object_id = source.pk
+        )
+        files = {(r.file.name, r.file.storage) for r in renditions}
+        files |= {
+            (getattr(source, spec.field).name, getattr(source, spec.field).storage)
+            for spec in get_derivative_specs()
+        }
+        renditions.delete()
+        source.delete()
+        return files
+
+    def clear_target(self, field, name: str, replaced: set):
+        """
+        Deletes what's stored where `field` would save a rebuilt image named
+        `name`, if it's a file of the replaced `ImageSource` or nothing
+        refers to it, so the image is saved under that name rather than a
+        copy with a suffix added by the storage.
+        """
+
+        target = field.generate_filename(None, name)
+        if (target, field.storage) in replaced:
+            field.storage.delete(target)
+        else:
+            release_file(target, field.storage)
+
+    def store(self, future, instance, digest, specs, waiting=None):
+        """
+        Saves the images a worker built for `instance`, replacing the old ones.
+
+        With no `future`, the images already registered for `digest` as an
+        `ImageSource` are used instead. Once stored, instances in `waiting`
+        for the same digest share the new images, and the ImageSource of the
+        old images is pruned if nothing uses it any more.
+        """
+
+        sharing = (waiting or {}).pop(digest, [])
+        replaced = set()
+        if future is None:
+            created, renditions = None, None
+        else:
+            try:
+                created, renditions, stats = future.result()
+            except Exception as e:
+                self.failed += 1 + len(sharing)
+                self.stderr.write("Failed to rebuild {0}: {1}".format(
+                    self.describe(instance), e
+                ))
+                return
+
+        self.bytes_before += self.stored_bytes(instance, specs)
+        old_hash = instance.image_hash
+        old_files = [
+            (getattr(instance, spec.field).name, getattr(instance, spec.field).storage)
+            for spec in specs if getattr(instance, spec.field)
+        ]
+        if created is None:
+            reuse_images(instance, digest)
+        else:
+            replaced = self.discard_source(digest)
+            self.built.add(digest)
+            for field, (name, content) in created.items():
+                self.clear_target(instance._meta.get_field(field), name, replaced)
+                setattr(instance, field, ContentFile(content, name=name))
+                self.bytes_after += len(content)
+            for rendition in renditions:
+                name, content = rendition["file"]
+                self.clear_target(ImageRendition._meta.get_field("file"), name, replaced)
+                rendition["file"] = ContentFile(content, name=name)
+                self.bytes_after += len(content)
+            instance._new_renditions = renditions
+            instance._new_image_source = digest
+        instance.image_hash = digest
+        instance.images_pending = False
+        instance.save(update_fields=[s.field for s in specs] + ["image_hash", "images_pending"])
+        if created is None:
+            self.bytes_after += self.stored_bytes(instance, specs)
+        for name, storage in old_files + list(replaced):
+            release_file(name, storage)
+        if old_hash and old_hash != digest:
+            ImageSource.prune(old_hash)
+        self.rebuilt += 1
+        if self.verbosity > 1:
+            self.stdout.write("Rebuilt {0}".format(self.describe(instance)))
+        for other in sharing:
+            self.store(None, other, digest, specs)
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from articles.caching import bump_content_version
+from articles.models import RelatedArticle
+from articles.related import Corpus, build_links, write_links
+
+
+class Command(BaseCommand):
+    """
+    Relates every Article again, replacing all stored related Articles.
+
+    Articles are related as they're created and as their Tags change, so
+    this is only needed after migrating, loading fixtures or importing, or
+    after changing the `RELATED_*` settings. Every enabled Article and its
+    Tags are loaded in a few queries, and each Article's shared Tags with
+    every other are found from the Tags' lists of Articles, like multiplying
+    a sparse matrix by its transpose, so only Articles which share something
+    are ever compared. The links are written `--batch-size` at a time, in one
+    transaction.
+    """
+
+    help = "Precomputes the related Articles of every Article from shared Tags and Series."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type = int,
+            default = 1000,
+            help = "How many Articles to relate and write at a time. Defaults to 1000."
+        )
+
+    def handle(self, *args, **options):
+        #pylint: disable=E1101
+        batch_size = max(1, options["batch_size"])
+        started = time.perf_counter()
+        corpus = Corpus()
+        loaded = time.perf_counter()
+        article_ids = list(corpus.series_of)
+        written = 0
+        with transaction.atomic():
+            RelatedArticle.objects.all().delete()
+            for start in range(0, len(article_ids), batch_size):
+                links = build_links(corpus, article_ids[start:start + batch_size])
+                write_links(links)
+                written += len(links)
+            transaction.on_commit(bump_content_version)
+        self.stdout.write(
+            "Related {0} Article(s) in {1:.1f}s ({2:.1f}s loading); {3} link(s).".format(
+                len(article_ids), time.perf_counter() - started, loaded - started, written
+            )
+        )
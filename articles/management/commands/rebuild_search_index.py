@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from articles import search
+from articles.models import Article
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the search index from every Article.
+
+    Articles are indexed when they're saved, so this is only needed once
+    after migrating, after loading fixtures with `loaddata`, or after
+    changing `SEARCH_CONFIG`. The index is emptied and rebuilt in one
+    transaction, `--batch-size` Articles at a time.
+    """
+
+    help = "Empties the search index and indexes every Article again."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type = int,
+            default = 500,
+            help = "How many Articles to index at a time. Defaults to 500."
+        )
+
+    def handle(self, *args, **options):
+        #pylint: disable=E1101
+        search.forget_backend()
+        backend = search.get_backend()
+        if backend == "fallback":
+            raise CommandError(
+                "There is no search index on this database; searches use icontains."
+            )
+        batch_size = max(1, options["batch_size"])
+        started = time.perf_counter()
+        indexed = 0
+        last = None
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM {0}".format(search.SEARCH_TABLE))
+            while True:
+                # Read by primary key, seeking past the last batch, so each
+                # batch is one indexed query however far in.
+                articles = Article.objects.order_by("pk").prefetch_related("tags")
+                if last is not None:
+                    articles = articles.filter(pk__gt=last)
+                batch = list(articles[:batch_size])
+                if not batch:
+                    break
+                indexed += search.index_articles(batch)
+                last = batch[-1].pk
+            search.optimize_index()
+        self.stdout.write("Indexed {0} Article(s) in {1:.1f}s.".format(
+            indexed, time.perf_counter() - started
+        ))
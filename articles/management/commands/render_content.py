@@ -0,0 +1,80 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from articles.caching import bump_content_version
+from articles.content import content_hash, render_content
+from articles.feeds import ALL_FEEDS, bump_feed_versions
+from articles.models import Article
+
+
+class Command(BaseCommand):
+    """
+    Re-renders the content of every Article.
+
+    Content is rendered when an Article is saved, so after the rendering
+    pipeline or `CONTENT_MEDIA_URL` changes, existing Articles still show
+    the old rendering. This renders them again, skipping those whose
+    `content_hash` shows they're already up to date unless `--force` is
+    given. Rows are updated in batches without being saved, so
+    `date_modified` is left alone.
+    """
+
+    help = "Re-renders Article content for display, skipping unchanged Articles."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type = int,
+            default = 500,
+            help = "How many Articles to update at a time. Defaults to 500."
+        )
+        parser.add_argument(
+            "--force",
+            action = "store_true",
+            help = "Render every Article, even if its hash hasn't changed."
+        )
+        parser.add_argument(
+            "--dry-run",
+            action = "store_true",
+            help = "Count what would be rendered, without changing anything."
+        )
+
+    def handle(self, *args, **options):
+        #pylint: disable=E1101
+        batch_size = max(1, options["batch_size"])
+        started = time.perf_counter()
+        rendered = 0
+        unchanged = 0
+        batch = []
+        articles = Article.objects.only("pk", "content", "content_hash").order_by("pk")
+        for article in articles.iterator(chunk_size=batch_size):
+            digest = content_hash(article.content)
+            if digest == article.content_hash and not options["force"]:
+                unchanged += 1
+                continue
+            rendered += 1
+            if options["dry_run"]:
+                continue
+            article.content_rendered = render_content(article.content)
+            article.content_hash = digest
+            batch.append(article)
+            if len(batch) >= batch_size:
+                Article.objects.bulk_update(batch, ["content_rendered", "content_hash"])
+                batch = []
+        if batch:
+            Article.objects.bulk_update(batch, ["content_rendered", "content_hash"])
+
+        if options["dry_run"]:
+            self.stdout.write("Would render {0} Article(s); {1} unchanged.".format(
+                rendered, unchanged
+            ))
+            return
+        if rendered:
+            bump_content_version()
+            # Feeds show the rendered content, but are cached by their own
+            # versions, which only Article signals change.
+            bump_feed_versions({ALL_FEEDS})
+        self.stdout.write("Rendered {0} Article(s) in {1:.1f}s; {2} unchanged.".format(
+            rendered, time.perf_counter() - started, unchanged
+        ))
@@ -0,0 +1,191 @@
+import mimetypes
+import re
+
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from django.http import (FileResponse, Http404, HttpRequest, HttpResponse,
+    HttpResponseRedirect)
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from typing import Union
+
+# The modes `serve_file` may hand files off to the web server with, set by
+# `MEDIA_SENDFILE` in settings.
+X_ACCEL_REDIRECT = "x-accel-redirect"
+X_SENDFILE = "x-sendfile"
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeFile:
+    """
+    A read-only view of `length` bytes of an open file, from its position.
+
+    Meant to be streamed by `FileResponse`. It deliberately has no `fileno`
+    or `name`, so WSGI servers read it in chunks instead of sending the whole
+    rest of the underlying file with sendfile.
+    """
+
+    def __init__(self, file, length: int):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+def parse_range(header: str, size: int) -> Union[tuple, None]:
+    """
+    Parses a `Range` header for a file of `size` bytes.
+
+    Only single ranges are supported; for anything else the whole file is
+    sent, which the HTTP spec allows.
+
+    Args:
+        header (str): The value of the `Range` header.
+        size (int): The size of the file, in bytes.
+
+    Raises:
+        ValueError: Raised if the range starts past the end of the file.
+
+    Returns:
+        Union[tuple, None]: The first and last byte to send, inclusive, or
+            None to send the whole file.
+    """
+
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # A suffix range: the last `last` bytes.
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    first = int(first)
+    if first >= size:
+        raise ValueError("Range starts past the end of the file")
+    last = int(last) if last else size - 1
+    if first > last:
+        return None
+    return first, min(last, size - 1)
+
+def if_range_matches(header: str, etag: str, last_modified: int) -> bool:
+    """
+    Returns whether an `If-Range` header still matches the file.
+
+    Args:
+        header (str): The value of the `If-Range` header.
+        etag (str): The file's current, strong, ETag.
+        last_modified (int): The file's modification time, as a timestamp.
+
+    Returns:
+        bool: True if the range may be sent, False if the whole file must be.
+    """
+
+    header = header.strip()
+    if header.startswith('"') or header.startswith("W/"):
+        # Weak ETags never match for ranges.
+        return header == etag
+    return parse_http_date_safe(header) == last_modified
+
+def serve_file(request: HttpRequest, file: FieldFile) -> HttpResponse:
+    """
+    Serves a stored file, with support for ranges and conditional requests.
+
+    Large media such as `Article.audio` must support `Range` requests so a
+    player can seek without downloading the file from the start. Files in
+    storage without local paths (such as `MediaStorage`) are redirected to,
+    since S3 already supports ranges. Local files get an `ETag` and
+    `Last-Modified`, answer `If-None-Match`, `If-Modified-Since`, `Range`
+    and `If-Range`, and whole files are streamed with `FileResponse`, which
+    lets WSGI servers use sendfile.
+
+    Behind nginx or Apache, `MEDIA_SENDFILE` may be set to "x-accel-redirect"
+    or "x-sendfile" to have the web server send the file instead, along with
+    the ranges. For "x-accel-redirect", `MEDIA_ACCEL_REDIRECT_LOCATION` is
+    the internal location `MEDIA_ROOT` is served from, defaulting to
+    "/protected-media/".
+
+    Args:
+        request (HttpRequest): The incoming request.
+        file (FieldFile): The file to serve.
+
+    Raises:
+        Http404: Raised if the file is missing from local storage.
+
+    Returns:
+        HttpResponse: The file, part of it, a 304, a 416, or a redirect.
+    """
+
+    storage = file.storage
+    try:
+        path = storage.path(file.name)
+    except NotImplementedError:
+        return HttpResponseRedirect(file.url)
+
+    content_type = mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+    mode = getattr(settings, "MEDIA_SENDFILE", None)
+    if mode == X_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = "{0}{1}".format(
+            getattr(settings, "MEDIA_ACCEL_REDIRECT_LOCATION", "/protected-media/"),
+            file.name
+        )
+        return response
+    if mode == X_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+        return response
+
+    try:
+        size = storage.size(file.name)
+        last_modified = int(storage.get_modified_time(file.name).timestamp())
+    except OSError:
+        raise Http404("The file is missing.")
+    etag = '"{0:x}-{1:x}"'.format(last_modified, size)
+    response = get_conditional_response(
+        request,
+        etag = etag,
+        last_modified = last_modified
+    )
+    if response is None:
+        byte_range = None
+        header = request.META.get("HTTP_RANGE")
+        if header and if_range_matches(
+                request.META.get("HTTP_IF_RANGE", etag), etag, last_modified):
+            try:
+                byte_range = parse_range(header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = "bytes */{0}".format(size)
+
+        if response is None:
+            try:
+                source = open(path, "rb")
+            except OSError:
+                raise Http404("The file is missing.")
+            if byte_range is None:
+                response = FileResponse(source, content_type=content_type)
+                response["Content-Length"] = size
+            else:
+                first, last = byte_range
+                source.seek(first)
+                response = FileResponse(
+                    RangeFile(source, last - first + 1),
+                    status = 206,
+                    content_type = content_type
+                )
+                response["Content-Range"] = "bytes {0}-{1}/{2}".format(first, last, size)
+                response["Content-Length"] = last - first + 1
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
@@ -0,0 +1,81 @@
+# Generated by Django 2.2.28 on 2026-10-18 00:35
+
+import articles.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0002_auto_20180817_1635'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_finished', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['date_created', 'pk'],
+            },
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='images_pending',
+            field=models.BooleanField(default=False, editable=False, help_text='Set while the images derived from image_raw are still being generated'),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='images_pending',
+            field=models.BooleanField(default=False, editable=False, help_text='Set while the images derived from image_raw are still being generated'),
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='images_pending',
+            field=models.BooleanField(default=False, editable=False, help_text='Set while the images derived from image_raw are still being generated'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='enabled',
+            field=models.BooleanField(default=True, help_text='If this article should be accessible to the public or not'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='image_full',
+            field=models.ImageField(blank=True, help_text='Will be auto-generated from image_raw; leave blank', null=True, upload_to='uploads/'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='image_raw',
+            field=models.ImageField(blank=True, help_text='A base image that will be manipulated to generate other image fields.', null=True, upload_to='uploads/'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, help_text='Will be auto-generated from image_raw; leave blank', null=True, upload_to='uploads/'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='image_thumbnail_transparent',
+            field=models.ImageField(blank=True, help_text='Will be auto-generated from image_raw; leave blank', null=True, upload_to='uploads/'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='publish_date',
+            field=models.DateTimeField(default=articles.models.now),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='series',
+            field=models.ForeignKey(default=articles.models.get_latest_series, on_delete=django.db.models.deletion.SET_DEFAULT, to='articles.Series'),
+        ),
+    ]
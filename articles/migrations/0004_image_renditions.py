@@ -0,0 +1,35 @@
+# Generated by Django 2.2.28 on 2026-10-18 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0003_image_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageRendition',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.PositiveIntegerField()),
+                ('field', models.CharField(max_length=50)),
+                ('format', models.CharField(max_length=10)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('file', models.FileField(upload_to='uploads/')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='imagerendition',
+            index=models.Index(fields=['model', 'object_id'], name='articles_im_model_e6f879_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='imagerendition',
+            unique_together={('model', 'object_id', 'field', 'format')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 00:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0004_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='imagerendition',
+            unique_together={('model', 'object_id', 'field', 'format', 'width')},
+        ),
+    ]
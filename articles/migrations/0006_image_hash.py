@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0005_rendition_widths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash of image_raw and the image settings the other image fields were generated with', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash of image_raw and the image settings the other image fields were generated with', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='series',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash of image_raw and the image settings the other image fields were generated with', max_length=64),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0006_image_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageSource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64, unique=True)),
+                ('image_thumbnail', models.ImageField(upload_to='uploads/')),
+                ('image_thumbnail_transparent', models.ImageField(upload_to='uploads/')),
+                ('image_full', models.ImageField(upload_to='uploads/')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
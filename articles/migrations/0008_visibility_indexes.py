@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 00:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0007_image_sources'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['enabled', '-publish_date', '-date_modified'], name='article_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['series', 'enabled', '-publish_date', '-date_modified'], name='article_series_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['author', 'enabled', '-publish_date', '-date_modified'], name='article_author_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='series',
+            index=models.Index(fields=['-latest_article_date'], name='series_latest_idx'),
+        ),
+    ]
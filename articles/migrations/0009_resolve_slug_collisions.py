@@ -0,0 +1,54 @@
+from django.db import migrations
+from django.utils.text import slugify
+
+# The field each model's slug is made from.
+SLUG_SOURCES = {
+    "Author": "name",
+    "Series": "name",
+    "Tag": "name",
+    "Article": "title",
+}
+
+
+def resolve_slug_collisions(apps, schema_editor):
+    """
+    Gives every Author, Series, Tag and Article a slug no other has.
+
+    Missing slugs are made from the name or title. Where slugs collide, the
+    oldest instance keeps its slug and the others get a number added to the
+    end, skipping any slug already in use, so existing URLs keep working
+    wherever they can.
+    """
+
+    for model_name, source in SLUG_SOURCES.items():
+        model = apps.get_model("articles", model_name)
+        max_length = model._meta.get_field("slug").max_length
+        instances = list(model.objects.order_by("pk"))
+        taken = {i.slug for i in instances if i.slug}
+        seen = set()
+        for instance in instances:
+            slug = instance.slug
+            if slug and slug not in seen:
+                seen.add(slug)
+                continue
+            base = (slug or slugify(getattr(instance, source)) or model_name.lower())[:max_length]
+            slug = base
+            number = 2
+            while slug in taken or slug in seen:
+                suffix = "-{0}".format(number)
+                slug = base[:max_length - len(suffix)].rstrip("-") + suffix
+                number += 1
+            seen.add(slug)
+            taken.add(slug)
+            model.objects.filter(pk=instance.pk).update(slug=slug)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0008_visibility_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_slug_collisions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-18 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0009_resolve_slug_collisions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='article',
+            name='slug',
+            field=models.SlugField(blank=True, editable=False, help_text='Slugs are short versions of the title used for URLs', null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='author',
+            name='slug',
+            field=models.SlugField(blank=True, editable=False, help_text='A no space name to be used for URLs', null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='series',
+            name='slug',
+            field=models.SlugField(blank=True, editable=False, help_text='The short version of the name to use in URLs', null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(blank=True, editable=False, unique=True),
+        ),
+    ]
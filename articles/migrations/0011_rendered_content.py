@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0010_unique_slugs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the content and the pipeline it was rendered with', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='content_rendered',
+            field=models.TextField(blank=True, editable=False, help_text='The content as displayed, rendered when the article is saved'),
+        ),
+    ]
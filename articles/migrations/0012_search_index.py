@@ -0,0 +1,64 @@
+import sys
+
+from django.db import OperationalError, migrations
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Creates the search index for the database in use.
+
+    SQLite gets an FTS5 table, if it was built with FTS5, also indexing the
+    first two, three and four letters of each word for searches of words
+    still being typed. PostgreSQL gets a table of `tsvector`s with a GIN
+    index. Other databases, and SQLite without FTS5, get nothing, and
+    searches fall back to `icontains`.
+    """
+
+    from articles import search
+
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE {0} USING fts5({1}, "
+                "tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3 4')".format(
+                    search.SEARCH_TABLE, ", ".join(search.WEIGHTS)
+                )
+            )
+        except OperationalError as e:
+            if "no such module" not in str(e):
+                raise
+            sys.stderr.write(
+                "\n  Warning: SQLite was built without FTS5 ({0}), so searches "
+                "will use the unranked icontains fallback.\n".format(e)
+            )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE TABLE {0} (article_id integer PRIMARY KEY REFERENCES "
+            "articles_article (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)".format(search.SEARCH_TABLE)
+        )
+        schema_editor.execute(
+            "CREATE INDEX {0}_document_idx ON {0} USING GIN (document)".format(
+                search.SEARCH_TABLE
+            )
+        )
+    search.forget_backend()
+
+def drop_search_index(apps, schema_editor):
+    from articles import search
+
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("DROP TABLE IF EXISTS {0}".format(search.SEARCH_TABLE))
+    search.forget_backend()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0011_rendered_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
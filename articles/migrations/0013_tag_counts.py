@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-18 01:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def count_articles(apps, schema_editor):
+    """
+    Sets `article_count` of every Tag to its number of visible Articles.
+    """
+
+    Tag = apps.get_model("articles", "Tag")
+    Article = apps.get_model("articles", "Article")
+    visible = Article.tags.through.objects.filter(
+        tag = OuterRef("pk"),
+        article__enabled = True,
+        article__publish_date__lte = timezone.now()
+    ).order_by().values("tag").annotate(count=Count("pk")).values("count")
+    Tag.objects.update(article_count=Coalesce(Subquery(visible), 0))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0012_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='article_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='How many visible articles have this tag'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-article_count', 'name'], name='tag_cloud_idx'),
+        ),
+        migrations.RunPython(count_articles, migrations.RunPython.noop),
+    ]
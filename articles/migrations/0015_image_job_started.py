@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0014_related_articles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='date_started',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:40
+
+import articles.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0015_image_job_started'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='article',
+            name='series',
+            field=models.ForeignKey(on_delete=articles.models.move_to_latest_series, to='articles.Series'),
+        ),
+    ]
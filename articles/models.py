@@ -1,125 +1,234 @@
 import datetime
-import sys
+import hashlib
+import os
 
-from django.db import models
+from io import BytesIO
+from django.core.cache import cache
+from django.db import models, connections, IntegrityError, transaction
+from django.db.models import Count, F, Min, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.text import slugify
 from django.db.models.query import QuerySet
-from django.core.files.uploadedfile import InMemoryUploadedFile
-from django.conf import settings
 from PIL import Image
 from typing import Union
-from io import BytesIO
 
+from . import derivatives
+from .caching import get_content_version
+from .content import content_hash, render_content
+from .related import get_related_count
+from .sitemaps import SITEMAP_PAGES, bump_sitemap_versions
+from .images import (build_derivatives, get_derivative_specs, get_ladder,
+    encode_image, resize_to_width, source_hash, FORMAT_CONTENT_TYPES,
+    FORMAT_EXTENSIONS)
 
-def _create_image(
-    instance: models.Model, 
-    size: tuple, 
-    suffix: str,
-    set_alpha: bool = False
-    ) -> InMemoryUploadedFile:
-    """
-    Creates a new image based on the `instance.image_raw`, ready for upload.
+# How many characters of a hash content addressed images are named with.
+HASH_NAME_LENGTH = 32
 
-    This code was modified from https://djangosnippets.org/snippets/10597/
+# What `get_latest_series` last found, for this process, and the content
+# version it was found at.
+_latest_series = {}
 
-    Takes an incoming instance of a model, accesses that instance's `image_raw`
-    field, and creates a new image. The new image will have its deminsions set
-    by the `size` argument, and have the `suffix` appended to its name. If 
-    `set_alpha` is true, will also have a 50% alpha layer added. The new image
-    will be a PNG. The new image will be ready to be added as a field to a
-    model.
+# The cache key of when `Tag.article_count` next needs refreshing, because
+# a scheduled Article goes live. See `refresh_tag_counts`.
+TAG_COUNTS_KEY = "articles:tag_counts_until"
+
+
+def images_missing(instance: models.Model) -> bool:
+    """
+    Returns whether any image derived from `instance.image_raw` is missing.
     
     Args:
-        instance (models.Model): The instance of a model. This instance must
-            have an image set to the `image_raw` field.
-        size (tuple): The dimensions the new image will have.
-        suffix (str): A string to append to the end of the image's name.
-        set_alpha (bool, optional): Defaults to False. Weather or not a 50%
-            alpha layer should be added to the image.
+        instance (models.Model): An Author, Series, or Article.
     
     Returns:
-        InMemoryUploadedFile: The new image, saved in memory and ready to be
-            set to a field on the instance and uploaded.
+        bool: True if `image_raw` is set but at least one of the derived
+            image fields is still empty.
     """
 
-    image = Image.open(instance.image_raw)
-    output = BytesIO() # Don't want to write to disk, so we use memory instead.
-    base_name = instance.image_raw.name.split(".")[0]
+    return bool(instance.image_raw) and not (
+        instance.image_thumbnail 
+        and instance.image_thumbnail_transparent 
+        and instance.image_full
+    )
 
-    resized = image.copy()
-    resized.thumbnail(size, Image.ANTIALIAS) # Thumbnail modifies in-place.
-    resized_name = "{0}_{1}.png".format(base_name, suffix)
-    
-    if set_alpha:
-        resized.putalpha(127) # Putalpha also modifies in-place.
+def read_image_raw(instance: models.Model) -> bytes:
+    """
+    Returns the contents of `instance.image_raw`.
 
-    resized.save(output, format="PNG", quality=100)
-    output.seek(0)
-    
-    prepped_image = InMemoryUploadedFile(
-        output,
-        'ImageField',
-        resized_name,
-        'image/png',
-        sys.getsizeof(output),
-        None
-    )
-    return prepped_image
+    The file is left open, since a new upload must still be readable when
+    the instance is saved.
+
+    Args:
+        instance (models.Model): An Author, Series, or Article with an image
+            in `image_raw`.
 
-def create_image_thumbnail(instance: models.Model):
+    Returns:
+        bytes: The image file's contents.
     """
-    Adds a modified version of `instance.image_raw` to `instance.image_thumbnail`.
 
-    The settings file must have an attribute `IMAGE_THUMBNAIL_SIZE` which must
-    contain a tuple holding the size dimensions of the thumbnail image.
-    
+    instance.image_raw.open("rb")
+    data = instance.image_raw.read()
+    instance.image_raw.seek(0)
+    return data
+
+def name_image_raw(instance: models.Model):
+    """
+    Names a newly uploaded `image_raw` after a hash of its contents.
+
+    Identical uploads then share one stored file, instead of being stored
+    again, or clobbering a different image that happened to share its name.
+    If the image is already stored, the upload is dropped and the stored 
+    file used instead.
+
     Args:
-        instance (models.Model): The instance to which the thumbnail image
-            should be added. The instance must have an image in the `image_raw`
-            field and have an `image_thumbnail` field.
+        instance (models.Model): The Author, Series, or Article being saved.
+    """
+
+    image_raw = instance.image_raw
+    if not image_raw or image_raw._committed:
+        return
+    digest = hashlib.sha256(read_image_raw(instance)).hexdigest()
+    name = digest[:HASH_NAME_LENGTH] + os.path.splitext(image_raw.name)[1].lower()
+    stored = image_raw.field.generate_filename(instance, name)
+    if image_raw.storage.exists(stored):
+        instance.image_raw = stored
+    else:
+        image_raw.name = name
+
+def reuse_images(instance: models.Model, digest: str) -> bool:
     """
+    Points the image fields of `instance` at images already made for `digest`.
 
-    img = _create_image(instance, settings.IMAGE_THUMBNAIL_SIZE, "thumbnail")
-    instance.image_thumbnail = img
+    Nothing is decoded, encoded, or stored; the instance shares the files of
+    the `ImageSource` registered for the same source and settings.
 
-def create_image_thumbnail_transparent(instance: models.Model):
+    Args:
+        instance (models.Model): An Author, Series, or Article.
+        digest (str): The `source_hash` of its `image_raw`.
+
+    Returns:
+        bool: True if an `ImageSource` was found and used.
     """
-    Adds a modified version of `instance.image_raw` to `instance.image_thumbnail_transparent`.
 
-    The settings file must have an attribute `IMAGE_THUMBNAIL_SIZE` which must
-    contain a tuple holding the size dimensions of the thumbnail image.
+    #pylint: disable=E1101
+    source = ImageSource.objects.filter(hash=digest).first()
+    if source is None:
+        return False
+    for spec in get_derivative_specs():
+        setattr(instance, spec.field, getattr(source, spec.field).name)
+    instance._new_renditions = [
+        {
+            "field": r.field,
+            "format": r.format,
+            "width": r.width,
+            "height": r.height,
+            "size": r.size,
+            "file": r.file.name,
+        }
+        for r in ImageRendition.objects.filter(
+            model = ImageSource._meta.label_lower,
+            object_id = source.pk
+        )
+    ]
+    instance.image_hash = digest
+    return True
+
+def create_images(instance: models.Model) -> list:
+    """
+    Fills in every empty image field of `instance` from `instance.image_raw`.
+
+    Fields that already have an image are left alone. All missing images
+    are created from a single decode of `image_raw`; see 
+    `articles.images.build_derivatives`. Their alternate formats are kept
+    on the instance and stored as `ImageRendition`s when it is saved. 
+    
+    If every field is missing, the images are content addressed: they are
+    named after the `source_hash` of `image_raw` and the image settings, 
+    which is kept in `image_hash`. If an `ImageSource` already has images
+    for that hash, they are reused instead of being made again; otherwise 
+    the new images are registered as one once the instance is saved.
     
     Args:
-        instance (models.Model): The instance to which the transparent 
-            thumbnail image should be added. The instance must have an image 
-            in the `image_raw` field and have an `image_thumbnail_transparent` 
-            field.
+        instance (models.Model): An Author, Series, or Article with an image
+            in `image_raw`.
+
+    Returns:
+        list: The timing and memory stats of each image created.
     """
 
-    img = _create_image(
-        instance, settings.IMAGE_THUMBNAIL_SIZE, 
-        "thumbnail_transparent", 
-        set_alpha=True
+    specs = [
+        spec for spec in get_derivative_specs() 
+        if not getattr(instance, spec.field)
+    ]
+    if not specs:
+        return []
+    data = read_image_raw(instance)
+    base_name = instance.image_raw.name.split(".")[0]
+    digest = None
+    if len(specs) == len(get_derivative_specs()):
+        digest = source_hash(data, specs)
+        if reuse_images(instance, digest):
+            return []
+        base_name = digest[:HASH_NAME_LENGTH]
+    created, renditions, stats = build_derivatives(
+        BytesIO(data), base_name, specs
     )
-    instance.image_thumbnail_transparent = img
-
-def create_image_full(instance: models.Model):
+    for field, image in created.items():
+        setattr(instance, field, image)
+    if digest is not None:
+        instance.image_hash = digest
+        instance._new_image_source = digest
+    # Renditions need the instance's pk, so they're stored once it's saved.
+    instance._new_renditions = renditions
+    return stats
+
+def prepare_images(instance: models.Model):
     """
-    Adds a modified version of `instance.image_raw` to `instance.image_full`.
+    Creates or schedules the derived images of `instance`, before it is saved.
 
-    The settings file must have an attribute `IMAGE_FULL_SIZE` which must
-    contain a tuple holding the size dimensions of the image.
+    A new `image_raw` is first named after its contents (see 
+    `name_image_raw`). With the synchronous executor the images are created
+    right away, as part of the save. Otherwise `images_pending` is set, and
+    once the instance is saved a job is queued to create them in the 
+    background (see `articles.derivatives`).
     
     Args:
-        instance (models.Model): The instance to which the full-sized image 
-            should be added. The instance must have an image in the `image_raw` 
-            field and have an `image_full` field.
+        instance (models.Model): The Author, Series, or Article being saved.
+    """
+
+    name_image_raw(instance)
+    if images_missing(instance):
+        if derivatives.is_synchronous():
+            create_images(instance)
+            instance.images_pending = False
+        else:
+            instance.images_pending = True
+
+def release_file(name: str, storage):
+    """
+    Deletes a stored image, unless anything still refers to it.
+
+    Content addressed images may be shared by many instances, renditions, 
+    and `ImageSource`s, so files are only deleted once the last is gone.
+
+    Args:
+        name (str): The name of the file in `storage`.
+        storage: The storage the file is in.
     """
 
-    img = _create_image(instance, settings.IMAGE_FULL_SIZE, "full")
-    instance.image_full = img
+    #pylint: disable=E1101
+    if not name or ImageRendition.objects.filter(file=name).exists():
+        return
+    fields = ["image_thumbnail", "image_thumbnail_transparent", "image_full"]
+    for model in (Author, Series, Article, ImageSource):
+        refers = models.Q(image_raw=name) if model is not ImageSource else models.Q()
+        for field in fields:
+            refers |= models.Q(**{field: name})
+        if model.objects.filter(refers).exists():
+            return
+    storage.delete(name)
 
 def now():
     """
@@ -135,6 +244,114 @@ def now():
 
     return timezone.now()
 
+def unique_slug(instance: models.Model, value: str, taken: set = None) -> str:
+    """
+    Returns a slug of `value` that no other instance of the model has.
+
+    Slugs are unique, but different names can slugify the same way (such as
+    "C++" and "C"), so a number is added to the end until the slug is free.
+    Slugs are also cut down to the length of the field.
+
+    Args:
+        instance (models.Model): The instance the slug is for.
+        value (str): What to slugify, such as the instance's name.
+        taken (set, optional): Defaults to None. Slugs to avoid as well as
+            those in the database, such as those of unsaved instances.
+
+    Returns:
+        str: The slug.
+    """
+
+    max_length = instance._meta.get_field("slug").max_length
+    base = (slugify(value) or instance._meta.model_name)[:max_length]
+    others = type(instance)._default_manager.exclude(pk=instance.pk)
+    slug = base
+    number = 2
+    taken = taken or set()
+    while slug in taken or others.filter(slug=slug).exists():
+        suffix = "-{0}".format(number)
+        slug = base[:max_length - len(suffix)].rstrip("-") + suffix
+        number += 1
+    return slug
+
+class SeriesQuerySet(QuerySet):
+    """
+    Custom QuerySet for Series, available as `Series.objects`.
+    """
+
+    def with_latest_list(self, count: int = 5) -> QuerySet:
+        """
+        Prefetches the latest `count` visible Articles of every Series.
+
+        The Articles for all Series in the QuerySet are fetched in a single
+        extra query, no matter how many Series there are. Each Series is
+        limited to its newest `count` Articles with a correlated, sliced
+        subquery. Databases which cannot slice an `IN` subquery (such
+        as MySQL) instead fetch every visible Article of the Series and the
+        list is trimmed when read. The result is stored on each Series as
+        `prefetched_latest_list`, which `Series.latest_list` will use instead
+        of running its own query.
+
+        Args:
+            count (int, optional): Defaults to 5. The maximum amount of
+                Articles to prefetch for each Series.
+
+        Returns:
+            QuerySet: This QuerySet, with the latest Articles prefetched.
+        """
+
+        #pylint: disable=E1101
+        articles = Article.get_available_articles()
+        if connections[self.db].features.allow_sliced_subqueries_with_in:
+            newest = Article.get_available_articles().filter(
+                series = OuterRef("series")
+            ).values("pk")[:count]
+            articles = articles.filter(pk__in=Subquery(newest))
+        return self.prefetch_related(Prefetch(
+            "article_set",
+            queryset = articles,
+            to_attr = "prefetched_latest_list"
+        ))
+
+    def bump_latest_article_date(self, date: datetime.datetime) -> int:
+        """
+        Sets `latest_article_date` to `date` on the Series where it is older.
+
+        Done with a single conditional `UPDATE`, without loading or saving
+        any Series.
+
+        Args:
+            date (datetime.datetime): The `publish_date` of an enabled
+                Article.
+
+        Returns:
+            int: How many Series were updated.
+        """
+
+        return self.filter(
+            Q(latest_article_date__isnull=True) | Q(latest_article_date__lt=date)
+        ).update(latest_article_date=date)
+
+    def update_latest_article_date(self) -> int:
+        """
+        Recalculates `latest_article_date` of every Series in the QuerySet.
+
+        Needed when an Article is deleted, disabled, moved to another Series
+        or published earlier, none of which `bump_latest_article_date` can
+        handle. Done with a single `UPDATE` and a correlated subquery; Series
+        without enabled Articles are set to None.
+
+        Returns:
+            int: How many Series were updated.
+        """
+
+        #pylint: disable=E1101
+        newest = Article.objects.filter(
+            series = OuterRef("pk"),
+            enabled = True
+        ).order_by("-publish_date").values("publish_date")[:1]
+        return self.update(latest_article_date=Subquery(newest))
+
 # Create your models here.
 class Author(models.Model):
     """
@@ -167,7 +384,13 @@ class Author(models.Model):
             than `image_thumbnail`. Should generally be left blank. Will be 
             automatically created when the model is saved if `image_raw` 
             exists.
-        slug (SlugField): A slug based on the instance's name. Will be
+        images_pending (BooleanField): True while the images derived from
+            `image_raw` are queued to be generated in the background. Not
+            editable.
+        image_hash (CharField): A hash of `image_raw` and the settings the
+            derived images were last generated with, used to skip images
+            that haven't changed. Not editable.
+        slug (SlugField): A unique slug based on the instance's name. Will be
             automatically generated on save. Used for URLs. Not editable.
 
     """
@@ -197,8 +420,21 @@ class Author(models.Model):
         upload_to = "uploads/",
         help_text = "A good-sized version of the base image. Will be auto-generated from image_raw; leave blank"
     )
+    images_pending = models.BooleanField(
+        default = False,
+        editable = False,
+        help_text = "Set while the images derived from image_raw are still being generated"
+    )
+    image_hash = models.CharField(
+        max_length = 64,
+        blank = True,
+        default = "",
+        editable = False,
+        help_text = "Hash of image_raw and the image settings the other image fields were generated with"
+    )
     slug = models.SlugField(
         help_text = "A no space name to be used for URLs",
+        unique = True,
         blank = True,
         null = True,
         editable = False
@@ -225,7 +461,8 @@ class Author(models.Model):
         This method does two basic tasks before saving the model. First, it
         will set `self.slug` to a slugified version of `self.name`. Second,
         it manipulates `self.image_raw` to generate the images to be used
-        for the other image fields.
+        for the other image fields, or schedules that to happen in the
+        background (see `prepare_images`).
 
         Args:
             *args: Not used here; called because Django expects it.
@@ -233,14 +470,8 @@ class Author(models.Model):
         """
 
         if not self.slug:
-            self.slug = slugify(self.name)
-        if self.image_raw:
-            if not self.image_thumbnail:
-                create_image_thumbnail(self)
-            if not self.image_thumbnail_transparent:
-                create_image_thumbnail_transparent(self)
-            if not self.image_full:
-                create_image_full(self)
+            self.slug = unique_slug(self, self.name)
+        prepare_images(self)
         super().save(*args, **kwargs)
 
 class Series(models.Model):
@@ -256,9 +487,9 @@ class Series(models.Model):
             from this name. Max length 40 and must be unique.
         description (TextField): A description of the series. Should be short
             and succinct, but max length is not enforced.
-        slug (SlugField): A slug based on the `name` attribute, to be used for
-            URLs. This will be automatically created when the instance is first 
-            saved, and is uneditable.
+        slug (SlugField): A unique slug based on the `name` attribute, to be
+            used for URLs. This will be automatically created when the
+            instance is first saved, and is uneditable.
         image_raw (ImageField): A base image to be used to represent this
             author. The image in this field will be manipulated to
             automatically generate the images for the other image fields.
@@ -277,10 +508,18 @@ class Series(models.Model):
             than `image_thumbnail`. Should generally be left blank. Will be 
             automatically created when the model is saved if `image_raw` 
             exists.
-        latest_article_date (DateTimeField): The datetime the newest Article
-            of this Series was published. This should not be set manually; will
-            be set automatically when an Article is saved. This is used to
-            order Series.
+        images_pending (BooleanField): True while the images derived from
+            `image_raw` are queued to be generated in the background. Not
+            editable.
+        image_hash (CharField): A hash of `image_raw` and the settings the
+            derived images were last generated with, used to skip images
+            that haven't changed. Not editable.
+        latest_article_date (DateTimeField): The datetime the newest enabled
+            Article of this Series was published. This should not be set
+            manually; it is kept up to date as Articles are saved and
+            deleted. This is used to order Series.
+        objects (SeriesQuerySet): The default manager. Provides
+            `with_latest_list` to batch the lookups done by `latest_list`.
         
     """
 
@@ -295,6 +534,7 @@ class Series(models.Model):
     )
     slug = models.SlugField(
         help_text = "The short version of the name to use in URLs",
+        unique = True,
         null = True,
         editable = False,
         blank = True
@@ -323,12 +563,26 @@ class Series(models.Model):
         upload_to = "uploads/",
         help_text = "A good-sized version of the base image. Will be auto-generated from image_raw; leave blank"
     )
+    images_pending = models.BooleanField(
+        default = False,
+        editable = False,
+        help_text = "Set while the images derived from image_raw are still being generated"
+    )
+    image_hash = models.CharField(
+        max_length = 64,
+        blank = True,
+        default = "",
+        editable = False,
+        help_text = "Hash of image_raw and the image settings the other image fields were generated with"
+    )
     latest_article_date = models.DateTimeField(
         null = True, 
         blank = True,
         help_text = "The date and time the newest Article of this Series was published. Will be set automatically when an Article is created."
     )
 
+    objects = SeriesQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -350,7 +604,8 @@ class Series(models.Model):
         This method does two basic tasks before saving the model. First, it
         will set `self.slug` to a slugified version of `self.name`. Second,
         it manipulates `self.image_raw` to generate the images to be used
-        for the other image fields.
+        for the other image fields, or schedules that to happen in the
+        background (see `prepare_images`).
 
         Args:
             *args: Not used here; called because Django expects it.
@@ -358,33 +613,32 @@ class Series(models.Model):
         """
 
         if not self.slug:
-            self.slug = slugify(self.name)
-        if self.image_raw:
-            if not self.image_thumbnail:
-                create_image_thumbnail(self)
-            if not self.image_thumbnail_transparent:
-                create_image_thumbnail_transparent(self)
-            if not self.image_full:
-                create_image_full(self)
+            self.slug = unique_slug(self, self.name)
+        prepare_images(self)
         super().save(*args, **kwargs)
 
-    def latest_list(self) -> Union[QuerySet, None]:
+    def latest_list(self) -> Union[list, None]:
         """
         Returns the latest five Articles of this Series.
 
-        If this Series has no Articles, it will instead return None.
+        If this Series has no Articles, it will instead return None. If the
+        Series was loaded through `Series.objects.with_latest_list`, the
+        prefetched Articles are used and no query is made.
         
         Returns:
-            Union[QuerySet, None]: Either the QuerySet of the latest
-                Articles, or None if no Articles could be found.
+            Union[list, None]: Either the list of the latest Articles, or 
+                None if no Articles could be found.
         """
 
         #pylint: disable=E1101
-        articles = self.article_set.filter(
-            enabled = True,
-            publish_date__lte = timezone.now()
-        )
-        return articles[:5] if articles else None
+        if hasattr(self, "prefetched_latest_list"):
+            articles = self.prefetched_latest_list[:5]
+        else:
+            articles = list(self.article_set.filter(
+                enabled = True,
+                publish_date__lte = timezone.now()
+            )[:5])
+        return articles if articles else None
 
     def latest_article(self) -> Union["Article", None]:
         """
@@ -407,25 +661,167 @@ class Series(models.Model):
                 of the default Seriess
             ordering (list): Sets default ordering for Series to
                 `latest_article_date`, descending.
+            indexes (list): Series are always listed in that order.
         """
 
         verbose_name_plural = "series"
         ordering = ["-latest_article_date"]
+        indexes = [
+            models.Index(fields=["-latest_article_date"], name="series_latest_idx"),
+        ]
+
+def _latest_series_query(exclude: list = ()) -> Union[int, None]:
+    """
+    Returns the primary key of the Series with the newest Article, or of the
+    newest Series with no Articles if one was added since, leaving out
+    `exclude`.
+    """
 
-def get_latest_series():
     #pylint: disable=E1101
-    series = Series.objects.latest("latest_article_date")
-    return series if series else Series.objects.all()[0]
+    return Series.objects.exclude(pk__in=exclude).order_by(
+        F("latest_article_date").desc(nulls_first=True), "-pk"
+    ).values_list("pk", flat=True).first()
+
+def get_latest_series() -> Union[int, None]:
+    """
+    Returns the primary key of the Series new Articles go in by default.
+
+    That's the Series with the newest Article, unless a Series with no
+    Articles was added since, in which case it's the newest of those.
+    `Article.save` uses it for Articles saved without a Series, so making an
+    Article doesn't query. The key is kept for this process under the
+    content version, which any Article or Series change in any process
+    changes, so a Series deleted elsewhere is never handed out; saving
+    several Articles between changes makes one query.
+
+    Returns:
+        Union[int, None]: The primary key, or None if there are no Series.
+    """
+
+    version = get_content_version()
+    if _latest_series.get("version") != version:
+        _latest_series["pk"] = _latest_series_query()
+        _latest_series["version"] = version
+    return _latest_series["pk"]
+
+def move_to_latest_series(collector, field, sub_objs, using):
+    """
+    `on_delete` of `Article.series`: moves the Articles of a deleted Series
+    to the Series `get_latest_series` would pick from those that are left.
+    """
+
+    deleted = [series.pk for series in collector.data.get(Series, ())]
+    collector.add_field_update(field, _latest_series_query(deleted), sub_objs)
+
+def forget_latest_series():
+    """
+    Makes the next `get_latest_series` look the Series up again.
+    """
+
+    _latest_series.clear()
+
+def refresh_tag_counts():
+    """
+    Brings `Tag.article_count` up to date if a scheduled Article has gone
+    live since the counts were last refreshed.
+
+    Counts are kept up to date as Articles and their Tags change, but an
+    Article becoming visible when its `publish_date` passes doesn't change
+    anything. So the `publish_date` of the next scheduled Article with Tags
+    is kept in the cache, and once it has passed (or the cache has lost it)
+    every count is recalculated with one `UPDATE`. Otherwise this only reads
+    the cache.
+    """
+
+    #pylint: disable=E1101
+    until = cache.get(TAG_COUNTS_KEY)
+    moment = now()
+    if until is not None and (until == 0 or until > moment.timestamp()):
+        return
+    Tag.objects.update_article_count()
+    scheduled = Article.objects.filter(
+        enabled = True,
+        publish_date__gt = moment,
+        tags__isnull = False
+    ).aggregate(next_publish=Min("publish_date"))["next_publish"]
+    cache.set(TAG_COUNTS_KEY, scheduled.timestamp() if scheduled else 0, None)
+
+def schedule_tag_counts(moment: datetime.datetime):
+    """
+    Makes `refresh_tag_counts` refresh the counts at `moment`, if it
+    wouldn't already, such as when an Article is scheduled.
+
+    Args:
+        moment (datetime.datetime): When an Article goes live.
+    """
+
+    until = cache.get(TAG_COUNTS_KEY)
+    if until is not None and (until == 0 or moment.timestamp() < until):
+        cache.set(TAG_COUNTS_KEY, moment.timestamp(), None)
+
+def forget_tag_counts():
+    """
+    Makes the next `refresh_tag_counts` recalculate every count, such as
+    after Articles were imported without their signals being sent.
+    """
+
+    cache.delete(TAG_COUNTS_KEY)
+
+class TagQuerySet(QuerySet):
+    """
+    Custom QuerySet for Tags, available as `Tag.objects`.
+    """
+
+    def update_article_count(self) -> int:
+        """
+        Recalculates `article_count` of every Tag in the QuerySet.
+
+        Done with a single `UPDATE` and a correlated subquery counting each
+        Tag's visible Articles, without loading any Tags. The pages sitemap,
+        which lists the Tags in use, is invalidated.
+
+        Returns:
+            int: How many Tags were updated.
+        """
+
+        #pylint: disable=E1101
+        visible = Article.tags.through.objects.filter(
+            tag = OuterRef("pk"),
+            article__enabled = True,
+            article__publish_date__lte = now()
+        ).order_by().values("tag").annotate(count=Count("pk")).values("count")
+        updated = self.update(article_count=Coalesce(Subquery(visible), 0))
+        bump_sitemap_versions({SITEMAP_PAGES})
+        return updated
+
+    def in_cloud(self) -> QuerySet:
+        """
+        Returns the Tags with visible Articles, most used first.
+
+        Refreshes the counts first if a scheduled Article has gone live (see
+        `refresh_tag_counts`), and then reads the Tags in order from
+        `tag_cloud_idx`.
+
+        Returns:
+            QuerySet: The Tags in use, by `article_count`, descending.
+        """
+
+        refresh_tag_counts()
+        return self.filter(article_count__gt=0).order_by("-article_count", "name")
 
 class Tag(models.Model):
     """
-    Short words to tag concepts to Articles. Currently not used for anything.
+    Short words to tag concepts to Articles, each with its own page.
     
     Attributes:
         name (CharField): The name of the tag. Max length of 200 and must be 
             unique.
-        slug (SlugField): A slug based on `name`, used for URLs. Automatically
-            generated on save and uneditable.
+        slug (SlugField): A unique slug based on `name`, used for URLs.
+            Automatically generated on save and uneditable.
+        article_count (PositiveIntegerField): How many visible Articles have
+            this Tag. Kept up to date as Articles and their Tags change, and
+            as scheduled Articles go live (see `refresh_tag_counts`), so the
+            tag cloud needs no counting. Not editable.
     """
 
     name = models.CharField(
@@ -434,9 +830,29 @@ class Tag(models.Model):
         unique = True
     )
     slug = models.SlugField(
+        unique = True,
         blank = True,
         editable = False
     )
+    article_count = models.PositiveIntegerField(
+        default = 0,
+        editable = False,
+        help_text = "How many visible articles have this tag"
+    )
+
+    objects = TagQuerySet.as_manager()
+
+    class Meta:
+        """
+        Meta options for Tag.
+
+        Attributes:
+            indexes (list): The tag cloud reads Tags in this order.
+        """
+
+        indexes = [
+            models.Index(fields=["-article_count", "name"], name="tag_cloud_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -454,7 +870,7 @@ class Tag(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = unique_slug(self, self.name)
         super().save(*args, **kwargs)
 
 class Article(models.Model):
@@ -464,14 +880,19 @@ class Article(models.Model):
     Attributes:
         title (CharField): The Article's title. Max length 200 and must be
             unique, because it is used to generate slugs.
-        slug (SlugField): A URL-compliant version of the title, used for
-            URLs. Will be automatically generated when the Article is first
-            saved. Not editable.
+        slug (SlugField): A unique, URL-compliant version of the title, used
+            for URLs. Will be automatically generated when the Article is
+            first saved. Not editable.
         content (TextField): The actual content of the Article. The intention
             is this will allow HTML editting, since only trusting actors
-            will be using this. If untrusted actors are a concern, it would
-            be safer to install a Markdown formatter and use Markdown instead
-            of HTML for markup.
+            will be using this. It is sanitized when rendered; see
+            `content_rendered`.
+        content_rendered (TextField): `content` as it is displayed, rendered
+            by `articles.content.render_content` when the Article is saved.
+            Not editable.
+        content_hash (CharField): A hash of `content` and the rendering
+            pipeline `content_rendered` was made with, used to skip
+            rendering content that hasn't changed. Not editable.
         shortline (CharField): A short description of the Article. Used as a
             teaser. Max length 200.
         author (ForeignKey): The person who wrote this Article. Author is not
@@ -488,7 +909,9 @@ class Article(models.Model):
             `publish_date`). Automatic and uneditable.
         series (ForeignKey): The Series to which this Article belongs. All
             Articles belong to a Series, and the Series will be part of the
-            Article's absolute url.
+            Article's absolute url. Articles saved without one go in the
+            latest Series (see `get_latest_series`), and the Articles of a
+            deleted Series move to the latest of those left.
         tags (ManyToManyField): Any Tags that should be associated with this
             Article. Currently not used for anything.
         image_raw (ImageField): A base image to represent this Article. Will
@@ -509,6 +932,12 @@ class Article(models.Model):
             than `image_thumbnail`. Should generally be left blank. Will be 
             automatically created when the model is saved if `image_raw` 
             exists.
+        images_pending (BooleanField): True while the images derived from
+            `image_raw` are queued to be generated in the background. Not
+            editable.
+        image_hash (CharField): A hash of `image_raw` and the settings the
+            derived images were last generated with, used to skip images
+            that haven't changed. Not editable.
         audio (FileField): Any audio that should be associated with this
             Article. A player will appear in the Article's detail page.
             This field is intended to be used with DnD sessions, and so is
@@ -521,6 +950,7 @@ class Article(models.Model):
     title = models.CharField(max_length=200, unique=True)
     slug = models.SlugField(
         help_text = "Slugs are short versions of the title used for URLs",
+        unique = True,
         blank = True,
         null = True,
         editable = False,
@@ -531,7 +961,7 @@ class Article(models.Model):
     publish_date = models.DateTimeField(default=now)
     date_modified = models.DateTimeField(auto_now=True, editable=False)
     date_created = models.DateTimeField(auto_now_add=True)
-    series = models.ForeignKey('Series', on_delete=models.SET_DEFAULT, default=get_latest_series)
+    series = models.ForeignKey('Series', on_delete=move_to_latest_series)
     tags = models.ManyToManyField('Tag')
     image_raw = models.ImageField(
         blank = True, 
@@ -557,6 +987,18 @@ class Article(models.Model):
         upload_to = "uploads/",
         help_text = "Will be auto-generated from image_raw; leave blank"
     )
+    images_pending = models.BooleanField(
+        default = False,
+        editable = False,
+        help_text = "Set while the images derived from image_raw are still being generated"
+    )
+    image_hash = models.CharField(
+        max_length = 64,
+        blank = True,
+        default = "",
+        editable = False,
+        help_text = "Hash of image_raw and the image settings the other image fields were generated with"
+    )
     audio = models.FileField(
         upload_to = "uploads/audio",
         blank = True,
@@ -566,6 +1008,17 @@ class Article(models.Model):
         default = True,
         help_text = "If this article should be accessible to the public or not"
     )
+    content_rendered = models.TextField(
+        blank = True,
+        editable = False,
+        help_text = "The content as displayed, rendered when the article is saved"
+    )
+    content_hash = models.CharField(
+        max_length = 64,
+        blank = True,
+        editable = False,
+        help_text = "Hash of the content and the pipeline it was rendered with"
+    )
 
     class Meta:
         """
@@ -578,10 +1031,28 @@ class Article(models.Model):
             odering (list): Default ordering of Articles. Sorts by 
                 `publish_date` (descending) first, and then by `date_modified`
                 within that `publish_date`, also descending.
+            indexes (list): Visitors only see enabled Articles, published
+                before now, in the default ordering; on the whole site, in a
+                Series, or by an Author. Each of those is a range scan over
+                one of these indexes, already in order.
         """
 
         get_latest_by: "-publish_date"
         ordering = ["-publish_date", "-date_modified"]
+        indexes = [
+            models.Index(
+                fields = ["enabled", "-publish_date", "-date_modified"],
+                name = "article_visible_idx"
+            ),
+            models.Index(
+                fields = ["series", "enabled", "-publish_date", "-date_modified"],
+                name = "article_series_visible_idx"
+            ),
+            models.Index(
+                fields = ["author", "enabled", "-publish_date", "-date_modified"],
+                name = "article_author_visible_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -615,34 +1086,146 @@ class Article(models.Model):
             r = 0
         return r
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers what `update_series_dates` and the feeds need to know about
+        the Article as it was loaded.
+        """
+
+        instance = super().from_db(db, field_names, values)
+        # Deferred fields are left out, rather than loaded one by one.
+        if {"series_id", "publish_date", "enabled"} <= instance.__dict__.keys():
+            instance._saved_series_state = instance._series_state()
+        if "author_id" in instance.__dict__:
+            # For invalidating the feeds of the Author it was by.
+            instance._saved_author_id = instance.author_id
+        return instance
+
+    def _series_state(self) -> tuple:
+        return self.series_id, self.publish_date, self.enabled
+
     def save(self, *args, **kwargs):
         """
         Sets the Article's slug, images, and related `Series.latest_article_date`.
 
         The slug will be a slugified version of the Article's `title`. Images
-        are all derived from `image_raw` and are modified versions of that.
+        are all derived from `image_raw` and are modified versions of that;
+        they may be generated in the background (see `prepare_images`).
         The related Series of this Article also has its `latest_article_date`
-        set to this Article's `publish_date`.
+        updated; see `update_series_dates`. Its Tags' `article_count` is
+        updated if it was shown or hidden; see `update_tag_counts`. The
+        content is rendered for display if it has changed; see
+        `update_rendered_content`.
 
         Args:
             *args: Not used here; included because Django expects it.
             **kwargs: Not used here; included because Django expects it.
         """
 
-        #pylint: disable=E1101
         if not self.slug:
-            self.slug = slugify(self.title)
-        if self.series.latest_article_date is None or self.series.latest_article_date < self.publish_date:
-            self.series.latest_article_date = self.publish_date
-            self.series.save()
-        if self.image_raw:
-            if not self.image_thumbnail:
-                create_image_thumbnail(self)
-            if not self.image_thumbnail_transparent:
-                create_image_thumbnail_transparent(self)
-            if not self.image_full:
-                create_image_full(self)
+            self.slug = unique_slug(self, self.title)
+        if self.series_id is None:
+            # Found here rather than as the field's default, so that only
+            # saving an Article without a Series queries for one.
+            self.series_id = get_latest_series()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content" in update_fields:
+            self.update_rendered_content()
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"content_rendered", "content_hash"}
+        prepare_images(self)
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        self._saved_author_id = self.author_id
+        if update_fields is None or {"series", "publish_date", "enabled"} & set(update_fields):
+            if not adding:
+                self.update_tag_counts()
+            if self.enabled and self.publish_date > now():
+                schedule_tag_counts(self.publish_date)
+            self.update_series_dates()
+
+    def update_rendered_content(self) -> bool:
+        """
+        Renders `content` into `content_rendered`, if it has changed.
+
+        Returns:
+            bool: True if the content was rendered, False if it was already
+                up to date.
+        """
+
+        digest = content_hash(self.content)
+        if digest == self.content_hash:
+            return False
+        self.content_rendered = render_content(self.content)
+        self.content_hash = digest
+        return True
+
+    @property
+    def rendered_content(self) -> str:
+        """
+        Returns the HTML to display for this Article.
+
+        That's `content_rendered`, unless the content has never been
+        rendered (such as Articles from before rendering was added), in which
+        case it is rendered now without being saved. `python3 manage.py
+        render_content` renders those once and for all.
+
+        Returns:
+            str: The rendered content.
+        """
+
+        if not self.content_hash:
+            return render_content(self.content)
+        return self.content_rendered
+
+    def update_tag_counts(self):
+        """
+        Recalculates `Tag.article_count` of this Article's Tags if it has
+        been shown or hidden since it was loaded.
+
+        Must run before `update_series_dates`, which forgets how the Article
+        was loaded.
+        """
+
+        #pylint: disable=E1101
+        saved = getattr(self, "_saved_series_state", None)
+        if saved is None:
+            # Loaded without the fields to tell; recalculate to be safe.
+            Tag.objects.filter(article=self).update_article_count()
+            return
+        moment = now()
+        was_visible = saved[2] and saved[1] <= moment
+        if was_visible != (self.enabled and self.publish_date <= moment):
+            Tag.objects.filter(article=self).update_article_count()
+
+    def update_series_dates(self):
+        """
+        Keeps `Series.latest_article_date` in step with this Article.
+
+        Usually that's one conditional `UPDATE` of this Article's Series,
+        without loading it. If the Article was disabled, moved to another
+        Series, or published earlier than before, the Series it was in is
+        recalculated instead.
+        """
+
+        #pylint: disable=E1101
+        stale = set()
+        saved = getattr(self, "_saved_series_state", None)
+        if saved is not None:
+            series_id, publish_date, enabled = saved
+            if enabled and series_id is not None and (
+                    series_id != self.series_id
+                    or not self.enabled
+                    or self.publish_date < publish_date):
+                stale.add(series_id)
+        if self.enabled and self.series_id is not None and self.series_id not in stale:
+            Series.objects.filter(pk=self.series_id).bump_latest_article_date(
+                self.publish_date
+            )
+        if stale:
+            Series.objects.filter(pk__in=stale).update_latest_article_date()
+        self._saved_series_state = self._series_state()
 
     @classmethod
     def get_available_articles(cls) -> QuerySet:
@@ -662,6 +1245,26 @@ class Article(models.Model):
             publish_date__lte = now()
         )
 
+    @classmethod
+    def get_next_publish_date(cls) -> Union[datetime.datetime, None]:
+        """
+        Returns when the next scheduled Article becomes visible, if any.
+
+        Anything cached from the visible Articles goes stale at this point,
+        even though nothing is saved, and so should expire no later than it.
+
+        Returns:
+            Union[datetime.datetime, None]: The earliest `publish_date` still
+                in the future of an enabled Article, or None if there is none.
+        """
+        # pylint: disable=E1101
+        return cls.objects.filter(
+            enabled = True,
+            publish_date__gt = now()
+        ).order_by("publish_date").values_list(
+            "publish_date", flat=True
+        ).first()
+
     def visible(self) -> bool:
         """
         Returns whether or not this Article should be accessible to guests.
@@ -670,4 +1273,470 @@ class Article(models.Model):
             bool: If visitors should be able to access this Article.
         """
 
-        return self.enabled and self.publish_date <= now()
\ No newline at end of file
+        return self.enabled and self.publish_date <= now()
+
+    def get_related_articles(self, count: int = None) -> list:
+        """
+        Returns the visible Articles most like this one, best first.
+
+        They're precomputed (see `RelatedArticle`), so this is one indexed
+        query, which also loads their Series.
+
+        Args:
+            count (int, optional): Defaults to None, meaning the
+                `RELATED_ARTICLES` setting. How many Articles to return.
+
+        Returns:
+            list: Up to `count` Articles.
+        """
+
+        #pylint: disable=E1101
+        links = RelatedArticle.objects.filter(
+            article = self,
+            related__enabled = True,
+            related__publish_date__lte = now()
+        ).select_related("related__series").order_by("rank")
+        return [link.related for link in links[:count or get_related_count()]]
+
+class RelatedArticle(models.Model):
+    """
+    One of the Articles most like another, precomputed.
+
+    Articles are related by the Tags they share, weighted towards rarer Tags,
+    and by how near they are in the same Series; see `articles.related`.
+    Each Article keeps its best few, ranked, so showing them is a single
+    lookup. They're related again when an Article is created or its Tags
+    change, and `rebuild_related_articles` relates every Article at once.
+
+    Attributes:
+        article (ForeignKey): The Article these are related to.
+        related (ForeignKey): A related Article.
+        score (FloatField): How related they are.
+        rank (PositiveSmallIntegerField): 1 for the most related Article, 2
+            for the next, and so on.
+    """
+
+    article = models.ForeignKey(
+        'Article',
+        on_delete = models.CASCADE,
+        related_name = "related_links"
+    )
+    related = models.ForeignKey(
+        'Article',
+        on_delete = models.CASCADE,
+        related_name = "+"
+    )
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        """
+        Meta options for RelatedArticle.
+
+        Attributes:
+            ordering (list): Most related first.
+            unique_together (tuple): Each Article has one of each rank.
+        """
+
+        ordering = ["article", "rank"]
+        unique_together = (("article", "rank"),)
+
+    def __str__(self):
+        return "{0} -> {1} ({2})".format(self.article_id, self.related_id, self.rank)
+
+class ImageJob(models.Model):
+    """
+    A queued request to generate the images derived from an `image_raw`.
+
+    Jobs are created when an Author, Series, or Article is saved with images
+    missing and the derivative executor is not synchronous. They are run by
+    an in-process thread pool or by the `process_image_jobs` management
+    command; see `articles.derivatives`.
+    
+    Attributes:
+        model (CharField): The lowercase label of the model the job is for,
+            such as "articles.article".
+        object_id (PositiveIntegerField): The primary key of the instance
+            the job is for.
+        status (CharField): One of `PENDING`, `RUNNING`, `DONE` or `FAILED`.
+        attempts (PositiveSmallIntegerField): How many times the job has
+            been started.
+        error (TextField): The error of the last failed attempt, if any.
+        date_created (DateTimeField): When the job was queued. Automatic.
+        date_started (DateTimeField): When the job was last claimed, so that
+            jobs left `RUNNING` by a worker that died can be run again.
+        date_finished (DateTimeField): When the job last finished, whether
+            it succeeded or not.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    model = models.CharField(max_length=100)
+    object_id = models.PositiveIntegerField()
+    status = models.CharField(
+        max_length = 10,
+        choices = STATUS_CHOICES,
+        default = PENDING,
+        db_index = True
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_started = models.DateTimeField(null=True, blank=True)
+    date_finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """
+        Meta options for ImageJob.
+
+        Attributes:
+            ordering (list): Oldest jobs first, so they are run in the order
+                they were queued.
+        """
+
+        ordering = ["date_created", "pk"]
+
+    def __str__(self):
+        return "{0} #{1} ({2})".format(self.model, self.object_id, self.status)
+
+class ImageRendition(models.Model):
+    """
+    An image derived from `image_raw`, in a format other than PNG.
+
+    The image fields of Author, Series, and Article always hold PNGs, which
+    every browser can show. Smaller formats such as WebP and JPEG are 
+    created alongside them (see `IMAGE_DERIVATIVE_FORMATS`) and stored here,
+    for the `picture` and `background_image` template tags to offer to 
+    browsers that accept them. Each format may also come in narrower widths
+    (see `IMAGE_SRCSET_WIDTHS`), for `srcset`.
+    
+    Attributes:
+        model (CharField): The lowercase label of the model the image
+            belongs to, such as "articles.article".
+        object_id (PositiveIntegerField): The primary key of the instance
+            the image belongs to.
+        field (CharField): The name of the image field this is an alternate
+            of, such as "image_full".
+        format (CharField): The Pillow name of the image's format, such as
+            "WEBP".
+        width (PositiveIntegerField): The width of the image, in pixels.
+        height (PositiveIntegerField): The height of the image, in pixels.
+        size (PositiveIntegerField): The size of the file, in bytes.
+        file (FileField): The image itself.
+    """
+
+    model = models.CharField(max_length=100)
+    object_id = models.PositiveIntegerField()
+    field = models.CharField(max_length=50)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    file = models.FileField(upload_to="uploads/")
+
+    class Meta:
+        """
+        Meta options for ImageRendition.
+
+        Attributes:
+            unique_together (tuple): Each image field has at most one
+                rendition per format and width.
+            indexes (list): Renditions are always looked up by instance.
+        """
+
+        unique_together = (("model", "object_id", "field", "format", "width"),)
+        indexes = [models.Index(fields=["model", "object_id"])]
+
+    def __str__(self):
+        return self.file.name
+
+    @property
+    def content_type(self) -> str:
+        """
+        Returns the MIME type of the image, for `<source type="...">`.
+        
+        Returns:
+            str: The MIME type, such as "image/webp".
+        """
+
+        return FORMAT_CONTENT_TYPES.get(self.format, "")
+
+    @classmethod
+    def save_new(cls, instance: models.Model):
+        """
+        Stores the renditions `create_images` made for a now saved instance.
+
+        Every rendition the instance already had for the same fields is 
+        replaced, including widths no longer made, and its file deleted if
+        nothing else uses it. Renditions reused from an `ImageSource` are
+        given as file names with a `size`, and aren't stored again.
+        
+        Args:
+            instance (models.Model): The saved Author, Series, or Article.
+        """
+
+        #pylint: disable=E1101
+        renditions = getattr(instance, "_new_renditions", None)
+        if not renditions:
+            return
+        label = instance._meta.label_lower
+        old = cls.objects.filter(
+            model = label,
+            object_id = instance.pk,
+            field__in = {rendition["field"] for rendition in renditions}
+        )
+        old_files = [(o.file.name, o.file.storage) for o in old]
+        old.delete()
+        for rendition in renditions:
+            rendition = dict(rendition)
+            if "size" not in rendition:
+                rendition["size"] = rendition["file"].size
+            cls.objects.create(model=label, object_id=instance.pk, **rendition)
+        for name, storage in old_files:
+            release_file(name, storage)
+        instance._new_renditions = []
+        instance.prefetched_renditions = None
+
+    @classmethod
+    def prefetch(cls, instances: list):
+        """
+        Loads the renditions of many instances with one query per model.
+
+        Each instance gets a `prefetched_renditions` dict, which 
+        `for_instance` reads instead of querying. None values are skipped, so
+        a list of `article.series` may be passed even if some are missing.
+        
+        Args:
+            instances (list): Authors, Series, and/or Articles.
+        """
+
+        #pylint: disable=E1101
+        by_label = {}
+        for instance in instances:
+            if instance is not None and instance.pk is not None:
+                by_label.setdefault(instance._meta.label_lower, {}).setdefault(
+                    instance.pk, []
+                ).append(instance)
+                instance.prefetched_renditions = {}
+        for label, by_pk in by_label.items():
+            for rendition in cls.objects.filter(model=label, object_id__in=by_pk):
+                for instance in by_pk[rendition.object_id]:
+                    instance.prefetched_renditions.setdefault(
+                        rendition.field, []
+                    ).append(rendition)
+
+    @classmethod
+    def for_instance(cls, instance: models.Model, field: str) -> list:
+        """
+        Returns the renditions of one image field of `instance`.
+
+        Uses the renditions loaded by `prefetch` if there are any, otherwise
+        loads and keeps them on the instance.
+        
+        Args:
+            instance (models.Model): An Author, Series, or Article.
+            field (str): The name of the image field, such as "image_full".
+        
+        Returns:
+            list: The field's ImageRenditions, smallest file first.
+        """
+
+        if getattr(instance, "prefetched_renditions", None) is None:
+            cls.prefetch([instance])
+        renditions = instance.prefetched_renditions.get(field, [])
+        return sorted(renditions, key=lambda r: r.size)
+
+    @classmethod
+    def generate(cls, instance: models.Model, field: str, width: int, 
+            image_format: str) -> Union["ImageRendition", None]:
+        """
+        Creates and stores one missing rendition of an image field.
+
+        Used for renditions which weren't made when the image was, such as
+        after `IMAGE_SRCSET_WIDTHS` changes. The field's PNG is scaled down, 
+        rather than decoding `image_raw` again, unless an instance sharing
+        the PNG already has the rendition, in which case its file is reused.
+        If the rendition already exists, including when another request 
+        created it first, that one is returned instead.
+        
+        Args:
+            instance (models.Model): An Author, Series, or Article.
+            field (str): The name of the image field, such as "image_full".
+            width (int): The width to create, in pixels. Must be the PNG's 
+                own width or one of the field's configured narrower widths.
+            image_format (str): A Pillow format name, such as "WEBP". Must be 
+                one of the field's configured formats.
+        
+        Returns:
+            Union[ImageRendition, None]: The rendition, or None if the field
+                has no image or `width` or `image_format` aren't offered for
+                it.
+        """
+
+        #pylint: disable=E1101
+        label = instance._meta.label_lower
+        lookup = {
+            "model": label,
+            "object_id": instance.pk,
+            "field": field,
+            "format": image_format,
+            "width": width,
+        }
+        existing = cls.objects.filter(**lookup).first()
+        if existing is not None:
+            return existing
+        spec = {s.field: s for s in get_derivative_specs()}.get(field)
+        image = getattr(instance, field, None)
+        if spec is None or image_format not in spec.formats or not image:
+            return None
+
+        image.open("rb")
+        try:
+            source = Image.open(image)
+            source.load()
+        finally:
+            image.close()
+        if width not in get_ladder(spec.widths, source.width):
+            return None
+        name = os.path.splitext(os.path.basename(image.name))[0]
+        if width != source.width:
+            name = "{0}_{1}w".format(name, width)
+        # PNGs are content addressed, so another instance sharing this one's
+        # may have made the same rendition already.
+        shared = cls.objects.filter(
+            file = cls._meta.get_field("file").generate_filename(
+                None, "{0}.{1}".format(name, FORMAT_EXTENSIONS[image_format])
+            ),
+            format = image_format,
+            width = width
+        ).first()
+        if shared is not None:
+            fields = {"height": shared.height, "size": shared.size, "file": shared.file.name}
+        else:
+            if width != source.width:
+                source = resize_to_width(source, width)
+            encoded = encode_image(source, name, image_format)
+            fields = {"height": source.height, "size": encoded.size, "file": encoded}
+        try:
+            with transaction.atomic():
+                rendition = cls.objects.create(**fields, **lookup)
+        except IntegrityError:
+            return cls.objects.filter(**lookup).first()
+        instance.prefetched_renditions = None
+        return rendition
+
+
+class ImageSource(models.Model):
+    """
+    The derived images made from one source image, for reuse.
+
+    Derived images are content addressed (see `create_images`): they are 
+    named after the hash of `image_raw` and the image settings they were 
+    made with. The first time a hash is seen its images are registered here,
+    and any Author, Series, or Article saved with the same source later 
+    shares them instead of making and storing its own. The alternate formats
+    are `ImageRendition`s of the ImageSource itself.
+    
+    Attributes:
+        hash (CharField): The `source_hash` the images were made from.
+        image_thumbnail (ImageField): The shared `image_thumbnail`.
+        image_thumbnail_transparent (ImageField): The shared 
+            `image_thumbnail_transparent`.
+        image_full (ImageField): The shared `image_full`.
+        date_created (DateTimeField): When the images were first made.
+            Automatic.
+    """
+
+    hash = models.CharField(max_length=64, unique=True)
+    image_thumbnail = models.ImageField(upload_to="uploads/")
+    image_thumbnail_transparent = models.ImageField(upload_to="uploads/")
+    image_full = models.ImageField(upload_to="uploads/")
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.hash
+
+    @classmethod
+    def register(cls, instance: models.Model):
+        """
+        Registers the images `create_images` just made for a saved instance.
+
+        Must be called after `ImageRendition.save_new`, so the instance's 
+        renditions are stored and can be shared by name.
+        
+        Args:
+            instance (models.Model): The saved Author, Series, or Article.
+        """
+
+        #pylint: disable=E1101
+        digest = getattr(instance, "_new_image_source", None)
+        if digest is None:
+            return
+        instance._new_image_source = None
+        try:
+            with transaction.atomic():
+                source = cls.objects.create(
+                    hash = digest,
+                    image_thumbnail = instance.image_thumbnail.name,
+                    image_thumbnail_transparent = instance.image_thumbnail_transparent.name,
+                    image_full = instance.image_full.name
+                )
+        except IntegrityError:
+            # Another save registered the same images first.
+            return
+        renditions = ImageRendition.objects.filter(
+            model = instance._meta.label_lower,
+            object_id = instance.pk
+        )
+        for rendition in renditions:
+            ImageRendition.objects.create(
+                model = cls._meta.label_lower,
+                object_id = source.pk,
+                field = rendition.field,
+                format = rendition.format,
+                width = rendition.width,
+                height = rendition.height,
+                size = rendition.size,
+                file = rendition.file.name
+            )
+
+    @classmethod
+    def prune(cls, digest: str):
+        """
+        Deletes the ImageSource for `digest` if nothing uses it any more.
+
+        Its files are deleted too, once nothing else refers to them.
+        
+        Args:
+            digest (str): The hash of the ImageSource.
+        """
+
+        #pylint: disable=E1101
+        source = cls.objects.filter(hash=digest).first()
+        if source is None:
+            return
+        for model in (Author, Series, Article):
+            if model.objects.filter(image_hash=digest).exists():
+                return
+        renditions = ImageRendition.objects.filter(
+            model = cls._meta.label_lower,
+            object_id = source.pk
+        )
+        files = [(r.file.name, r.file.storage) for r in renditions]
+        files += [
+            (getattr(source, f).name, getattr(source, f).storage)
+            for f in ("image_thumbnail", "image_thumbnail_transparent", "image_full")
+        ]
+        renditions.delete()
+        source.delete()
+        for name, storage in files:
+            release_file(name, storage)
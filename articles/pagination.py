@@ -0,0 +1,272 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils.dateparse import parse_datetime
+from typing import Union
+
+from .caching import get_content_version, seconds_until
+
+# The order Articles are listed in. The same as `Article.Meta.ordering`, with
+# the primary key added so that every Article has a unique position.
+ORDERING = ("-publish_date", "-date_modified", "pk")
+
+
+def keyset_enabled() -> bool:
+    """
+    Returns whether Article lists use `KeysetPaginator`.
+
+    Set with `KEYSET_PAGINATION` in settings, defaulting to False.
+
+    Returns:
+        bool: True to use keyset pagination, False for Django's Paginator.
+    """
+
+    return getattr(settings, "KEYSET_PAGINATION", False)
+
+def encode_cursor(values: tuple) -> str:
+    """
+    Returns an opaque cursor for a position in `ORDERING`.
+
+    Args:
+        values (tuple): The `publish_date`, `date_modified` and `pk` of an
+            Article.
+
+    Returns:
+        str: The cursor, safe to use in URLs.
+    """
+
+    publish_date, date_modified, pk = values
+    data = json.dumps([publish_date.isoformat(), date_modified.isoformat(), pk])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Union[tuple, None]:
+    """
+    Reverses `encode_cursor`.
+
+    Args:
+        cursor (str): A cursor from `encode_cursor`.
+
+    Returns:
+        Union[tuple, None]: The values of the cursor, or None if it isn't
+            valid.
+    """
+
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        publish_date, date_modified, pk = json.loads(data.decode())
+        values = (parse_datetime(publish_date), parse_datetime(date_modified), int(pk))
+    except (ValueError, TypeError):
+        return None
+    if None in values:
+        return None
+    return values
+
+def _field(order: str) -> tuple:
+    return order.lstrip("-"), order.startswith("-")
+
+def _seek(values: tuple, forward: bool) -> Q:
+    """
+    Returns a filter for the rows after (or before) `values` in `ORDERING`.
+    """
+
+    q = Q()
+    for i, order in enumerate(ORDERING):
+        field, descending = _field(order)
+        lookup = "lt" if descending == forward else "gt"
+        condition = Q(**{"{0}__{1}".format(field, lookup): values[i]})
+        for j in range(i):
+            condition &= Q(**{_field(ORDERING[j])[0]: values[j]})
+        q |= condition
+    return q
+
+def _reverse(order: str) -> str:
+    return order[1:] if order.startswith("-") else "-" + order
+
+
+class KeysetPage:
+    """
+    One page of Articles from a `KeysetPaginator`.
+
+    Has the parts of Django's `Page` the templates use, plus the cursors of
+    the pages either side. There are no page numbers, since finding one
+    would mean counting every Article before it.
+
+    Attributes:
+        object_list (list): The Articles on this page.
+        paginator (KeysetPaginator): The paginator the page came from.
+        next_cursor (Union[str, None]): For `?after=`, if there's a next page.
+        previous_cursor (Union[str, None]): For `?before=`, if there's a
+            previous page.
+    """
+
+    number = None
+
+    def __init__(self, object_list: list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginates Articles by seeking past a cursor, rather than with OFFSET.
+
+    Each page is found with an indexed `WHERE` on `ORDERING` and fetched
+    with a single `LIMIT` query, however deep it is, and no `COUNT(*)` is
+    needed to render it. The total, for anything that shows it, is counted
+    once and cached under the content version until the next scheduled
+    `publish_date`.
+
+    Attributes:
+        queryset (QuerySet): The Articles to paginate.
+        per_page (int): How many Articles are on each page.
+        count_key (str): Identifies the list in the cache, for `count`.
+    """
+
+    def __init__(self, queryset: QuerySet, per_page: int, count_key: str):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_key = count_key
+
+    @property
+    def count(self) -> int:
+        """
+        Returns how many Articles there are in total, from the cache if
+        possible.
+        """
+
+        from .models import Article
+
+        key = "articles:count:{0}:{1}".format(get_content_version(), self.count_key)
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(key, count, seconds_until(
+                Article.get_next_publish_date(),
+                getattr(settings, "PAGE_CACHE_TIMEOUT", 300) or 300
+            ))
+        return count
+
+    @property
+    def num_pages(self) -> int:
+        return max(1, -(-self.count // self.per_page))
+
+    def _cursor(self, article) -> str:
+        return encode_cursor((article.publish_date, article.date_modified, article.pk))
+
+    def page(self, after: Union[str, None] = None,
+            before: Union[str, None] = None) -> KeysetPage:
+        """
+        Returns the page after the cursor `after`, or before `before`.
+
+        An invalid cursor, or none, gives the first page.
+
+        Args:
+            after (Union[str, None], optional): Defaults to None. The
+                `next_cursor` of the previous page.
+            before (Union[str, None], optional): Defaults to None. The
+                `previous_cursor` of the next page.
+
+        Returns:
+            KeysetPage: The page.
+        """
+
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+        if before is not None:
+            rows = list(
+                self.queryset.filter(_seek(before, forward=False)).order_by(
+                    *(_reverse(o) for o in ORDERING)
+                )[:self.per_page + 1]
+            )
+            more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return KeysetPage(
+                rows,
+                self,
+                self._cursor(rows[-1]) if rows else None,
+                self._cursor(rows[0]) if rows and more else None
+            )
+
+        queryset = self.queryset.order_by(*ORDERING)
+        if after is not None:
+            queryset = queryset.filter(_seek(after, forward=True))
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return KeysetPage(
+            rows,
+            self,
+            self._cursor(rows[-1]) if rows and more else None,
+            self._cursor(rows[0]) if rows and after is not None else None
+        )
+
+    def cursor_for_page(self, number: int) -> Union[str, None]:
+        """
+        Returns the `?after=` cursor that shows what `?page=number` did.
+
+        Args:
+            number (int): A page number, starting from 1.
+
+        Returns:
+            Union[str, None]: The cursor, or None for the first page or a
+                page past the end.
+        """
+
+        if number <= 1:
+            return None
+        values = self.queryset.order_by(*ORDERING).values_list(
+            "publish_date", "date_modified", "pk"
+        )[(number - 1) * self.per_page - 1:(number - 1) * self.per_page]
+        values = list(values)
+        return encode_cursor(values[0]) if values else None
+
+def page_redirect_url(request, paginator: KeysetPaginator) -> Union[str, None]:
+    """
+    Returns where an old `?page=` URL should redirect to, with keyset
+    pagination on.
+
+    Args:
+        request (HttpRequest): The current request.
+        paginator (KeysetPaginator): The paginator of the list.
+
+    Returns:
+        Union[str, None]: The URL, or None if the request has no `?page=`.
+    """
+
+    if "page" not in request.GET:
+        return None
+    query = request.GET.copy()
+    number = query.pop("page")[-1]
+    try:
+        cursor = paginator.cursor_for_page(int(number))
+    except ValueError:
+        cursor = None
+    if cursor is not None:
+        query["after"] = cursor
+    if not query:
+        return request.path
+    return "{0}?{1}".format(request.path, query.urlencode())
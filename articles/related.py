@@ -0,0 +1,242 @@
+import heapq
+import math
+
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from typing import Iterable
+
+from .caching import bump_content_version
+
+
+def get_related_count() -> int:
+    """
+    Returns how many related Articles are shown with an Article.
+
+    Set with `RELATED_ARTICLES` in settings, defaulting to 5. Twice as many
+    are stored, so some can be hidden or deleted before the list runs short.
+
+    Returns:
+        int: The number of related Articles shown.
+    """
+
+    return getattr(settings, "RELATED_ARTICLES", 5)
+
+def get_series_weight() -> float:
+    """
+    Returns the score an Article gives the Articles next to it in its Series.
+
+    Set with `RELATED_SERIES_WEIGHT` in settings, defaulting to 1.0. The next
+    and previous Articles get all of it, those two away half of it, and so
+    on. A Tag shared by few Articles scores more than this; one shared by
+    most scores less.
+
+    Returns:
+        float: The score of the nearest Articles in the Series.
+    """
+
+    return getattr(settings, "RELATED_SERIES_WEIGHT", 1.0)
+
+def get_max_tag_articles() -> int:
+    """
+    Returns how many Articles a Tag may have and still relate them.
+
+    A Tag on thousands of Articles says little about how alike any two of
+    them are, and comparing every pair would take time in proportion to the
+    square of its Articles, so such Tags are left out. Set with
+    `RELATED_MAX_TAG_ARTICLES` in settings, defaulting to 500.
+
+    Returns:
+        int: The most visible Articles a Tag used for relating may have.
+    """
+
+    return getattr(settings, "RELATED_MAX_TAG_ARTICLES", 500)
+
+
+class Corpus:
+    """
+    What relating Articles needs, loaded in a few queries.
+
+    Together, `postings` and `tags_of` are the sparse matrix of enabled
+    Articles by Tags, stored both by column and by row; multiplying it by
+    its own transpose, one row at a time, gives every Article's shared Tags
+    with every other. Articles are ordered by `publish_date` within each
+    Series, for finding their neighbours.
+
+    Attributes:
+        total (int): How many enabled Articles there are, for weighting Tags.
+        postings (dict): The enabled Articles with each Tag, by Tag id.
+        weights (dict): What sharing each Tag is worth, by Tag id: more for
+            Tags on fewer Articles.
+        tags_of (dict): The Tags of each enabled Article, by Article id.
+        series_of (dict): The Series id and position in it of each enabled
+            Article, by Article id.
+        members (dict): The enabled Articles of each Series in order, by
+            Series id.
+    """
+
+    def __init__(self, article_ids: Iterable = None):
+        """
+        Loads everything needed to relate the Articles in `article_ids`, or
+        every Article if it's None.
+        """
+
+        #pylint: disable=E1101
+        from .models import Article, Tag
+
+        self.total = Article.objects.filter(enabled=True).count()
+        links = Article.tags.through.objects.filter(article__enabled=True).exclude(
+            tag__in = Tag.objects.filter(article_count__gt=get_max_tag_articles()).values("pk")
+        )
+        articles = Article.objects.filter(enabled=True)
+        if article_ids is not None:
+            article_ids = list(article_ids)
+            links = links.filter(tag__in=Article.tags.through.objects.filter(
+                article__in = article_ids
+            ).values("tag"))
+            articles = articles.filter(series__in=Article.objects.filter(
+                pk__in = article_ids
+            ).values("series"))
+
+        self.postings = defaultdict(list)
+        self.tags_of = defaultdict(list)
+        for article_id, tag_id in links.values_list("article_id", "tag_id").iterator():
+            self.postings[tag_id].append(article_id)
+            self.tags_of[article_id].append(tag_id)
+
+        self.weights = {
+            tag_id: math.log(1 + self.total / len(article_ids))
+            for tag_id, article_ids in self.postings.items()
+        }
+        self.series_of = {}
+        self.members = defaultdict(list)
+        ordered = articles.order_by("series", "publish_date", "pk").values_list("pk", "series_id")
+        for article_id, series_id in ordered.iterator():
+            self.series_of[article_id] = (series_id, len(self.members[series_id]))
+            self.members[series_id].append(article_id)
+
+    def related(self, article_id: int, count: int, series_weight: float) -> list:
+        """
+        Returns the `count` Articles most related to an Article.
+
+        Each Tag the Articles share adds its weight, and the Articles nearest
+        it in its Series add `series_weight` divided by how far away they
+        are. Ties go to the newer Article.
+
+        Returns:
+            list: (score, Article id) pairs, best first.
+        """
+
+        # This is the inner loop of `rebuild_related_articles`, run once for
+        # every pair of Articles sharing a Tag, so it's kept tight.
+        scores = {}
+        get = scores.get
+        postings = self.postings
+        weights = self.weights
+        for tag_id in self.tags_of.get(article_id, ()):
+            weight = weights[tag_id]
+            for other in postings[tag_id]:
+                scores[other] = get(other, 0.0) + weight
+        if article_id in self.series_of and series_weight:
+            series_id, position = self.series_of[article_id]
+            members = self.members[series_id]
+            for distance in range(1, count + 1):
+                for index in (position - distance, position + distance):
+                    if 0 <= index < len(members):
+                        other = members[index]
+                        scores[other] = get(other, 0.0) + series_weight / distance
+        scores.pop(article_id, None)
+        return heapq.nlargest(count, zip(scores.values(), scores.keys()))
+
+def build_links(corpus: Corpus, article_ids: Iterable) -> list:
+    """
+    Returns the related Articles of each Article in `article_ids`.
+
+    Args:
+        corpus (Corpus): Loaded for at least these Articles.
+        article_ids (Iterable): The Articles to relate.
+
+    Returns:
+        list: (Article id, related Article id, score, rank) rows for
+            `RelatedArticle`, ranked from 1 for each Article.
+    """
+
+    count = get_related_count() * 2
+    series_weight = get_series_weight()
+    links = []
+    for article_id in article_ids:
+        for rank, (score, other) in enumerate(corpus.related(article_id, count, series_weight), 1):
+            links.append((article_id, other, score, rank))
+    return links
+
+def write_links(links: list):
+    """
+    Inserts rows from `build_links` into the `RelatedArticle` table.
+
+    Rows are inserted with one `executemany`, rather than by building a
+    model instance for each, since a rebuild writes hundreds of thousands.
+
+    Args:
+        links (list): The rows to insert.
+    """
+
+    from .models import RelatedArticle
+
+    if not links:
+        return
+    meta = RelatedArticle._meta
+    columns = [meta.get_field(name).column for name in ("article", "related", "score", "rank")]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany("INSERT INTO {0} ({1}) VALUES (%s, %s, %s, %s)".format(
+            quote(meta.db_table), ", ".join(quote(column) for column in columns)
+        ), links)
+
+def refresh_related(article_ids: Iterable):
+    """
+    Relates the Articles in `article_ids` again, and the Articles whose
+    lists they are or were in.
+
+    Called when an Article is created or its Tags change. Sharing Tags is
+    mutual, so an Article's new related Articles may now list it, and those
+    which listed it may not; they're related again too, in one more batch.
+    If any rows changed, cached content is invalidated once committed, since
+    Article pages show their related Articles.
+
+    Args:
+        article_ids (Iterable): The primary keys of the Articles.
+    """
+
+    #pylint: disable=E1101
+    from .models import RelatedArticle
+
+    article_ids = set(article_ids)
+    if not article_ids:
+        return
+    with transaction.atomic():
+        listing = set(RelatedArticle.objects.filter(
+            related__in = article_ids
+        ).values_list("article_id", flat=True))
+        links, changed = replace_links(article_ids)
+        affected = (listing | {link[1] for link in links}) - article_ids
+        if affected:
+            changed = replace_links(affected)[1] or changed
+        if changed:
+            transaction.on_commit(bump_content_version)
+
+def replace_links(article_ids: set) -> tuple:
+    """
+    Replaces the stored related Articles of the Articles in `article_ids`.
+
+    Returns:
+        tuple: The new rows, from `build_links`, and whether any rows were
+            deleted or written.
+    """
+
+    #pylint: disable=E1101
+    from .models import RelatedArticle
+
+    links = build_links(Corpus(article_ids), article_ids)
+    deleted, _ = RelatedArticle.objects.filter(article__in=article_ids).delete()
+    write_links(links)
+    return links, bool(deleted or links)
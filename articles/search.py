@@ -0,0 +1,382 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import strip_tags
+from typing import Iterable
+
+# The table the search index is kept in. On SQLite it is an FTS5 virtual
+# table whose rowid is the Article's id; on PostgreSQL, a table of
+# `tsvector`s with a GIN index. Both are created by migration 0012.
+SEARCH_TABLE = "articles_search"
+
+# How much a match in each column counts for when ranking, in the order
+# the columns are indexed.
+WEIGHTS = {"title": 10.0, "shortline": 5.0, "tags": 3.0, "content": 1.0}
+
+# The PostgreSQL weight label of each column.
+POSTGRES_WEIGHTS = {"title": "A", "shortline": "B", "tags": "B", "content": "C"}
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Whether the search table exists, by database vendor, found once per
+# process.
+_table_exists = {}
+
+
+def get_search_config() -> str:
+    """
+    Returns the PostgreSQL text search configuration to use.
+
+    Set with `SEARCH_CONFIG` in settings, defaulting to "english".
+
+    Returns:
+        str: The name of the configuration.
+    """
+
+    return getattr(settings, "SEARCH_CONFIG", "english")
+
+def get_max_results() -> int:
+    """
+    Returns how many of the newest matching Articles a search ranks.
+
+    Ranking every match of a word used in most Articles takes time in
+    proportion to the number of Articles, so only the newest matches are
+    ranked and shown. Set with `SEARCH_MAX_RESULTS` in settings, defaulting
+    to 1000.
+
+    Returns:
+        int: The most matches a search shows.
+    """
+
+    return getattr(settings, "SEARCH_MAX_RESULTS", 1000)
+
+def forget_backend():
+    """
+    Makes `get_backend` check again whether the search table exists, such as
+    after the migration creating it has run.
+    """
+
+    _table_exists.clear()
+
+def get_backend() -> str:
+    """
+    Returns which search backend the database supports.
+
+    Returns:
+        str: "sqlite" for FTS5, "postgresql" for `tsvector`, or "fallback"
+            if there is no search index, in which case searches use
+            `icontains` and aren't ranked.
+    """
+
+    vendor = connection.vendor
+    if vendor not in ("sqlite", "postgresql"):
+        return "fallback"
+    if vendor not in _table_exists:
+        with connection.cursor() as cursor:
+            _table_exists[vendor] = SEARCH_TABLE in connection.introspection.table_names(cursor)
+    return vendor if _table_exists[vendor] else "fallback"
+
+def get_document(article) -> dict:
+    """
+    Returns the text of an Article that is indexed, by column.
+
+    Args:
+        article (Article): The Article, ideally with its Tags prefetched.
+
+    Returns:
+        dict: The title, shortline, tag names, and content without HTML.
+    """
+
+    return {
+        "title": article.title or "",
+        "shortline": article.shortline or "",
+        "tags": " ".join(tag.name for tag in article.tags.all()),
+        "content": strip_tags(article.rendered_content),
+    }
+
+def index_articles(articles: Iterable) -> int:
+    """
+    Adds Articles to the search index, replacing what was there for them.
+
+    Called whenever an Article or its Tags are saved, and in bulk by
+    `import_articles` and `rebuild_search_index`. Every Article is indexed,
+    visible or not; visibility is checked when searching, since scheduled
+    Articles become visible without being saved.
+
+    Args:
+        articles (Iterable): The Articles to index, ideally with their Tags
+            prefetched.
+
+    Returns:
+        int: How many Articles were indexed.
+    """
+
+    backend = get_backend()
+    if backend == "fallback":
+        return 0
+    rows = [(article.pk, get_document(article)) for article in articles]
+    if not rows:
+        return 0
+    columns = list(WEIGHTS)
+    with connection.cursor() as cursor:
+        if backend == "sqlite":
+            cursor.executemany(
+                "DELETE FROM {0} WHERE rowid = %s".format(SEARCH_TABLE),
+                [(pk,) for pk, _ in rows]
+            )
+            cursor.executemany(
+                "INSERT INTO {0} (rowid, {1}) VALUES (%s, {2})".format(
+                    SEARCH_TABLE, ", ".join(columns), ", ".join(["%s"] * len(columns))
+                ),
+                [[pk] + [document[c] for c in columns] for pk, document in rows]
+            )
+        else:
+            vector = " || ".join(
+                "setweight(to_tsvector(%s::regconfig, %s), '{0}')".format(POSTGRES_WEIGHTS[c])
+                for c in columns
+            )
+            config = get_search_config()
+            cursor.executemany(
+                "INSERT INTO {0} (article_id, document) VALUES (%s, {1}) "
+                "ON CONFLICT (article_id) DO UPDATE SET document = EXCLUDED.document".format(
+                    SEARCH_TABLE, vector
+                ),
+                [
+                    [pk] + [value for c in columns for value in (config, document[c])]
+                    for pk, document in rows
+                ]
+            )
+    return len(rows)
+
+def remove_articles(pks: Iterable) -> None:
+    """
+    Removes Articles from the search index.
+
+    Args:
+        pks (Iterable): The primary keys of the Articles.
+    """
+
+    backend = get_backend()
+    if backend == "fallback":
+        return
+    column = "rowid" if backend == "sqlite" else "article_id"
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            "DELETE FROM {0} WHERE {1} = %s".format(SEARCH_TABLE, column),
+            [(pk,) for pk in pks]
+        )
+
+def optimize_index() -> None:
+    """
+    Merges the search index into as few pieces as possible after many
+    Articles were indexed, which makes searches quicker. Only SQLite's
+    index needs this.
+    """
+
+    if get_backend() == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO {0} ({0}) VALUES ('optimize')".format(SEARCH_TABLE))
+
+def to_tsquery(query: str) -> str:
+    """
+    Turns what a visitor typed into a PostgreSQL `tsquery`, for
+    `to_tsquery`, in the same way as `to_fts5_query`.
+
+    Args:
+        query (str): The search, as typed.
+
+    Returns:
+        str: The `tsquery`, or an empty string if there are no words.
+    """
+
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return ""
+    return " & ".join(tokens) + ":*"
+
+def to_fts5_query(query: str) -> str:
+    """
+    Turns what a visitor typed into an FTS5 query.
+
+    Every word must match, and the last may be the start of a word, so
+    results appear as the visitor types. Words are quoted, so nothing typed
+    is read as FTS5 syntax.
+
+    Args:
+        query (str): The search, as typed.
+
+    Returns:
+        str: The FTS5 query, or an empty string if there are no words.
+    """
+
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return ""
+    return " ".join('"{0}"'.format(t) for t in tokens[:-1]) + ' "{0}"*'.format(tokens[-1])
+
+
+class SearchResults:
+    """
+    The visible Articles matching a search, best matches first.
+
+    Works with Django's `Paginator`: `count` counts the matches with one
+    query, and slicing fetches only the ids of that page, ranked in the
+    database, and then those Articles with their Series and Author. Only
+    the newest `SEARCH_MAX_RESULTS` matches are counted and ranked, which
+    the index finds without looking at the rest; `truncated` says whether
+    there were more.
+
+    Attributes:
+        query (str): The search, as typed.
+        backend (str): The search backend, from `get_backend`.
+        max_results (int): The most matches that are ranked.
+    """
+
+    def __init__(self, query: str):
+        self.query = query.strip()
+        self.backend = get_backend()
+        self.max_results = get_max_results()
+        self._count = None
+        self._matched = None
+
+    def _candidates(self, rank: bool = False) -> tuple:
+        """
+        Returns the SQL finding the ids of the newest matches, with their
+        `score` if `rank` is True, lower being better, and its parameters.
+        """
+
+        if self.backend == "sqlite":
+            score = ", bm25({0}, {1}) AS score".format(
+                SEARCH_TABLE, ", ".join(str(w) for w in WEIGHTS.values())
+            ) if rank else ""
+            # Taking the matches in rowid order means bm25 is only worked
+            # out for the rows kept.
+            return (
+                "SELECT rowid AS id{1} FROM {0} WHERE {0} MATCH %s "
+                "ORDER BY rowid DESC LIMIT %s".format(SEARCH_TABLE, score),
+                [to_fts5_query(self.query), self.max_results]
+            )
+        score = ", -ts_rank(document, q) AS score" if rank else ""
+        return (
+            "SELECT article_id AS id{1} FROM {0}, to_tsquery(%s::regconfig, %s) q "
+            "WHERE document @@ q ORDER BY article_id DESC LIMIT %s".format(SEARCH_TABLE, score),
+            [get_search_config(), to_tsquery(self.query), self.max_results]
+        )
+
+    def _match(self, rank: bool = False, filter_visible: bool = True) -> tuple:
+        """
+        Returns the `FROM` and `WHERE` of the search, and their parameters.
+
+        The newest matches, from `_candidates`, are `s`, joined to their
+        Articles as `a`, which must be visible if `filter_visible` is True.
+        """
+
+        sql, params = self._candidates(rank)
+        # CROSS JOIN makes SQLite look up the matches first; otherwise it
+        # may walk the visible Articles and run the match once for each.
+        sql = "({0}) s CROSS JOIN articles_article a ON a.id = s.id".format(sql)
+        if filter_visible:
+            visible, visible_params = self._visible()
+            sql += " WHERE " + visible
+            params += visible_params
+        return sql, params
+
+    def _visible(self) -> tuple:
+        """
+        Returns the condition an Article `a` is visible, and its parameters.
+        """
+
+        # Imported here since models imports signals, which imports this.
+        from .models import now
+
+        return "a.enabled = %s AND a.publish_date <= %s", [True, now()]
+
+    def _fallback(self):
+        """
+        Returns the matches as a QuerySet, for databases without an index.
+        """
+
+        #pylint: disable=E1101
+        from .models import Article
+
+        matches = Q()
+        for token in TOKEN_RE.findall(self.query):
+            matches &= (
+                Q(title__icontains=token)
+                | Q(shortline__icontains=token)
+                | Q(content__icontains=token)
+                | Q(tags__name__icontains=token)
+            )
+        return Article.get_available_articles().filter(matches).distinct().select_related(
+            "series", "author"
+        )
+
+    def is_empty(self) -> bool:
+        """
+        Returns True if the search has no words, and so matches nothing.
+        """
+
+        return not TOKEN_RE.search(self.query)
+
+    def count(self) -> int:
+        """
+        Returns how many visible Articles match, up to `max_results`.
+        """
+
+        if self._count is None:
+            if self.is_empty():
+                self._count = self._matched = 0
+            elif self.backend == "fallback":
+                self._count = self._matched = self._fallback().count()
+            else:
+                # Counted in one pass over the matches, since the visible
+                # ones are counted as well as all of them.
+                visible, visible_params = self._visible()
+                sql, params = self._match(filter_visible=False)
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT COALESCE(SUM(CASE WHEN {0} THEN 1 ELSE 0 END), 0), "
+                        "COUNT(*) FROM {1}".format(visible, sql),
+                        visible_params + params
+                    )
+                    self._count, self._matched = cursor.fetchone()
+        return self._count
+
+    @property
+    def truncated(self) -> bool:
+        """
+        True if more Articles matched than `max_results`, and only the
+        newest were ranked.
+        """
+
+        self.count()
+        return self.backend != "fallback" and self._matched >= self.max_results
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+        if self.is_empty() or stop <= start:
+            return []
+        if self.backend == "fallback":
+            return list(self._fallback()[start:stop])
+
+        #pylint: disable=E1101
+        from .models import Article
+
+        sql, params = self._match(rank=True)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT a.id FROM {0} ORDER BY s.score, a.publish_date DESC "
+                "LIMIT %s OFFSET %s".format(sql),
+                params + [stop - start, start]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        articles = Article.objects.select_related("series", "author").in_bulk(ids)
+        return [articles[pk] for pk in ids if pk in articles]
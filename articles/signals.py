@@ -0,0 +1,472 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .caching import bump_content_version
+from .derivatives import enqueue
+from .feeds import ALL_FEEDS, article_scopes, bump_feed_versions
+from .models import (Article, Author, Series, Tag, ImageRendition, ImageSource,
+    forget_latest_series, now, release_file)
+from .related import refresh_related
+from .search import index_articles, remove_articles
+from .sitemaps import (ALL_SITEMAPS, SITEMAP_INDEX, SITEMAP_PAGES,
+    bump_sitemap_versions, get_shard)
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=Series)
+@receiver(post_delete, sender=Series)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def content_changed(sender, **kwargs):
+    """
+    Invalidates cached content whenever an Article, Series, or Author changes.
+
+    Args:
+        sender (models.Model): The model class that was saved or deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    bump_content_version()
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=Series)
+@receiver(post_delete, sender=Series)
+def latest_series_changed(sender, **kwargs):
+    """
+    Makes `get_latest_series` look again, since the Series new Articles go
+    in may have changed.
+
+    Args:
+        sender (models.Model): The model class that was saved or deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    forget_latest_series()
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Series)
+@receiver(post_save, sender=Author)
+def queue_pending_images(sender, instance, raw=False, **kwargs):
+    """
+    Queues the image job for an instance saved with `images_pending` set.
+
+    Args:
+        sender (models.Model): The model class that was saved.
+        instance (models.Model): The instance that was saved.
+        raw (bool): True when loading fixtures, in which case nothing is 
+            queued.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    if instance.images_pending and not raw:
+        enqueue(instance)
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Series)
+@receiver(post_save, sender=Author)
+def save_renditions(sender, instance, **kwargs):
+    """
+    Stores the alternate image formats created while saving an instance, and
+    registers newly made images for reuse.
+
+    Args:
+        sender (models.Model): The model class that was saved.
+        instance (models.Model): The instance that was saved.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    ImageRendition.save_new(instance)
+    ImageSource.register(instance)
+
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=Series)
+@receiver(post_delete, sender=Author)
+def delete_renditions(sender, instance, **kwargs):
+    """
+    Deletes the alternate image formats of a deleted instance.
+
+    Their files are only deleted if no other instance shares them.
+
+    Args:
+        sender (models.Model): The model class that was deleted.
+        instance (models.Model): The instance that was deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    #pylint: disable=E1101
+    renditions = ImageRendition.objects.filter(
+        model = instance._meta.label_lower,
+        object_id = instance.pk
+    )
+    files = [(r.file.name, r.file.storage) for r in renditions]
+    renditions.delete()
+    for name, storage in files:
+        release_file(name, storage)
+
+@receiver(post_delete, sender=Article)
+def article_deleted(sender, instance, **kwargs):
+    """
+    Recalculates `latest_article_date` of a deleted Article's Series.
+
+    Args:
+        sender (models.Model): The model class that was deleted.
+        instance (Article): The Article that was deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    #pylint: disable=E1101
+    if instance.enabled and instance.series_id is not None:
+        Series.objects.filter(pk=instance.series_id).update_latest_article_date()
+
+@receiver(post_delete, sender=Series)
+def series_deleted(sender, instance, **kwargs):
+    """
+    Recalculates `latest_article_date` of every Series once a Series is
+    deleted, since its Articles are moved to another Series without being
+    saved.
+
+    Args:
+        sender (models.Model): The model class that was deleted.
+        instance (Series): The Series that was deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    #pylint: disable=E1101
+    Series.objects.update_latest_article_date()
+
+@receiver(post_save, sender=Article)
+def article_saved_search(sender, instance, raw=False, **kwargs):
+    """
+    Indexes a saved Article for search.
+
+    Args:
+        sender (models.Model): The model class that was saved.
+        instance (Article): The Article that was saved.
+        raw (bool): True when loading fixtures, in which case the Article
+            isn't indexed; run `rebuild_search_index` afterwards.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    if not raw:
+        index_articles([instance])
+
+@receiver(post_delete, sender=Article)
+def article_deleted_search(sender, instance, **kwargs):
+    """
+    Removes a deleted Article from the search index.
+
+    Args:
+        sender (models.Model): The model class that was deleted.
+        instance (Article): The Article that was deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    remove_articles([instance.pk])
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def article_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Indexes Articles again once their Tags change, since Tag names are
+    searched.
+
+    Args:
+        sender (models.Model): The model linking Articles and Tags.
+        instance (models.Model): The Article or Tag whose links changed.
+        action (str): What happened; only "post_add", "post_remove" and
+            "post_clear" change anything.
+        reverse (bool): True when `instance` is a Tag.
+        pk_set (set): The primary keys of the other side of the links, or
+            None when they were cleared.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    #pylint: disable=E1101
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        index_articles([instance])
+    elif pk_set:
+        index_articles(Article.objects.filter(pk__in=pk_set).prefetch_related("tags"))
+    elif hasattr(instance, "_unlinked_article_ids"):
+        # Clearing a Tag's Articles doesn't say which they were; see
+        # `tag_clearing`.
+        index_articles(Article.objects.filter(
+            pk__in = instance._unlinked_article_ids
+        ).prefetch_related("tags"))
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def tag_clearing(sender, instance, action, reverse, **kwargs):
+    """
+    Notes which Articles a Tag is on before its Articles are cleared, since
+    `m2m_changed` doesn't say which they were, for the search index and
+    related Articles. `related_tags_changed` forgets them afterwards.
+
+    Args:
+        sender (models.Model): The model linking Articles and Tags.
+        instance (models.Model): The Article or Tag whose links changed.
+        action (str): What is about to happen.
+        reverse (bool): True when `instance` is a Tag.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    #pylint: disable=E1101
+    if reverse and action == "pre_clear":
+        instance._unlinked_article_ids = list(
+            instance.article_set.values_list("pk", flat=True)
+        )
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    """
+    Notes which Articles a Tag is on before it's deleted, since they're
+    unlinked without `m2m_changed` being sent, for the search index and
+    related Articles. `tag_deleted_related` forgets them afterwards.
+
+    Args:
+        sender (models.Model): The model class being deleted.
+        instance (Tag): The Tag being deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    #pylint: disable=E1101
+    instance._unlinked_article_ids = list(
+        instance.article_set.values_list("pk", flat=True)
+    )
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed_search(sender, instance, raw=False, **kwargs):
+    """
+    Indexes a Tag's Articles again once it is renamed or deleted.
+
+    Args:
+        sender (models.Model): The model class that was saved or deleted.
+        instance (Tag): The Tag that was saved or deleted.
+        raw (bool): True when loading fixtures, in which case nothing is
+            indexed.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    #pylint: disable=E1101
+    if raw:
+        return
+    if hasattr(instance, "_unlinked_article_ids"):
+        pks = instance._unlinked_article_ids
+    elif kwargs.get("created"):
+        return
+    else:
+        pks = instance.article_set.values_list("pk", flat=True)
+    index_articles(Article.objects.filter(pk__in=list(pks)).prefetch_related("tags"))
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def tag_counts_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Recalculates `Tag.article_count` of the Tags added to or removed from
+    an Article, or of a Tag whose Articles changed, and invalidates cached
+    content once the change is committed, since pages show Tags.
+
+    Args:
+        sender (models.Model): The model linking Articles and Tags.
+        instance (models.Model): The Article or Tag whose links changed.
+        action (str): What happened.
+        reverse (bool): True when `instance` is a Tag.
+        pk_set (set): The primary keys of the other side of the links, or
+            None when they were cleared.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    #pylint: disable=E1101
+    if action == "pre_clear" and not reverse:
+        # Clearing an Article's Tags doesn't say which they were.
+        instance._cleared_tag_ids = list(instance.tags.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    transaction.on_commit(bump_content_version)
+    if reverse:
+        Tag.objects.filter(pk=instance.pk).update_article_count()
+    elif action == "post_clear":
+        Tag.objects.filter(pk__in=instance.__dict__.pop("_cleared_tag_ids", [])).update_article_count()
+    elif pk_set and instance.enabled and instance.publish_date <= now():
+        Tag.objects.filter(pk__in=pk_set).update_article_count()
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed_content(sender, **kwargs):
+    """
+    Invalidates cached content once a Tag's change is committed, since
+    pages and the tag cloud show Tag names.
+
+    Args:
+        sender (models.Model): The model class that was saved or deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    transaction.on_commit(bump_content_version)
+
+@receiver(pre_delete, sender=Article)
+def article_deleting_tags(sender, instance, **kwargs):
+    """
+    Notes the Tags of a visible Article before it's deleted, since they're
+    unlinked without `m2m_changed` being sent.
+
+    Args:
+        sender (models.Model): The model class being deleted.
+        instance (Article): The Article being deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    if instance.enabled and instance.publish_date <= now():
+        instance._deleted_tag_ids = list(instance.tags.values_list("pk", flat=True))
+
+@receiver(post_delete, sender=Article)
+def article_deleted_tags(sender, instance, **kwargs):
+    """
+    Recalculates `Tag.article_count` of a deleted Article's Tags.
+
+    Args:
+        sender (models.Model): The model class that was deleted.
+        instance (Article): The Article that was deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    #pylint: disable=E1101
+    tag_ids = instance.__dict__.pop("_deleted_tag_ids", None)
+    if tag_ids:
+        Tag.objects.filter(pk__in=tag_ids).update_article_count()
+
+@receiver(post_save, sender=Article)
+def article_saved_related(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Finds the related Articles of a new Article, which is related to those
+    near it in its Series even before it has Tags.
+
+    Args:
+        sender (models.Model): The model class that was saved.
+        instance (Article): The Article that was saved.
+        created (bool): True if the Article is new.
+        raw (bool): True when loading fixtures, in which case nothing is
+            related; run `rebuild_related_articles` afterwards.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    if created and not raw:
+        refresh_related([instance.pk])
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def related_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Relates Articles again once their Tags change.
+
+    Args:
+        sender (models.Model): The model linking Articles and Tags.
+        instance (models.Model): The Article or Tag whose links changed.
+        action (str): What happened.
+        reverse (bool): True when `instance` is a Tag.
+        pk_set (set): The primary keys of the other side of the links, or
+            None when they were cleared.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        refresh_related([instance.pk])
+    elif pk_set:
+        refresh_related(pk_set)
+    else:
+        refresh_related(instance.__dict__.pop("_unlinked_article_ids", []))
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted_related(sender, instance, **kwargs):
+    """
+    Relates the Articles of a deleted Tag again.
+
+    Args:
+        sender (models.Model): The model class that was deleted.
+        instance (Tag): The Tag that was deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    refresh_related(instance.__dict__.pop("_unlinked_article_ids", []))
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def article_changed_feeds(sender, instance, **kwargs):
+    """
+    Invalidates the feeds an Article is in, and was in before it was saved.
+
+    Args:
+        sender (models.Model): The model class that was saved or deleted.
+        instance (Article): The Article that was saved or deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    scopes = article_scopes(instance.series_id, instance.author_id)
+    saved = getattr(instance, "_saved_series_state", None)
+    if saved is not None:
+        scopes |= article_scopes(saved[0], getattr(instance, "_saved_author_id", None))
+    bump_feed_versions(scopes)
+
+@receiver(post_save, sender=Series)
+@receiver(post_delete, sender=Series)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def feeds_changed(sender, **kwargs):
+    """
+    Invalidates every feed when a Series or Author changes, since feeds show
+    their names and are found by their slugs.
+
+    Args:
+        sender (models.Model): The model class that was saved or deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    bump_feed_versions({ALL_FEEDS})
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def article_changed_sitemap(sender, instance, **kwargs):
+    """
+    Invalidates the sitemap shard listing an Article, and the sitemap index.
+
+    Args:
+        sender (models.Model): The model class that was saved or deleted.
+        instance (Article): The Article that was saved or deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    bump_sitemap_versions({get_shard(instance.pk), SITEMAP_INDEX})
+
+@receiver(post_save, sender=Series)
+@receiver(post_delete, sender=Series)
+def sitemaps_changed(sender, **kwargs):
+    """
+    Invalidates every sitemap when a Series changes, since the URLs of
+    Articles include their Series' slug. Authors are only in the pages
+    sitemap, which follows the content version.
+
+    Args:
+        sender (models.Model): The model class that was saved or deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    bump_sitemap_versions({ALL_SITEMAPS})
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed_sitemap(sender, **kwargs):
+    """
+    Invalidates the pages sitemap when a Tag changes, since it lists Tags.
+    Changes to which Articles a Tag is on are noticed by
+    `TagQuerySet.update_article_count`.
+
+    Args:
+        sender (models.Model): The model class that was saved or deleted.
+        **kwargs: Not used here; included because Django requires it.
+    """
+
+    bump_sitemap_versions({SITEMAP_PAGES})
@@ -0,0 +1,222 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Max, Min
+from django.http import HttpRequest
+from django.urls import reverse
+from django.utils.html import escape
+
+from .caching import bump_version, get_content_version, get_version, seconds_until
+
+SITEMAP_VERSION_KEY = "articles:sitemap_version:{0}"
+# Bumped when any Series changes, since Article URLs include its slug.
+ALL_SITEMAPS = "all"
+SITEMAP_INDEX = "index"
+SITEMAP_PAGES = "pages"
+SITEMAP_NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def get_shard_size() -> int:
+    """
+    Returns how many Article primary keys each sitemap shard covers.
+
+    Set with `SITEMAP_SHARD_SIZE` in settings, defaulting to 50000, the most
+    URLs a sitemap may have.
+
+    Returns:
+        int: The number of primary keys in each shard.
+    """
+
+    return getattr(settings, "SITEMAP_SHARD_SIZE", 50000)
+
+def get_shard(article_id: int) -> int:
+    """
+    Returns which sitemap shard lists the Article with `article_id`.
+
+    Shards are ranges of primary keys, so an Article never moves between
+    them and changing one only invalidates its own.
+
+    Args:
+        article_id (int): The primary key of the Article.
+
+    Returns:
+        int: The shard's number, from 0.
+    """
+
+    return article_id // get_shard_size()
+
+def get_sitemap_version(scope) -> int:
+    """
+    Returns the current version of a sitemap.
+
+    Args:
+        scope: A shard number, "index", "pages" or "all".
+
+    Returns:
+        int: The current version.
+    """
+
+    return get_version(SITEMAP_VERSION_KEY.format(scope))
+
+def bump_sitemap_versions(scopes: set):
+    """
+    Changes the versions of each of `scopes`, invalidating those sitemaps.
+
+    Args:
+        scopes (set): Scopes, as for `get_sitemap_version`.
+    """
+
+    for scope in scopes:
+        bump_version(SITEMAP_VERSION_KEY.format(scope))
+
+def _url(base: str, path: str, lastmod=None) -> str:
+    """
+    Returns a sitemap `<url>` element for `path`.
+    """
+
+    if lastmod is None:
+        return "<url><loc>{0}</loc></url>".format(escape(base + path))
+    return "<url><loc>{0}</loc><lastmod>{1}</lastmod></url>".format(
+        escape(base + path), lastmod.isoformat()
+    )
+
+def _build_index(base: str) -> tuple:
+    """
+    Returns the sitemap index, listing the pages sitemap and each shard
+    with a visible Article, and when it goes stale.
+    """
+
+    #pylint: disable=E1101
+    from .models import Article
+
+    shards = Article.get_available_articles().annotate(
+        shard = F("pk") / get_shard_size()
+    ).order_by("shard").values("shard").annotate(lastmod=Max("date_modified"))
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<sitemapindex xmlns="{0}">'.format(SITEMAP_NAMESPACE),
+        "<sitemap><loc>{0}</loc></sitemap>".format(escape(base + reverse("sitemap-pages"))),
+    ]
+    for shard in shards:
+        lines.append("<sitemap><loc>{0}</loc><lastmod>{1}</lastmod></sitemap>".format(
+            escape(base + reverse("sitemap-shard", args=[shard["shard"]])),
+            shard["lastmod"].isoformat()
+        ))
+    lines.append("</sitemapindex>")
+    return lines, Article.get_next_publish_date()
+
+def _build_pages(base: str) -> tuple:
+    """
+    Returns the sitemap of everything but Articles: the lists, and each
+    Series, Author and Tag with visible Articles.
+    """
+
+    #pylint: disable=E1101
+    from .models import Article, Author, Series, Tag
+
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<urlset xmlns="{0}">'.format(SITEMAP_NAMESPACE),
+    ]
+    for name in ("index", "article-list", "series-list", "tag-list"):
+        lines.append(_url(base, reverse(name)))
+    visible = Article.get_available_articles()
+    series = Series.objects.filter(pk__in=visible.values("series")).order_by("pk")
+    for s in series.only("slug", "latest_article_date").iterator():
+        lines.append(_url(base, s.get_absolute_url(), s.latest_article_date))
+    authors = Author.objects.filter(pk__in=visible.values("author")).order_by("pk")
+    for author in authors.only("slug").iterator():
+        lines.append(_url(base, author.get_absolute_url()))
+    for tag in Tag.objects.in_cloud().only("slug").iterator():
+        lines.append(_url(base, tag.get_absolute_url()))
+    lines.append("</urlset>")
+    return lines, Article.get_next_publish_date()
+
+def _build_shard(base: str, shard: int) -> tuple:
+    """
+    Returns the sitemap of the visible Articles in a shard, read with one
+    streaming query that joins their Series' slugs.
+    """
+
+    #pylint: disable=E1101
+    from .models import Article, now
+
+    size = get_shard_size()
+    in_shard = {"pk__gte": shard * size, "pk__lt": (shard + 1) * size}
+    articles = Article.get_available_articles().filter(**in_shard).order_by("pk")
+    # `Article.get_absolute_url` reversed once, rather than for each of tens
+    # of thousands of Articles; slugs need no escaping.
+    path = reverse("article-detail", args=["sitemap-series", "sitemap-article"])
+    url = "<url><loc>{0}</loc><lastmod>{{2}}</lastmod></url>".format(escape(base + path.replace(
+        "sitemap-series", "{0}"
+    ).replace("sitemap-article", "{1}")))
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<urlset xmlns="{0}">'.format(SITEMAP_NAMESPACE),
+    ]
+    rows = articles.values_list("series__slug", "slug", "date_modified")
+    for series_slug, slug, date_modified in rows.iterator(chunk_size=2000):
+        lines.append(url.format(series_slug, slug, date_modified.isoformat()))
+    lines.append("</urlset>")
+    next_publish = Article.objects.filter(
+        enabled = True,
+        publish_date__gt = now(),
+        **in_shard
+    ).aggregate(next_publish=Min("publish_date"))["next_publish"]
+    return lines, next_publish
+
+def get_sitemap(request: HttpRequest, section=None) -> dict:
+    """
+    Returns a rendered sitemap, from the cache if it's there.
+
+    Each shard is cached under its own version, which changes when an
+    Article in it is saved or deleted (see `get_shard`), so only the
+    shards touched by a change are rendered again. The index is cached
+    under a version changed by any Article, and the pages sitemap under its
+    own version, changed by Tags and their counts, and the content version,
+    changed by Series and Authors. Everything is keyed by the host as well, since the
+    URLs are absolute, and expires at the next scheduled `publish_date` it
+    could show, or after `SITEMAP_CACHE_TIMEOUT` seconds (defaulting to
+    86400).
+
+    Args:
+        request (HttpRequest): The request.
+        section (optional): Defaults to None, meaning the sitemap index.
+            "pages", or a shard number.
+
+    Returns:
+        dict: The `content` (bytes), `etag` (a strong ETag of the content)
+            and `next_publish` (a datetime, or None).
+    """
+
+    base = request.build_absolute_uri("/")[:-1]
+    scope = SITEMAP_INDEX if section is None else section
+    version = get_sitemap_version(scope)
+    if section == SITEMAP_PAGES:
+        version = "{0}-{1}".format(version, get_content_version())
+    key = "articles:sitemap:{0}:{1}:{2}:{3}".format(
+        get_sitemap_version(ALL_SITEMAPS),
+        scope,
+        version,
+        hashlib.md5(base.encode()).hexdigest()
+    )
+    sitemap = cache.get(key)
+    if sitemap is None:
+        if section is None:
+            lines, next_publish = _build_index(base)
+        elif section == SITEMAP_PAGES:
+            lines, next_publish = _build_pages(base)
+        else:
+            lines, next_publish = _build_shard(base, section)
+        content = "\n".join(lines).encode("utf-8")
+        sitemap = {
+            "content": content,
+            "etag": '"{0}"'.format(hashlib.md5(content).hexdigest()),
+            "next_publish": next_publish,
+        }
+        cache.set(key, sitemap, seconds_until(
+            next_publish,
+            getattr(settings, "SITEMAP_CACHE_TIMEOUT", 86400)
+        ))
+    return sitemap
@@ -0,0 +1,159 @@
+from django import template
+from django.db import models
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+
+from articles.images import (get_derivative_specs, get_ladder, 
+    FORMAT_CONTENT_TYPES, FORMAT_EXTENSIONS)
+from articles.models import ImageRendition
+
+register = template.Library()
+
+
+def _srcsets(instance: models.Model, field: str) -> tuple:
+    """
+    Returns the `srcset` of each alternate format of an image field.
+
+    Every format is offered in every width of the field's ladder (see
+    `articles.images.get_ladder`). Renditions which don't exist yet link to
+    the `image-rendition` view, which creates them on first request.
+    
+    Args:
+        instance (models.Model): An Author, Series, or Article.
+        field (str): The name of the image field, such as "image_full".
+    
+    Returns:
+        tuple: A list of (srcset, MIME type) tuples, the format with the
+            smallest full width file first, and the full width. The list is
+            empty if the field has no renditions at all, since its width
+            isn't known without them.
+    """
+
+    renditions = ImageRendition.for_instance(instance, field)
+    if not renditions:
+        return [], None
+    spec = {s.field: s for s in get_derivative_specs()}.get(field)
+    full_width = max(r.width for r in renditions)
+    by_format = {}
+    for r in renditions:
+        by_format.setdefault(r.format, {})[r.width] = r
+    if spec is not None:
+        for image_format in spec.formats:
+            by_format.setdefault(image_format, {})
+    widths = get_ladder(spec.widths if spec else (), full_width)
+
+    srcsets = []
+    for image_format, by_width in by_format.items():
+        candidates = []
+        for width in widths:
+            if width in by_width:
+                url = by_width[width].file.url
+            else:
+                url = reverse("image-rendition", kwargs={
+                    "model": instance._meta.model_name,
+                    "pk": instance.pk,
+                    "field": field,
+                    "width": width,
+                    "extension": FORMAT_EXTENSIONS[image_format],
+                })
+            candidates.append("{0} {1}w".format(url, width))
+        full = by_width.get(full_width)
+        srcsets.append((
+            full.size if full else float("inf"),
+            ", ".join(candidates),
+            FORMAT_CONTENT_TYPES[image_format]
+        ))
+    srcsets.sort(key=lambda s: s[0])
+    return [s[1:] for s in srcsets], full_width
+
+@register.simple_tag
+def picture(instance: models.Model, field: str, alt: str = "", 
+        sizes: str = "") -> str:
+    """
+    Renders an image field as a `<picture>`, offering every stored format.
+
+    Each alternate format of the field becomes a `<source>` with a `srcset`
+    of every width it comes in (see `IMAGE_SRCSET_WIDTHS`), the format with
+    the smallest file first, so the browser downloads the smallest format it
+    supports in the smallest width that fills the space. The field's own PNG
+    is the `<img>` fallback.
+
+    Usage:
+        {% load article_images %}
+        {% picture article "image_full" alt=article.title sizes="50vw" %}
+    
+    Args:
+        instance (models.Model): An Author, Series, or Article.
+        field (str): The name of the image field, such as "image_full".
+        alt (str, optional): Defaults to "". The image's alt text.
+        sizes (str, optional): Defaults to "", which is the full image's 
+            width, or the whole viewport if that's narrower. The `sizes` 
+            attribute, telling the browser how wide the image is shown.
+    
+    Returns:
+        str: The HTML, or an empty string if the field has no image.
+    """
+
+    image = getattr(instance, field, None)
+    if not image:
+        return ""
+    srcsets, full_width = _srcsets(instance, field)
+    if srcsets and not sizes:
+        sizes = "(max-width: {0}px) 100vw, {0}px".format(full_width)
+    sources = format_html_join(
+        "",
+        '<source srcset="{0}" sizes="{1}" type="{2}">',
+        ((srcset, sizes, content_type) for srcset, content_type in srcsets)
+    )
+    return format_html(
+        '<picture>{0}<img src="{1}" alt="{2}"></picture>',
+        sources,
+        image.url,
+        alt
+    )
+
+@register.simple_tag
+def background_image(instance: models.Model, field: str) -> str:
+    """
+    Renders a `style` attribute using an image field as background image.
+
+    CSS backgrounds can't use `<picture>`, so the formats are offered with
+    `image-set()` instead, using the full width rendition of each format. 
+    A plain `url()` to the PNG comes first, for browsers which don't 
+    understand `image-set()` with types.
+
+    Usage:
+        {% load article_images %}
+        <div {% background_image article "image_thumbnail_transparent" %}>
+    
+    Args:
+        instance (models.Model): An Author, Series, or Article.
+        field (str): The name of the image field.
+    
+    Returns:
+        str: The `style` attribute, or an empty string if the field has no 
+            image.
+    """
+
+    image = getattr(instance, field, None)
+    if not image:
+        return ""
+    renditions = ImageRendition.for_instance(instance, field)
+    if renditions:
+        full_width = max(r.width for r in renditions)
+        renditions = [r for r in renditions if r.width == full_width]
+    if not renditions:
+        return format_html(
+            'style="background-image: url(\'{0}\')"', 
+            image.url
+        )
+    options = format_html_join(
+        ", ",
+        'url(\'{0}\') type(\'{1}\')',
+        [(r.file.url, r.content_type) for r in renditions] + [(image.url, "image/png")]
+    )
+    return format_html(
+        'style="background-image: url(\'{0}\'); background-image: image-set({1})"',
+        image.url,
+        options
+    )
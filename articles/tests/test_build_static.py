@@ -0,0 +1,97 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from io import StringIO
+
+from articles.management.commands.build_static import page_file
+from articles.models import Author, Series, Article
+
+
+class TestBuildStatic(TestCase):
+    #pylint: disable=E1101
+
+    def setUp(self):
+        cache.clear()
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+        self.author = Author.objects.create(name="Test Author", bio="test")
+        self.series = Series.objects.create(name="Test Series", description="test")
+        self.other = Series.objects.create(name="Other Series", description="test")
+        self.create("Welcome", enabled=False)
+        for index in range(8):
+            self.create("Test {0}".format(index), publish_date=timezone.now() - timedelta(days=index + 1))
+        self.create("Elsewhere", series=self.other, publish_date=timezone.now() - timedelta(days=30))
+
+    def create(self, title, **kwargs) -> Article:
+        kwargs.setdefault("series", self.series)
+        return Article.objects.create(title=title, content="<p>Body</p>", author=self.author, **kwargs)
+
+    def build(self, *args) -> str:
+        out = StringIO()
+        call_command("build_static", self.output, "--workers", "1", "--base-url",
+            "http://testserver", *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def read(self, name: str) -> str:
+        with open(os.path.join(self.output, name), encoding="utf-8") as file:
+            return file.read()
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.output, name))
+
+    def test_page_files(self):
+        self.assertEqual("index.html", page_file("/"))
+        self.assertEqual("articles.html", page_file("/articles"))
+        self.assertEqual("articles/page/2.html", page_file("/articles", 2))
+        self.assertEqual("articles/feed.rss", page_file("/articles/feed.rss"))
+
+    def test_full_build(self):
+        self.assertIn("(0 failed)", self.build("--no-media"))
+        for name in ("index.html", "articles.html", "articles/series.html", "articles/tags.html",
+                "articles/test-series/test-0.html", "articles/series/test-series.html",
+                "author/test-author.html", "articles/feed.rss", "sitemap.xml", "sitemap-0.xml"):
+            self.assertTrue(self.exists(name), name)
+        self.assertFalse(self.exists("articles/test-series/welcome.html"))
+        self.assertIn("Test 7", self.read("articles/page/2.html"))
+        self.assertIn('href="/articles/page/2"', self.read("articles.html"))
+        self.assertIn('href="/articles"', self.read("articles/page/2.html"))
+        self.assertIn("http://testserver/articles/test-series/test-0", self.read("sitemap-0.xml"))
+
+    def test_incremental_build(self):
+        self.build("--no-media")
+        self.assertIn("Rendered 0 of", self.build("--no-media"))
+        # Older than the latest Articles in the sidebar, which every page shows.
+        article = Article.objects.get(title="Test 7")
+        article.shortline = "Edited"
+        article.save()
+        untouched = os.path.join(self.output, "articles/series/other-series.html")
+        os.utime(untouched, (0, 0))
+        out = self.build("--no-media")
+        rendered, total = map(int, re.search(r"Rendered (\d+) of (\d+)", out).groups())
+        self.assertTrue(0 < rendered < total, out)
+        self.assertIn("Edited", self.read("articles/test-series/test-7.html"))
+        manifest = json.loads(self.read("build_static.json"))
+        self.assertIn("/articles/series/other-series", manifest["units"])
+        self.assertEqual(0, os.path.getmtime(untouched))
+
+    def test_hidden_articles_are_removed(self):
+        self.build("--no-media")
+        Article.objects.filter(title="Elsewhere").update(enabled=False)
+        self.build("--no-media")
+        self.assertFalse(self.exists("articles/other-series/elsewhere.html"))
+        self.assertTrue(self.exists("articles/test-series/test-0.html"))
+
+    def test_copies_media(self):
+        self.create("Listen", audio=SimpleUploadedFile("build_static.mp3", b"audio"))
+        self.build()
+        self.assertEqual("audio", self.read("articles/test-series/listen/audio"))
+        self.assertTrue(self.exists("static/articles/css/style.css"))
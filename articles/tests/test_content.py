@@ -0,0 +1,101 @@
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.urls import reverse
+from io import StringIO
+
+from articles.content import render_content
+from articles.models import Author, Series, Article
+from .test_models import fake_now
+
+
+class TestRenderContent(TestCase):
+
+    def test_keeps_allowed_markup(self):
+        html = '<p>Some <em>text</em> &amp; a <a href="https://example.com">link</a>.<br></p>'
+        self.assertEqual(html, render_content(html))
+
+    def test_removes_scripts_and_handlers(self):
+        rendered = render_content('<p onclick="steal()">Hi</p><script>steal()</script>')
+        self.assertEqual("<p>Hi</p>", rendered)
+
+    def test_removes_javascript_urls(self):
+        rendered = render_content('<a href="javascript:steal()">Hi</a>')
+        self.assertEqual("<a>Hi</a>", rendered)
+
+    def test_removes_javascript_urls_with_control_characters(self):
+        for entity in ("&#x09;", "&#9;", "&#x0A;", "&#10;", "&#x0D;", "&#13;", "&#x01;"):
+            rendered = render_content('<a href="java{0}script:steal()">Hi</a>'.format(entity))
+            self.assertEqual("<a>Hi</a>", rendered, entity)
+        rendered = render_content('<img src="&#x0A;&#x01; javascript:steal()">')
+        self.assertNotIn("src", rendered)
+        self.assertEqual('<a href="/a b">Hi</a>', render_content('<a href="/a&#x09; b">Hi</a>'))
+
+    def test_unwraps_unknown_tags(self):
+        self.assertEqual("Hi", render_content("<blink>Hi</blink><!-- note -->"))
+
+    def test_images_load_lazily(self):
+        self.assertEqual(
+            '<img src="/a.png" loading="lazy">',
+            render_content('<img src="/a.png">')
+        )
+        self.assertIn('loading="eager"', render_content('<img src="/a.png" loading="eager">'))
+
+    def test_headings_get_unique_ids(self):
+        rendered = render_content("<h2>Part <em>one</em></h2><h2>Part one</h2><h3 id=\"x\">X</h3>")
+        self.assertIn('<h2 id="part-one">Part <em>one</em></h2>', rendered)
+        self.assertIn('<h2 id="part-one-2">', rendered)
+
+    @override_settings(MEDIA_URL="/media/", CONTENT_MEDIA_URL="https://cdn.example.com/")
+    def test_rewrites_media_urls(self):
+        self.assertEqual(
+            '<img src="https://cdn.example.com/uploads/a.png" loading="lazy">',
+            render_content('<img src="/media/uploads/a.png">')
+        )
+
+
+class TestArticleContent(TestCase):
+    #pylint: disable=E1101
+
+    def setUp(self):
+        self.article = Article.objects.create(
+            title = "Test",
+            content = "<p>Hi</p><script>steal()</script>",
+            series = Series.objects.create(name="Test Series", description="test"),
+            author = Author.objects.create(name="Test Author", bio="test"),
+            publish_date = fake_now()
+        )
+
+    def test_rendered_on_save(self):
+        self.assertEqual("<p>Hi</p>", self.article.content_rendered)
+        self.assertEqual(64, len(self.article.content_hash))
+
+    def test_rendered_on_partial_save(self):
+        self.article.content = "<p>Bye</p>"
+        self.article.save(update_fields=["content"])
+        self.article.refresh_from_db()
+        self.assertEqual("<p>Bye</p>", self.article.content_rendered)
+
+    def test_page_shows_rendered_content(self):
+        response = self.client.get(reverse("article-detail", args=["test-series", "test"]))
+        self.assertContains(response, "<p>Hi</p>")
+        self.assertNotContains(response, "steal()")
+
+    def test_unrendered_articles_render_on_the_fly(self):
+        Article.objects.update(content_rendered="", content_hash="")
+        self.assertEqual("<p>Hi</p>", Article.objects.get().rendered_content)
+
+    def test_command_renders_changed_articles(self):
+        Article.objects.update(content_rendered="", content_hash="")
+        out = StringIO()
+        call_command("render_content", stdout=out)
+        self.assertIn("Rendered 1 Article(s)", out.getvalue())
+        self.assertEqual("<p>Hi</p>", Article.objects.get().content_rendered)
+        out = StringIO()
+        call_command("render_content", stdout=out)
+        self.assertIn("Rendered 0 Article(s)", out.getvalue())
+        self.assertIn("1 unchanged", out.getvalue())
+
+    def test_command_leaves_date_modified(self):
+        date_modified = Article.objects.get().date_modified
+        call_command("render_content", "--force", stdout=StringIO())
+        self.assertEqual(date_modified, Article.objects.get().date_modified)
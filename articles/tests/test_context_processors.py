@@ -1,13 +1,16 @@
 from django.test import TestCase, RequestFactory
 from django.conf import settings
+from django.core.cache import cache
 
 from articles.context_processors import (latest_articles, site_title, 
-    wyverns_and_whimsy_link, about_me_link, portfolio_link)
+    wyverns_and_whimsy_link, about_me_link, portfolio_link, site_chrome)
+from articles.caching import get_content_version
 from articles.models import Series, Author, Article
 
 class TestSiteTitle(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.factory = RequestFactory()
     
     def test_site_title(self):
@@ -40,6 +43,7 @@ class TestArticlesContextProcessors(TestCase):
             )
 
     def setUp(self):
+        cache.clear()
         self.factory = RequestFactory()
 
     def test_latest_articles(self):
@@ -73,9 +77,61 @@ class TestArticlesContextProcessors(TestCase):
         expected = "/articles/wyverns-and-whimsy/portfolio"
         self.assertEqual(expected, portfolio["portfolio_link"])
 
+    def test_site_chrome_has_all_keys(self):
+        request = self.factory.get("/")
+        chrome = site_chrome(request)
+        expected = {"latest_articles", "latest_article", "wyverns_link", 
+            "about_link", "portfolio_link"}
+        self.assertEqual(expected, set(chrome))
+
+    def test_site_chrome_is_memoized_per_request(self):
+        request = self.factory.get("/")
+        site_chrome(request)
+        with self.assertNumQueries(0):
+            latest_articles(request)
+            wyverns_and_whimsy_link(request)
+            about_me_link(request)
+            portfolio_link(request)
+
+    def test_site_chrome_is_cached_between_requests(self):
+        site_chrome(self.factory.get("/"))
+        with self.assertNumQueries(0):
+            site_chrome(self.factory.get("/"))
+
+    def test_sidebar_does_not_query_series(self):
+        chrome = site_chrome(self.factory.get("/"))
+        with self.assertNumQueries(0):
+            for article in chrome["latest_articles"]:
+                article.get_absolute_url()
+                article.series.name
+
+    def test_site_chrome_is_invalidated_on_article_save(self):
+        #pylint: disable=E1101
+        site_chrome(self.factory.get("/"))
+        a = Article.objects.get(title="Test1")
+        a.title = "Test1 Changed"
+        a.save()
+        chrome = site_chrome(self.factory.get("/"))
+        self.assertIn(a, chrome["latest_articles"])
+        self.assertIn("Test1 Changed", [x.title for x in chrome["latest_articles"]])
+
+    def test_site_chrome_is_invalidated_on_article_delete(self):
+        #pylint: disable=E1101
+        site_chrome(self.factory.get("/"))
+        Article.objects.get(title="Portfolio").delete()
+        chrome = site_chrome(self.factory.get("/"))
+        self.assertEqual("#", chrome["portfolio_link"])
+
+    def test_content_version_changes_on_series_save(self):
+        #pylint: disable=E1101
+        version = get_content_version()
+        Series.objects.get(name="Wyverns and Whimsy").save()
+        self.assertNotEqual(version, get_content_version())
+
 class TestArticleContextProcessorsNoMatches(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.factory = RequestFactory()
 
     def test_latest_articles_no_matches(self):
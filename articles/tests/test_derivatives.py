@@ -0,0 +1,205 @@
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.core.management import call_command, CommandError
+from django.utils import timezone
+from PIL import Image
+from io import StringIO
+
+from articles.derivatives import run_pending_jobs, run_job
+from articles.images import get_derivative_specs
+from articles.management.commands import rebuild_images
+from articles.models import (Author, Series, Article, ImageJob, ImageRendition,
+    ImageSource)
+from .test_models import get_test_image
+
+
+@override_settings(IMAGE_DERIVATIVE_EXECUTOR="worker")
+class TestImageJobQueue(TestCase):
+    #pylint: disable=E1101
+
+    def setUp(self):
+        self.series = Series.objects.create(
+            name = "Test Series",
+            description = "test",
+            image_raw = get_test_image()
+        )
+
+    def test_save_does_not_create_images(self):
+        self.assertFalse(self.series.image_thumbnail)
+        self.assertFalse(self.series.image_thumbnail_transparent)
+        self.assertFalse(self.series.image_full)
+
+    def test_save_marks_images_pending(self):
+        self.series.refresh_from_db()
+        self.assertTrue(self.series.images_pending)
+
+    def test_save_queues_job(self):
+        job = ImageJob.objects.get()
+        self.assertEqual("articles.series", job.model)
+        self.assertEqual(self.series.pk, job.object_id)
+        self.assertEqual(ImageJob.PENDING, job.status)
+
+    def test_saving_again_does_not_queue_another_job(self):
+        self.series.description = "changed"
+        self.series.save()
+        self.assertEqual(1, ImageJob.objects.count())
+
+    def test_run_pending_jobs_creates_images(self):
+        run_pending_jobs()
+        self.series.refresh_from_db()
+        self.assertFalse(self.series.images_pending)
+        size = Image.open(self.series.image_full).size
+        self.assertTrue(size[0] > 0 and size[1] > 0)
+        self.assertEqual("RGBA", Image.open(self.series.image_thumbnail_transparent).mode)
+
+    def test_run_pending_jobs_marks_job_done(self):
+        self.assertEqual(1, run_pending_jobs())
+        job = ImageJob.objects.get()
+        self.assertEqual(ImageJob.DONE, job.status)
+        self.assertEqual(1, job.attempts)
+        self.assertIsNotNone(job.date_finished)
+
+    def test_job_is_only_run_once(self):
+        job = ImageJob.objects.get()
+        self.assertTrue(run_job(job.pk))
+        self.assertFalse(run_job(job.pk))
+
+    def test_job_for_deleted_instance_is_done(self):
+        author = Author.objects.create(
+            name = "Test Author", 
+            bio = "test", 
+            image_raw = get_test_image()
+        )
+        author.delete()
+        run_pending_jobs()
+        self.assertFalse(ImageJob.objects.exclude(status=ImageJob.DONE).exists())
+
+    def test_stalled_jobs_are_run_again(self):
+        ImageJob.objects.update(status=ImageJob.RUNNING, date_started=timezone.now())
+        self.assertEqual(0, run_pending_jobs())
+        ImageJob.objects.update(date_started=timezone.now() - timedelta(seconds=601))
+        self.assertEqual(1, run_pending_jobs())
+        job = ImageJob.objects.get()
+        self.assertEqual(ImageJob.DONE, job.status)
+        self.series.refresh_from_db()
+        self.assertFalse(self.series.images_pending)
+
+    def test_saving_replaces_stalled_job(self):
+        stalled = ImageJob.objects.get()
+        ImageJob.objects.update(
+            status = ImageJob.RUNNING,
+            date_started = timezone.now() - timedelta(seconds=601)
+        )
+        self.series.image_raw = get_test_image()
+        self.series.save()
+        stalled.refresh_from_db()
+        self.assertEqual(ImageJob.FAILED, stalled.status)
+        self.assertEqual(ImageJob.PENDING, ImageJob.objects.exclude(pk=stalled.pk).get().status)
+
+    def test_process_image_jobs_command(self):
+        out = StringIO()
+        call_command("process_image_jobs", "--once", stdout=out)
+        self.series.refresh_from_db()
+        self.assertTrue(self.series.image_thumbnail)
+        self.assertIn("Ran 1 image job(s).", out.getvalue())
+
+
+@override_settings(IMAGE_DERIVATIVE_EXECUTOR="sync")
+class TestSynchronousExecutor(TestCase):
+    #pylint: disable=E1101
+
+    def test_save_creates_images(self):
+        a = Author.objects.create(
+            name = "Test Author", 
+            bio = "test", 
+            image_raw = get_test_image()
+        )
+        self.assertTrue(a.image_thumbnail)
+        self.assertFalse(a.images_pending)
+        self.assertFalse(ImageJob.objects.exists())
+
+
+@override_settings(IMAGE_DERIVATIVE_EXECUTOR="sync")
+class TestRebuildImages(TestCase):
+    #pylint: disable=E1101
+
+    def setUp(self):
+        self.series = Series.objects.create(
+            name = "Test Series",
+            description = "test",
+            image_raw = get_test_image()
+        )
+
+    def rebuild(self, *args):
+        out = StringIO()
+        call_command("rebuild_images", "--jobs", "1", *args, stdout=out)
+        return out.getvalue()
+
+    def test_save_sets_image_hash(self):
+        self.assertEqual(64, len(self.series.image_hash))
+
+    def test_unchanged_images_are_skipped(self):
+        out = self.rebuild()
+        self.assertIn("Rebuilt 0 image(s)", out)
+        self.assertIn("1 unchanged", out)
+
+    def test_changed_size_is_rebuilt(self):
+        with self.settings(IMAGE_FULL_SIZE=(500, 500)):
+            out = self.rebuild()
+            self.series.refresh_from_db()
+            self.assertIn("Rebuilt 1 image(s)", out)
+            self.assertIn("/s)", out)
+            self.assertEqual(500, max(Image.open(self.series.image_full).size))
+            self.assertIn("0 unchanged", out)
+            self.assertIn("Rebuilt 0 image(s)", self.rebuild())
+
+    def test_identical_sources_built_once(self):
+        Author.objects.create(name="Test Author", bio="test", image_raw=get_test_image())
+        old_hash = self.series.image_hash
+        with self.settings(IMAGE_FULL_SIZE=(500, 500)):
+            out = self.rebuild()
+        self.assertIn("Rebuilt 2 image(s)", out)
+        author = Author.objects.get()
+        self.series.refresh_from_db()
+        self.assertEqual(self.series.image_full.name, author.image_full.name)
+        self.assertEqual([author.image_hash], list(ImageSource.objects.values_list("hash", flat=True)))
+        self.assertNotEqual(old_hash, author.image_hash)
+
+    def test_force(self):
+        old_hash = self.series.image_hash
+        storage = self.series.image_full.storage
+        before = set(storage.listdir("uploads")[1])
+        self.assertIn("Rebuilt 1 image(s)", self.rebuild("--force"))
+        self.series.refresh_from_db()
+        self.assertEqual(old_hash, self.series.image_hash)
+        source = ImageSource.objects.get()
+        self.assertEqual(old_hash, source.hash)
+        self.assertEqual(source.image_full.name, self.series.image_full.name)
+        used = {source.image_thumbnail.name, source.image_thumbnail_transparent.name, source.image_full.name}
+        used.update(ImageRendition.objects.values_list("file", flat=True))
+        added = {"uploads/" + name for name in set(storage.listdir("uploads")[1]) - before}
+        # Rebuilt images replace the old ones rather than being copies.
+        self.assertLessEqual(added, used)
+        self.assertTrue(all(storage.exists(name) for name in used))
+
+    def test_shared_images_are_counted(self):
+        Author.objects.create(name="Test Author", bio="test", image_raw=get_test_image())
+        with self.settings(IMAGE_FULL_SIZE=(500, 500)):
+            out = self.rebuild()
+            stored = sum(
+                rebuild_images.Command().stored_bytes(i, get_derivative_specs())
+                for i in (Author.objects.get(), Series.objects.get())
+            )
+        self.assertIn(" {0} after".format(stored), out)
+
+    def test_dry_run(self):
+        size = Image.open(self.series.image_full).size
+        with self.settings(IMAGE_FULL_SIZE=(size[0] // 2, size[1] // 2)):
+            out = self.rebuild("--dry-run")
+        self.assertIn("Would rebuild 1 image(s)", out)
+        self.series.refresh_from_db()
+        self.assertEqual(size, Image.open(self.series.image_full).size)
+
+    def test_invalid_since(self):
+        with self.assertRaises(CommandError):
+            self.rebuild("--since", "yesterday")
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+
+from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from io import StringIO
+from mock import patch
+
+from articles.dumps import iter_dump
+from articles.management.commands import export_site
+from articles.models import Author, Series, Tag, Article, ImageJob
+from articles.search import SearchResults
+
+DUMP_PATH = "devdatadump-8-8-18.json"
+
+
+class TestIterDump(TestCase):
+
+    def test_reads_json_array(self):
+        with open(DUMP_PATH) as file:
+            expected = json.load(file)
+        with open(DUMP_PATH) as file:
+            self.assertEqual(expected, list(iter_dump(file, chunk_size=16)))
+
+    def test_reads_one_object_per_line(self):
+        dump = StringIO('{"model": "a", "pk": 1}\n\n{"model": "b", "pk": 2}\n')
+        self.assertEqual(["a", "b"], [o["model"] for o in iter_dump(dump, chunk_size=4)])
+
+    def test_empty_dump(self):
+        self.assertEqual([], list(iter_dump(StringIO(""))))
+        self.assertEqual([], list(iter_dump(StringIO(" [ ] "))))
+
+    def test_invalid_json_raises(self):
+        with self.assertRaises(ValueError):
+            list(iter_dump(StringIO('[{"model": ')))
+
+
+class TestImportArticles(TestCase):
+    #pylint: disable=E1101
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command("import_articles", DUMP_PATH, *args, stdout=out)
+        return out.getvalue()
+
+    def test_imports_dump(self):
+        out = self.run_import("--batch-size", "5")
+        self.assertEqual(19, Article.objects.count())
+        self.assertEqual(10, Series.objects.count())
+        self.assertEqual(11, Tag.objects.count())
+        self.assertEqual(1, Author.objects.count())
+        self.assertIn("Imported 41 row(s)", out)
+        self.assertIn("/s)", out)
+
+    def test_keeps_dates_and_tags(self):
+        with open(DUMP_PATH) as file:
+            data = next(o for o in json.load(file) if o["model"] == "articles.article")
+        self.run_import()
+        article = Article.objects.get(pk=data["pk"])
+        self.assertEqual(data["fields"]["date_modified"][:19], article.date_modified.isoformat()[:19])
+        self.assertEqual(sorted(data["fields"]["tags"]), sorted(article.tags.values_list("pk", flat=True)))
+
+    def test_sets_latest_article_date(self):
+        self.run_import()
+        series = Series.objects.filter(article__enabled=True).distinct()[0]
+        newest = series.article_set.filter(enabled=True).order_by("-publish_date")[0]
+        self.assertEqual(newest.publish_date, series.latest_article_date)
+
+    def test_queries_do_not_grow_with_rows(self):
+        with self.assertNumQueries(14):
+            self.run_import("--batch-size", "1000")
+
+    def test_indexes_for_search(self):
+        self.run_import()
+        self.assertTrue(SearchResults("lorem ipsum").count())
+
+    def test_queues_missing_images(self):
+        dump = StringIO(json.dumps([{
+            "model": "articles.series",
+            "pk": 1,
+            "fields": {"name": "Test Series", "description": "test", "image_raw": "uploads/test.jpg"}
+        }]))
+        with patch("sys.stdin", dump):
+            call_command("import_articles", "-", stdout=StringIO())
+        self.assertEqual(1, ImageJob.objects.filter(model="articles.series", object_id=1).count())
+        self.assertTrue(Series.objects.get(pk=1).images_pending)
+        self.assertEqual("test-series", Series.objects.get(pk=1).slug)
+
+    def test_slugs_unique_within_batch(self):
+        dump = StringIO(json.dumps([{
+            "model": "articles.series",
+            "pk": pk,
+            "fields": {"name": name, "description": "test"}
+        } for pk, name in ((1, "Hello!"), (2, "Hello"), (3, "Hello?"))]))
+        with patch("sys.stdin", dump):
+            call_command("import_articles", "-", stdout=StringIO())
+        self.assertEqual(
+            ["hello", "hello-2", "hello-3"],
+            list(Series.objects.order_by("pk").values_list("slug", flat=True))
+        )
+
+    def test_conflicts(self):
+        self.run_import()
+        with self.assertRaises(Exception):
+            self.run_import()
+        self.run_import("--ignore-conflicts")
+        self.assertEqual(19, Article.objects.count())
+
+    def test_missing_file(self):
+        with self.assertRaises(CommandError):
+            call_command("import_articles", "missing.json", stdout=StringIO())
+
+
+class TestExportSite(TestCase):
+    #pylint: disable=E1101
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+        author = Author.objects.create(name="Test Author", bio="test")
+        series = Series.objects.create(name="Test Series", description="test")
+        for index in range(3):
+            Article.objects.create(
+                title = "Test" + str(index),
+                content = "test",
+                series = series,
+                author = author,
+                audio = SimpleUploadedFile("export{0}.mp3".format(index), b"audio" + bytes([index]))
+            )
+
+    def export(self, *args) -> str:
+        out = StringIO()
+        call_command("export_site", self.output, "--chunk-size", "1", *args, stdout=out)
+        return out.getvalue()
+
+    def checkpoint(self) -> dict:
+        with open(os.path.join(self.output, "checkpoint.json")) as file:
+            return json.load(file)
+
+    def read(self) -> tuple:
+        """
+        Returns the rows, files and checksums of the newest export.
+        """
+
+        names = sorted(f for f in os.listdir(self.output) if f.endswith(".ndjson"))
+        base = os.path.join(self.output, names[-1][:-len(".ndjson")])
+        with open(base + ".ndjson") as file:
+            rows = list(iter_dump(file))
+        with tarfile.open(base + ".tar") as media:
+            files = {m.name: media.extractfile(m).read() for m in media.getmembers()}
+        with open(base + ".sha256") as file:
+            checksums = dict(reversed(line.split()) for line in file)
+        return rows, files, checksums
+
+    def test_exports_rows_and_media(self):
+        self.export()
+        rows, files, checksums = self.read()
+        self.assertEqual(
+            ["articles.author", "articles.series", "articles.article", "articles.article", "articles.article"],
+            [row["model"] for row in rows]
+        )
+        self.assertEqual(3, len(files))
+        for file_name, content in files.items():
+            self.assertEqual(hashlib.sha256(content).hexdigest(), checksums[file_name])
+        self.assertIsNone(self.checkpoint()["current"])
+
+    def test_incremental_export_skips_unchanged_articles(self):
+        self.export()
+        last_export = self.checkpoint()["last_export"]
+        # Start from an empty directory, so the second export's files are
+        # the only ones, even within the same second.
+        shutil.rmtree(self.output)
+        os.makedirs(self.output)
+        with open(os.path.join(self.output, "checkpoint.json"), "w") as file:
+            json.dump({"last_export": last_export, "current": None}, file)
+        article = Article.objects.get(title="Test1")
+        article.save()
+        out = self.export()
+        self.assertIn("modified since", out)
+        rows, files, checksums = self.read()
+        self.assertEqual([article.pk], [row["pk"] for row in rows if row["model"] == "articles.article"])
+        self.assertEqual([article.audio.name], list(files))
+
+    def test_interrupted_export_resumes(self):
+        real = export_site.dump_objects
+        calls = []
+
+        def interrupt(instances):
+            calls.append(instances)
+            if len(calls) == 4:
+                raise KeyboardInterrupt
+            return real(instances)
+
+        with patch.object(export_site, "dump_objects", interrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.export()
+        self.assertIsNotNone(self.checkpoint()["current"])
+        out = self.export()
+        self.assertIn("Resuming", out)
+        rows, files, checksums = self.read()
+        self.assertEqual(5, len(rows))
+        self.assertEqual(5, len({(row["model"], row["pk"]) for row in rows}))
+        self.assertEqual(3, len(files))
+        self.assertEqual(3, len(checksums))
+
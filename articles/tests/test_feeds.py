@@ -0,0 +1,131 @@
+import json
+
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from io import StringIO
+from mock import patch
+
+from articles.models import Author, Series, Article
+
+
+class TestFeeds(TestCase):
+    #pylint: disable=E1101
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name="Test Author", bio="test")
+        cls.other_author = Author.objects.create(name="Other Author", bio="test")
+        cls.series = Series.objects.create(name="Test Series", description="test")
+        cls.other_series = Series.objects.create(name="Other Series", description="test")
+        cls.create("First", publish_date=timezone.now() - timedelta(days=2))
+        cls.create("Second", series=cls.other_series, author=cls.other_author)
+        cls.create("Hidden", enabled=False)
+        cls.create("Scheduled", publish_date=timezone.now() + timedelta(days=1))
+
+    @classmethod
+    def create(cls, title, **kwargs) -> Article:
+        kwargs.setdefault("series", cls.series)
+        kwargs.setdefault("author", cls.author)
+        kwargs.setdefault("publish_date", timezone.now() - timedelta(days=1))
+        return Article.objects.create(title=title, content="<p>Body</p>", **kwargs)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_site_feed(self):
+        response = self.client.get(reverse("feed", args=["rss"]))
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response["Content-Type"].startswith("application/rss+xml"))
+        content = response.content.decode()
+        self.assertLess(content.index("Second"), content.index("First"))
+        self.assertIn("http://testserver/articles/test-series/first", content)
+        self.assertNotIn("Hidden", content)
+        self.assertNotIn("Scheduled", content)
+
+    def test_atom_feed(self):
+        response = self.client.get(reverse("feed", args=["atom"]))
+        self.assertTrue(response["Content-Type"].startswith("application/atom+xml"))
+        self.assertContains(response, "First")
+
+    def test_series_and_author_feeds(self):
+        response = self.client.get(reverse("series-feed", args=["other-series", "rss"]))
+        self.assertContains(response, "Second")
+        self.assertNotContains(response, "First")
+        response = self.client.get(reverse("author-feed", args=["test-author", "atom"]))
+        self.assertContains(response, "First")
+        self.assertNotContains(response, "Second")
+
+    def test_missing_feeds(self):
+        self.assertEqual(404, self.client.get(reverse("feed", args=["json"])).status_code)
+        self.assertEqual(404, self.client.get(
+            reverse("series-feed", args=["missing", "rss"])
+        ).status_code)
+
+    def test_cached_feeds_make_no_queries(self):
+        url = reverse("series-feed", args=["test-series", "rss"])
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+
+    def test_not_modified(self):
+        url = reverse("feed", args=["atom"])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertIn("public", response["Cache-Control"])
+
+    def test_saving_invalidates_only_its_feeds(self):
+        site = reverse("feed", args=["rss"])
+        other = reverse("series-feed", args=["other-series", "rss"])
+        self.client.get(site)
+        self.client.get(other)
+        self.create("Third")
+        self.assertContains(self.client.get(site), "Third")
+        with self.assertNumQueries(0):
+            self.client.get(other)
+
+    def test_moving_invalidates_old_feeds(self):
+        url = reverse("author-feed", args=["test-author", "rss"])
+        self.assertContains(self.client.get(url), "First")
+        article = Article.objects.get(title="First")
+        article.author = self.other_author
+        article.save()
+        self.assertNotContains(self.client.get(url), "First")
+
+    def test_expires_at_next_publish(self):
+        response = self.client.get(reverse("feed", args=["rss"]))
+        self.assertLessEqual(int(response["Cache-Control"].split("max-age=")[1]), 300)
+        Article.objects.filter(title="Scheduled").update(
+            publish_date = timezone.now() + timedelta(seconds=30)
+        )
+        self.create("Fourth")
+        response = self.client.get(reverse("feed", args=["rss"]))
+        self.assertLessEqual(int(response["Cache-Control"].split("max-age=")[1]), 31)
+
+    def test_commands_invalidate_feeds(self):
+        url = reverse("feed", args=["rss"])
+        self.client.get(url)
+        Article.objects.filter(title="First").update(content="<p>Rewritten</p>")
+        call_command("render_content", "--force", stdout=StringIO())
+        self.assertContains(self.client.get(url), "Rewritten")
+        dump = StringIO(json.dumps([{
+            "model": "articles.article",
+            "pk": 100,
+            "fields": {
+                "title": "Imported",
+                "content": "<p>Body</p>",
+                "series": self.series.pk,
+                "publish_date": timezone.now().isoformat(),
+                "date_modified": timezone.now().isoformat(),
+            }
+        }]))
+        # Tests run in a transaction, so run what's left for after it.
+        with patch("sys.stdin", dump), patch("django.db.transaction.on_commit", lambda f: f()):
+            call_command("import_articles", "-", stdout=StringIO())
+        self.assertContains(self.client.get(url), "Imported")
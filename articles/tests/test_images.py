@@ -0,0 +1,333 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.template import Template, Context
+from PIL import Image
+from mock import patch
+
+from django.urls import reverse
+
+from articles.images import (build_derivatives, DerivativeSpec, 
+    get_derivative_formats, get_ladder)
+from articles.models import Series, Article, Author, ImageRendition, ImageSource
+from .test_models import IMAGE_PATH, get_test_image
+
+SPECS = [
+    DerivativeSpec("image_thumbnail", (300, 300), "thumbnail", False, ()),
+    DerivativeSpec("image_thumbnail_transparent", (300, 300), "thumbnail_transparent", True, ("WEBP",)),
+    DerivativeSpec("image_full", (1000, 1000), "full", False, ("WEBP", "JPEG")),
+]
+
+LADDER_SPECS = [
+    DerivativeSpec("image_full", (1000, 1000), "full", False, ("WEBP",), (320, 640, 2000)),
+]
+
+class TestBuildDerivatives(SimpleTestCase):
+
+    def build(self, specs=SPECS):
+        with open(IMAGE_PATH, "rb") as source:
+            return build_derivatives(source, "test_image", specs)
+
+    def test_source_is_opened_once(self):
+        with patch("articles.images.Image.open", wraps=Image.open) as opened:
+            self.build()
+        self.assertEqual(1, opened.call_count)
+
+    def test_creates_every_field(self):
+        created, renditions, stats = self.build()
+        self.assertEqual({spec.field for spec in SPECS}, set(created))
+
+    def test_sizes_fit_specs(self):
+        created, renditions, stats = self.build()
+        for spec in SPECS:
+            size = Image.open(created[spec.field]).size
+            self.assertTrue(size[0] <= spec.size[0] and size[1] <= spec.size[1])
+            self.assertTrue(spec.size[0] in size or spec.size[1] in size)
+
+    def test_names(self):
+        created, renditions, stats = self.build()
+        self.assertEqual("test_image_full.png", created["image_full"].name)
+
+    def test_only_transparent_has_alpha(self):
+        created, renditions, stats = self.build()
+        self.assertEqual("RGBA", Image.open(created["image_thumbnail_transparent"]).mode)
+        self.assertEqual("RGB", Image.open(created["image_thumbnail"]).mode)
+
+    def test_stats_for_decode_and_each_derivative(self):
+        created, renditions, stats = self.build()
+        expected = ["decode"] + sorted(spec.field for spec in SPECS)
+        self.assertEqual(expected, sorted(s["derivative"] for s in stats))
+        for stat in stats:
+            self.assertTrue(stat["seconds"] >= 0)
+            self.assertTrue(stat["peak_bytes"] > 0)
+
+    def test_jpeg_is_reduced_on_decode(self):
+        full = Image.open(IMAGE_PATH)
+        full_bytes = full.width * full.height * len(full.getbands())
+        created, renditions, stats = self.build(SPECS[:1])
+        decode = [s for s in stats if s["derivative"] == "decode"][0]
+        self.assertTrue(decode["peak_bytes"] < full_bytes)
+
+    def test_renditions_for_each_alternate_format(self):
+        created, renditions, stats = self.build()
+        expected = [
+            ("image_full", "JPEG"), 
+            ("image_full", "WEBP"), 
+            ("image_thumbnail_transparent", "WEBP")
+        ]
+        self.assertEqual(expected, sorted((r["field"], r["format"]) for r in renditions))
+
+    def test_rendition_files_are_in_their_format(self):
+        created, renditions, stats = self.build()
+        for r in renditions:
+            image = Image.open(r["file"])
+            self.assertEqual(r["format"], image.format)
+            self.assertEqual((r["width"], r["height"]), image.size)
+
+    def test_webp_rendition_keeps_alpha(self):
+        created, renditions, stats = self.build()
+        r = [r for r in renditions if r["field"] == "image_thumbnail_transparent"][0]
+        self.assertEqual("RGBA", Image.open(r["file"]).mode)
+
+    def test_renditions_for_each_width(self):
+        created, renditions, stats = self.build(LADDER_SPECS)
+        full = Image.open(created["image_full"])
+        widths = sorted(r["width"] for r in renditions)
+        self.assertEqual([320, 640, full.width], widths)
+        for r in renditions:
+            image = Image.open(r["file"])
+            self.assertEqual((r["width"], r["height"]), image.size)
+            self.assertAlmostEqual(full.width / full.height, image.width / image.height, 1)
+
+    def test_ladder_names(self):
+        created, renditions, stats = self.build(LADDER_SPECS)
+        names = sorted(r["file"].name for r in renditions)
+        self.assertIn("test_image_full_320w.webp", names)
+        self.assertIn("test_image_full.webp", names)
+
+    def test_full_image_alternates_are_smaller_than_png(self):
+        created, renditions, stats = self.build()
+        png = created["image_full"].size
+        for r in renditions:
+            if r["field"] == "image_full":
+                self.assertTrue(r["file"].size < png)
+
+
+class TestDerivativeFormats(SimpleTestCase):
+
+    def test_ladder_skips_wider_widths(self):
+        self.assertEqual([320, 640, 800], get_ladder((640, 320, 800, 1200), 800))
+
+    def test_opaque_formats_skipped_for_alpha(self):
+        with self.settings(IMAGE_DERIVATIVE_FORMATS={"x": ["WEBP", "JPEG"]}):
+            self.assertEqual(("WEBP",), get_derivative_formats("x", True))
+
+    def test_unsupported_formats_skipped(self):
+        with self.settings(IMAGE_DERIVATIVE_FORMATS={"x": ["NOTAFORMAT", "jpeg"]}):
+            self.assertEqual(("JPEG",), get_derivative_formats("x", False))
+
+
+@override_settings(IMAGE_DERIVATIVE_EXECUTOR="sync")
+class TestImageRenditions(TestCase):
+    #pylint: disable=E1101
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.series = Series.objects.create(
+            name = "Test Series",
+            description = "test",
+            image_raw = get_test_image()
+        )
+
+    def test_renditions_saved_with_instance(self):
+        formats = ImageRendition.objects.filter(
+            model = "articles.series",
+            object_id = self.series.pk,
+            field = "image_full",
+            width = self.series.image_full.width
+        ).values_list("format", flat=True)
+        self.assertEqual(["JPEG", "WEBP"], sorted(formats))
+
+    def test_renditions_saved_in_each_width(self):
+        widths = ImageRendition.objects.filter(
+            model = "articles.series",
+            object_id = self.series.pk,
+            field = "image_full",
+            format = "WEBP"
+        ).values_list("width", flat=True)
+        self.assertEqual([320, 640, self.series.image_full.width], sorted(widths))
+
+    def test_renditions_deleted_with_instance(self):
+        Series.objects.get(pk=self.series.pk).delete()
+        self.assertFalse(ImageRendition.objects.filter(model="articles.series").exists())
+
+    def test_prefetch_uses_one_query(self):
+        s = Series.objects.get(pk=self.series.pk)
+        ImageRendition.prefetch([s])
+        with self.assertNumQueries(0):
+            ImageRendition.for_instance(s, "image_full")
+
+    def test_picture_tag(self):
+        html = Template(
+            '{% load article_images %}{% picture series "image_full" alt="x" %}'
+        ).render(Context({"series": self.series}))
+        self.assertTrue(html.startswith("<picture>"))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('type="image/jpeg"', html)
+        self.assertIn('<img src="{0}" alt="x">'.format(self.series.image_full.url), html)
+
+    def test_picture_tag_smallest_first(self):
+        html = Template(
+            '{% load article_images %}{% picture series "image_full" %}'
+        ).render(Context({"series": self.series}))
+        renditions = [
+            r for r in ImageRendition.for_instance(self.series, "image_full")
+            if r.width == self.series.image_full.width
+        ]
+        positions = [html.index(r.file.url) for r in renditions]
+        self.assertEqual(sorted(positions), positions)
+
+    def test_picture_tag_srcset(self):
+        html = Template(
+            '{% load article_images %}{% picture series "image_full" %}'
+        ).render(Context({"series": self.series}))
+        width = self.series.image_full.width
+        for r in ImageRendition.for_instance(self.series, "image_full"):
+            self.assertIn("{0} {1}w".format(r.file.url, r.width), html)
+        self.assertIn('sizes="(max-width: {0}px) 100vw, {0}px"'.format(width), html)
+
+    def test_picture_tag_sizes(self):
+        html = Template(
+            '{% load article_images %}{% picture series "image_full" sizes="50vw" %}'
+        ).render(Context({"series": self.series}))
+        self.assertIn('sizes="50vw"', html)
+
+    def test_picture_tag_links_missing_widths(self):
+        with self.settings(IMAGE_SRCSET_WIDTHS={"image_full": [320, 480]}):
+            html = Template(
+                '{% load article_images %}{% picture series "image_full" %}'
+            ).render(Context({"series": Series.objects.get(pk=self.series.pk)}))
+        url = reverse("image-rendition", kwargs={
+            "model": "series",
+            "pk": self.series.pk,
+            "field": "image_full",
+            "width": 480,
+            "extension": "webp",
+        })
+        self.assertIn("{0} 480w".format(url), html)
+
+    def test_picture_tag_without_image(self):
+        s = Series.objects.create(name="No Image", description="test")
+        html = Template(
+            '{% load article_images %}{% picture series "image_full" %}'
+        ).render(Context({"series": s}))
+        self.assertEqual("", html)
+
+    def test_background_image_tag(self):
+        html = Template(
+            '{% load article_images %}{% background_image series "image_thumbnail_transparent" %}'
+        ).render(Context({"series": self.series}))
+        self.assertTrue(html.startswith('style="background-image: url('))
+        self.assertIn("image-set(", html)
+        self.assertIn("type('image/webp')", html)
+
+    def test_missing_rendition_created_on_request(self):
+        url = reverse("image-rendition", args=["series", self.series.pk, "image_full", 480, "webp"])
+        with self.settings(IMAGE_SRCSET_WIDTHS={"image_full": [480]}):
+            response = self.client.get(url)
+            rendition = ImageRendition.objects.get(
+                model = "articles.series",
+                object_id = self.series.pk,
+                field = "image_full",
+                format = "WEBP",
+                width = 480
+            )
+            self.assertRedirects(response, rendition.file.url, fetch_redirect_response=False)
+            self.assertEqual((480, rendition.height), Image.open(rendition.file).size)
+            self.assertEqual(rendition, ImageRendition.generate(self.series, "image_full", 480, "WEBP"))
+
+    def test_rendition_request_for_unoffered_width(self):
+        url = reverse("image-rendition", args=["series", self.series.pk, "image_full", 481, "webp"])
+        response = self.client.get(url)
+        self.assertEqual(404, response.status_code)
+        self.assertFalse(ImageRendition.objects.filter(width=481).exists())
+
+    def test_rendition_request_for_hidden_article(self):
+        article = Article.objects.create(
+            title = "Hidden",
+            content = "test",
+            series = self.series,
+            enabled = False,
+            image_raw = get_test_image()
+        )
+        url = reverse("image-rendition", args=["article", article.pk, "image_full", 480, "webp"])
+        with self.settings(IMAGE_SRCSET_WIDTHS={"image_full": [480]}):
+            self.assertEqual(404, self.client.get(url).status_code)
+        self.assertFalse(ImageRendition.objects.filter(model="articles.article", width=480).exists())
+
+    def test_rendition_request_only_safe_methods(self):
+        url = reverse("image-rendition", args=["series", self.series.pk, "image_full", 481, "webp"])
+        self.assertEqual(405, self.client.post(url).status_code)
+
+    def test_rendition_request_for_unknown_model(self):
+        url = reverse("image-rendition", args=["tag", self.series.pk, "image_full", 320, "webp"])
+        self.assertEqual(404, self.client.get(url).status_code)
+
+
+@override_settings(IMAGE_DERIVATIVE_EXECUTOR="sync")
+class TestContentAddressedImages(TestCase):
+    #pylint: disable=E1101
+
+    def setUp(self):
+        self.series = Series.objects.create(
+            name = "Test Series",
+            description = "test",
+            image_raw = get_test_image()
+        )
+
+    def create_author(self):
+        return Author.objects.create(
+            name = "Test Author",
+            bio = "test",
+            image_raw = get_test_image()
+        )
+
+    def test_raw_image_named_by_contents(self):
+        name = self.series.image_raw.name
+        self.assertRegex(name, r"^uploads/[0-9a-f]{32}\.jpg$")
+
+    def test_identical_raw_image_is_shared(self):
+        author = self.create_author()
+        self.assertEqual(self.series.image_raw.name, author.image_raw.name)
+
+    def test_images_registered_once(self):
+        self.create_author()
+        self.assertEqual(1, ImageSource.objects.count())
+        self.assertEqual(self.series.image_hash, ImageSource.objects.get().hash)
+
+    def test_identical_source_is_not_rebuilt(self):
+        with patch("articles.models.build_derivatives") as build:
+            author = self.create_author()
+        build.assert_not_called()
+        self.assertEqual(self.series.image_full.name, author.image_full.name)
+        self.assertEqual(
+            sorted(r.file.name for r in ImageRendition.for_instance(self.series, "image_full")),
+            sorted(r.file.name for r in ImageRendition.for_instance(author, "image_full"))
+        )
+
+    def test_shared_files_kept_on_delete(self):
+        author = self.create_author()
+        rendition = ImageRendition.for_instance(author, "image_full")[0]
+        Series.objects.get(pk=self.series.pk).delete()
+        self.assertTrue(rendition.file.storage.exists(rendition.file.name))
+
+    def test_prune_keeps_used_source(self):
+        ImageSource.prune(self.series.image_hash)
+        self.assertTrue(ImageSource.objects.exists())
+
+    def test_prune_unused_source(self):
+        source = ImageSource.objects.get()
+        name = source.image_full.name
+        Series.objects.get(pk=self.series.pk).delete()
+        ImageSource.prune(source.hash)
+        self.assertFalse(ImageSource.objects.exists())
+        self.assertFalse(ImageRendition.objects.exists())
+        self.assertFalse(source.image_full.storage.exists(name))
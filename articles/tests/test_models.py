@@ -1,13 +1,21 @@
 import pytz
 
-from django.test import TestCase, TransactionTestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
 from PIL import Image
 from datetime import datetime, timedelta
+from io import StringIO
 from mock import patch
 
-from articles.models import Author, Series, Tag, Article
+from articles.caching import bump_content_version
+from articles.models import (Author, Series, Tag, Article, get_latest_series,
+    forget_latest_series)
 
 IMAGE_PATH = "articles/tests/test_image.jpg"
 
@@ -41,6 +49,7 @@ def fake_later():
 def fake_later_utc():
     return fake_later().astimezone(UTC)
 
+@override_settings(IMAGE_DERIVATIVE_EXECUTOR="sync")
 class TestModelAuthor(TestCase):
     #pylint: disable=E1101
 
@@ -156,7 +165,7 @@ class TestModelAuthor(TestCase):
     def test_image_thumbnail_name(self):
         a = Author.objects.all()[0]
         name = a.image_thumbnail.name
-        expected = "uploads/test_image_thumbnail.png"
+        expected = "uploads/{0}_thumbnail.png".format(a.image_hash[:32])
         self.assertEqual(name, expected)
 
     def test_image_thumbnail_transparent_label(self):
@@ -216,7 +225,7 @@ class TestModelAuthor(TestCase):
     def test_image_thumbnail_transparent_name(self):
         a = Author.objects.all()[0]
         name = a.image_thumbnail_transparent.name
-        expected = "uploads/test_image_thumbnail_transparent.png"
+        expected = "uploads/{0}_thumbnail_transparent.png".format(a.image_hash[:32])
         self.assertEqual(name, expected)
 
     def test_image_full_label(self):
@@ -271,7 +280,7 @@ class TestModelAuthor(TestCase):
     def test_image_full_name(self):
         a = Author.objects.all()[0]
         name = a.image_full.name
-        expected = "uploads/test_image_full.png"
+        expected = "uploads/{0}_full.png".format(a.image_hash[:32])
         self.assertEqual(name, expected)
 
     def test_slug_label(self):
@@ -327,6 +336,7 @@ class TestModelAuthor(TestCase):
         self.assertEqual(expected, url)
         
 
+@override_settings(IMAGE_DERIVATIVE_EXECUTOR="sync")
 class TestModelSeries(TestCase):
     #pylint: disable=E1101
 
@@ -493,7 +503,7 @@ class TestModelSeries(TestCase):
     def test_image_thumbnail_name(self):
         a = Series.objects.all()[0]
         name = a.image_thumbnail.name
-        expected = "uploads/test_image_thumbnail.png"
+        expected = "uploads/{0}_thumbnail.png".format(a.image_hash[:32])
         self.assertEqual(name, expected)
 
     def test_image_thumbnail_transparent_label(self):
@@ -553,7 +563,7 @@ class TestModelSeries(TestCase):
     def test_image_thumbnail_transparent_name(self):
         a = Series.objects.all()[0]
         name = a.image_thumbnail_transparent.name
-        expected = "uploads/test_image_thumbnail_transparent.png"
+        expected = "uploads/{0}_thumbnail_transparent.png".format(a.image_hash[:32])
         self.assertEqual(name, expected)
 
     def test_image_full_label(self):
@@ -608,7 +618,7 @@ class TestModelSeries(TestCase):
     def test_image_full_name(self):
         a = Series.objects.all()[0]
         name = a.image_full.name
-        expected = "uploads/test_image_full.png"
+        expected = "uploads/{0}_full.png".format(a.image_hash[:32])
         self.assertEqual(name, expected)
 
     def test_latest_article_date_label(self):
@@ -829,12 +839,23 @@ class TestModelTag(TestCase):
         slug = a.slug
         self.assertEqual(expected, slug)
 
+    def test_colliding_slug_is_numbered(self):
+        a = Tag.objects.create(name="Test-Tag")
+        b = Tag.objects.create(name="Test--Tag")
+        self.assertEqual("test-tag-2", a.slug)
+        self.assertEqual("test-tag-3", b.slug)
+
+    def test_slug_is_unique(self):
+        field = Tag._meta.get_field("slug")
+        self.assertTrue(field.unique)
+
     def test_absolute_url(self):
         a = Tag.objects.all()[0]
         expected = "/articles/tags/test-tag"
         url = a.get_absolute_url()
         self.assertEqual(url, expected)
 
+@override_settings(IMAGE_DERIVATIVE_EXECUTOR="sync")
 class TestModelArticle(TestCase):
     #pylint: disable = E1101
 
@@ -1110,7 +1131,7 @@ class TestModelArticle(TestCase):
     def test_image_thumbnail_name(self):
         a = Article.objects.all()[0]
         name = a.image_thumbnail.name
-        expected = "uploads/test_image_thumbnail.png"
+        expected = "uploads/{0}_thumbnail.png".format(a.image_hash[:32])
         self.assertEqual(name, expected)
 
     def test_image_thumbnail_transparent_label(self):
@@ -1170,7 +1191,7 @@ class TestModelArticle(TestCase):
     def test_image_thumbnail_transparent_name(self):
         a = Article.objects.all()[0]
         name = a.image_thumbnail_transparent.name
-        expected = "uploads/test_image_thumbnail_transparent.png"
+        expected = "uploads/{0}_thumbnail_transparent.png".format(a.image_hash[:32])
         self.assertEqual(name, expected)
 
     def test_image_full_label(self):
@@ -1225,7 +1246,7 @@ class TestModelArticle(TestCase):
     def test_image_full_name(self):
         a = Article.objects.all()[0]
         name = a.image_full.name
-        expected = "uploads/test_image_full.png"
+        expected = "uploads/{0}_full.png".format(a.image_hash[:32])
         self.assertEqual(name, expected)
 
     def test_audio_label(self):
@@ -1374,3 +1395,323 @@ class TestModelArticle(TestCase):
         a.refresh_from_db()
         visible = a.visible()
         self.assertFalse(visible)
+
+
+class TestBenchmarkQueries(TestCase):
+    #pylint: disable=E1101
+
+    def index_names(self) -> set:
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Article._meta.db_table
+            )
+        return {name for name, info in constraints.items() if info["index"]}
+
+    def test_compares_with_and_without_indexes(self):
+        out = StringIO()
+        call_command(
+            "benchmark_queries", "--articles", "50", "--series", "3",
+            "--authors", "2", "--repeat", "1", stdout=out
+        )
+        self.assertIn("With indexes", out.getvalue())
+        self.assertIn("Without indexes", out.getvalue())
+        self.assertIn("Series detail", out.getvalue())
+
+    def test_leaves_database_unchanged(self):
+        call_command(
+            "benchmark_queries", "--articles", "50", "--series", "3",
+            "--authors", "2", "--repeat", "1", stdout=StringIO()
+        )
+        self.assertEqual(0, Article.objects.count())
+        self.assertEqual(0, Series.objects.count())
+        self.assertIn("article_series_visible_idx", self.index_names())
+
+
+class TestLatestArticleDate(TestCase):
+    #pylint: disable=E1101
+
+    def setUp(self):
+        self.author = Author.objects.create(name="Test Author", bio="test")
+        self.series = Series.objects.create(name="Test Series", description="test")
+        self.older = self.create("Older", fake_now())
+        self.newer = self.create("Newer", fake_later())
+
+    def create(self, title, publish_date, series=None) -> Article:
+        return Article.objects.create(
+            title = title,
+            content = "test",
+            author = self.author,
+            series = series or self.series,
+            publish_date = publish_date
+        )
+
+    def latest(self, series=None):
+        return Series.objects.get(pk=(series or self.series).pk).latest_article_date
+
+    def test_newest_article_sets_date(self):
+        self.assertEqual(fake_later(), self.latest())
+
+    def test_save_does_not_load_or_save_series(self):
+        article = Article.objects.get(pk=self.older.pk)
+        with CaptureQueriesContext(connection) as queries:
+            article.save()
+        series_queries = [q["sql"] for q in queries.captured_queries if "articles_series" in q["sql"]]
+        self.assertEqual(1, len(series_queries))
+        self.assertTrue(series_queries[0].startswith("UPDATE"))
+
+    def test_disabling_recalculates(self):
+        article = Article.objects.get(pk=self.newer.pk)
+        article.enabled = False
+        article.save()
+        self.assertEqual(fake_now(), self.latest())
+
+    def test_publishing_earlier_recalculates(self):
+        article = Article.objects.get(pk=self.newer.pk)
+        article.publish_date = fake_now() - timedelta(days=1)
+        article.save()
+        self.assertEqual(fake_now(), self.latest())
+
+    def test_moving_series_recalculates_both(self):
+        other = Series.objects.create(name="Other Series", description="test")
+        article = Article.objects.get(pk=self.newer.pk)
+        article.series = other
+        article.save()
+        self.assertEqual(fake_now(), self.latest())
+        self.assertEqual(fake_later(), self.latest(other))
+
+    def test_delete_recalculates(self):
+        self.newer.delete()
+        self.assertEqual(fake_now(), self.latest())
+        self.older.delete()
+        self.assertIsNone(self.latest())
+
+
+class TestLatestSeriesDefault(TestCase):
+    #pylint: disable=E1101
+
+    def setUp(self):
+        forget_latest_series()
+
+    def test_no_series_does_not_raise(self):
+        article = Article(title="Test", content="test")
+        self.assertIsNone(article.series_id)
+
+    def test_building_articles_does_not_query(self):
+        Series.objects.create(name="Test Series", description="test")
+        with self.assertNumQueries(0):
+            articles = [Article(title="Test" + str(i), content="test") for i in range(50)]
+            Article.from_db("default", ["id", "title"], [1, "Test"])
+        self.assertTrue(all(a.series_id is None for a in articles))
+
+    def test_unchanged_content_is_not_queried_again(self):
+        Series.objects.create(name="Test Series", description="test")
+        get_latest_series()
+        with self.assertNumQueries(0):
+            get_latest_series()
+
+    def test_series_deleted_elsewhere_is_not_used(self):
+        author = Author.objects.create(name="Test Author", bio="test")
+        older = Series.objects.create(name="Older Series", description="test")
+        newer = Series.objects.create(name="Newer Series", description="test")
+        self.assertEqual(newer.pk, get_latest_series())
+        # As another process would: delete it, and change the content version.
+        Series.objects.filter(pk=newer.pk)._raw_delete("default")
+        bump_content_version()
+        article = Article(title="Test", content="test", author=author)
+        article.save()
+        self.assertEqual(older, article.series)
+
+    def test_deleting_latest_series_moves_articles(self):
+        older = Series.objects.create(name="Older Series", description="test")
+        newer = Series.objects.create(name="Newer Series", description="test")
+        Article.objects.create(title="Old", content="test", series=older)
+        article = Article.objects.create(title="New", content="test", series=newer)
+        newer.delete()
+        article.refresh_from_db()
+        self.assertEqual(older, article.series)
+
+    def test_series_created_later_is_used_on_save(self):
+        author = Author.objects.create(name="Test Author", bio="test")
+        article = Article(title="Test", content="test", author=author)
+        series = Series.objects.create(name="Test Series", description="test")
+        article.save()
+        self.assertEqual(series, article.series)
+
+
+class TestTagCounts(TestCase):
+    #pylint: disable=E1101
+
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(name="Test Author", bio="test")
+        self.series = Series.objects.create(name="Test Series", description="test")
+        self.tag = Tag.objects.create(name="Test Tag")
+        self.other = Tag.objects.create(name="Other Tag")
+        self.article = self.create("Test")
+
+    def create(self, title, publish_date=None, **kwargs) -> Article:
+        return Article.objects.create(
+            title = title,
+            content = "test",
+            author = self.author,
+            series = self.series,
+            publish_date = publish_date or fake_now(),
+            **kwargs
+        )
+
+    def count(self, tag=None) -> int:
+        return Tag.objects.get(pk=(tag or self.tag).pk).article_count
+
+    def test_adding_and_removing_tags(self):
+        self.article.tags.add(self.tag, self.other)
+        self.assertEqual(1, self.count())
+        self.assertEqual(1, self.count(self.other))
+        self.article.tags.remove(self.tag)
+        self.assertEqual(0, self.count())
+        self.article.tags.clear()
+        self.assertEqual(0, self.count(self.other))
+
+    def test_adding_and_clearing_articles(self):
+        self.tag.article_set.add(self.article, self.create("Second"))
+        self.assertEqual(2, self.count())
+        self.tag.article_set.clear()
+        self.assertEqual(0, self.count())
+
+    def test_only_visible_articles_count(self):
+        self.create("Disabled", enabled=False).tags.add(self.tag)
+        self.create("Scheduled", timezone.now() + timedelta(days=1)).tags.add(self.tag)
+        self.assertEqual(0, self.count())
+
+    def test_showing_and_hiding(self):
+        self.article.tags.add(self.tag)
+        self.article.enabled = False
+        self.article.save()
+        self.assertEqual(0, self.count())
+        self.article.enabled = True
+        self.article.save()
+        self.assertEqual(1, self.count())
+
+    def test_unchanged_visibility_does_not_count(self):
+        self.article.tags.add(self.tag)
+        self.article.title = "Renamed"
+        with CaptureQueriesContext(connection) as queries:
+            self.article.save()
+        self.assertFalse(any(
+            q["sql"].startswith("UPDATE \"articles_tag\"") for q in queries.captured_queries
+        ))
+
+    def test_deleting_article(self):
+        self.article.tags.add(self.tag)
+        self.article.delete()
+        self.assertEqual(0, self.count())
+
+    def test_scheduled_article_goes_live(self):
+        moment = timezone.now()
+        self.assertEqual([], list(Tag.objects.in_cloud()))
+        self.create("Scheduled", moment + timedelta(hours=1)).tags.add(self.tag)
+        self.assertEqual([], list(Tag.objects.in_cloud()))
+        with patch("articles.models.timezone.now", lambda: moment + timedelta(hours=2)):
+            self.assertEqual([self.tag], list(Tag.objects.in_cloud()))
+        self.assertEqual(1, self.count())
+
+    def test_cloud_does_not_recount_until_needed(self):
+        list(Tag.objects.in_cloud())
+        with self.assertNumQueries(1):
+            list(Tag.objects.in_cloud())
+
+
+class TestRelatedArticles(TestCase):
+    #pylint: disable=E1101
+
+    def setUp(self):
+        self.author = Author.objects.create(name="Test Author", bio="test")
+        self.series = Series.objects.create(name="Test Series", description="test")
+        self.common = Tag.objects.create(name="Common")
+        self.rare = Tag.objects.create(name="Rare")
+
+    def create(self, title, series=None, tags=(), **kwargs) -> Article:
+        if series is None:
+            series = Series.objects.create(name=title, description="test")
+        kwargs.setdefault("publish_date", fake_now())
+        article = Article.objects.create(
+            title = title,
+            content = "test",
+            author = self.author,
+            series = series,
+            **kwargs
+        )
+        article.tags.add(*tags)
+        return article
+
+    def titles(self, article) -> list:
+        return [related.title for related in Article.objects.get(pk=article.pk).get_related_articles()]
+
+    def test_rarer_shared_tags_rank_higher(self):
+        for i in range(4):
+            self.create("Filler {0}".format(i), tags=[self.common])
+        article = self.create("Article", tags=[self.common, self.rare])
+        self.create("Rare", tags=[self.rare])
+        self.create("Both", tags=[self.common, self.rare])
+        self.create("Unrelated")
+        titles = self.titles(article)
+        self.assertEqual(["Both", "Rare"], titles[:2])
+        self.assertEqual(5, len(titles))
+        self.assertNotIn("Unrelated", titles)
+
+    def test_new_articles_are_listed_by_others(self):
+        first = self.create("First", tags=[self.rare])
+        self.create("Second", tags=[self.rare])
+        self.assertEqual(["Second"], self.titles(first))
+
+    def test_series_neighbours_without_tags(self):
+        for i in range(3):
+            self.create("Part {0}".format(i), series=self.series,
+                publish_date=fake_now() + timedelta(days=i))
+        middle = Article.objects.get(title="Part 1")
+        self.assertEqual({"Part 0", "Part 2"}, set(self.titles(middle)))
+
+    def test_removing_tags(self):
+        first = self.create("First", tags=[self.rare])
+        second = self.create("Second", tags=[self.rare])
+        second.tags.remove(self.rare)
+        self.assertEqual([], self.titles(first))
+        self.assertEqual([], self.titles(second))
+
+    def test_clearing_and_deleting_tags(self):
+        first = self.create("First", tags=[self.rare, self.common])
+        self.create("Second", tags=[self.rare, self.common])
+        self.rare.article_set.clear()
+        self.assertEqual(["Second"], self.titles(first))
+        self.common.delete()
+        self.assertEqual([], self.titles(first))
+
+    def test_only_visible_articles(self):
+        article = self.create("Article", tags=[self.rare])
+        self.create("Disabled", tags=[self.rare], enabled=False)
+        self.create("Scheduled", tags=[self.rare], publish_date=timezone.now() + timedelta(days=1))
+        self.assertEqual([], self.titles(article))
+
+    @override_settings(RELATED_MAX_TAG_ARTICLES=2)
+    def test_ignores_tags_on_too_many_articles(self):
+        article = self.create("Article", tags=[self.common])
+        self.create("Second", tags=[self.common])
+        self.create("Third", tags=[self.common])
+        call_command("rebuild_related_articles", stdout=StringIO())
+        self.assertEqual([], self.titles(article))
+
+    def test_one_query(self):
+        article = self.create("Article", tags=[self.rare])
+        self.create("Second", tags=[self.rare])
+        article = Article.objects.get(pk=article.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(["Second"], [a.series.name for a in article.get_related_articles()])
+
+    def test_rebuild_related_articles(self):
+        article = self.create("Article", tags=[self.rare])
+        self.create("Second", tags=[self.rare])
+        article.related_links.all().delete()
+        out = StringIO()
+        call_command("rebuild_related_articles", stdout=out)
+        self.assertIn("Related 2 Article(s)", out.getvalue())
+        self.assertIn("2 link(s)", out.getvalue())
+        self.assertEqual(["Second"], self.titles(article))
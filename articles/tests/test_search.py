@@ -0,0 +1,187 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import OperationalError
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from importlib import import_module
+from io import StringIO
+from mock import Mock, patch
+
+from articles import search
+from articles.models import Author, Series, Article, Tag
+from .test_models import fake_now
+
+
+class TestSearchQueries(TestCase):
+
+    def test_fts5_query_quotes_words(self):
+        self.assertEqual('"django" "ca"*', search.to_fts5_query("Django ca"))
+
+    def test_fts5_query_ignores_syntax(self):
+        self.assertEqual('"a" "or" "b"*', search.to_fts5_query('a" OR (b*'))
+        self.assertEqual("", search.to_fts5_query('" * -'))
+
+    def test_tsquery_matches_prefix_of_last_word(self):
+        self.assertEqual("django & ca:*", search.to_tsquery("Django ca!"))
+
+
+class TestSearchMigration(TestCase):
+
+    def migrate(self, error: Exception):
+        migration = import_module("articles.migrations.0012_search_index")
+        schema_editor = Mock(execute=Mock(side_effect=error))
+        schema_editor.connection.vendor = "sqlite"
+        migration.create_search_index(None, schema_editor)
+
+    def test_warns_without_fts5(self):
+        with patch("sys.stderr", new_callable=StringIO) as stderr:
+            self.migrate(OperationalError("no such module: fts5"))
+        self.assertIn("icontains", stderr.getvalue())
+
+    def test_raises_other_errors(self):
+        with self.assertRaises(OperationalError):
+            self.migrate(OperationalError('near "VIRTUAL": syntax error'))
+        with self.assertRaises(PermissionError):
+            self.migrate(PermissionError())
+
+
+class TestSearchIndex(TestCase):
+    #pylint: disable=E1101
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.series = Series.objects.create(name="Test Series", description="test")
+        cls.author = Author.objects.create(name="Test Author", bio="test")
+
+    def create(self, title: str, **kwargs) -> Article:
+        kwargs.setdefault("content", "<p>Nothing to see.</p>")
+        kwargs.setdefault("publish_date", fake_now())
+        return Article.objects.create(
+            title = title,
+            series = self.series,
+            author = self.author,
+            **kwargs
+        )
+
+    def find(self, query: str) -> list:
+        return [article.title for article in search.SearchResults(query)[:20]]
+
+    def test_uses_an_index(self):
+        self.assertEqual("sqlite", search.get_backend())
+
+    def test_finds_saved_articles(self):
+        self.create("Gardening", content="<p>Growing <em>tomatoes</em> indoors.</p>")
+        self.assertEqual(["Gardening"], self.find("tomato"))
+        self.assertEqual(["Gardening"], self.find("grow indoor"))
+        self.assertEqual([], self.find("em"))
+
+    def test_finds_words_being_typed(self):
+        self.create("Photography")
+        self.assertEqual(["Photography"], self.find("photog"))
+
+    def test_ranks_titles_first(self):
+        self.create("Mentions", content="<p>A note on bread, among other things.</p>")
+        self.create("Bread")
+        self.assertEqual(["Bread", "Mentions"], self.find("bread"))
+
+    def test_only_visible_articles(self):
+        self.create("Hidden bread", enabled=False)
+        self.create("Future bread", publish_date=fake_now() + timedelta(days=1000000))
+        self.create("Bread")
+        self.assertEqual(["Bread"], self.find("bread"))
+        self.assertEqual(1, search.SearchResults("bread").count())
+
+    def test_updates_on_save_and_delete(self):
+        article = self.create("Bread")
+        article.title = "Cake"
+        article.save()
+        self.assertEqual([], self.find("bread"))
+        self.assertEqual(["Cake"], self.find("cake"))
+        article.delete()
+        self.assertEqual([], self.find("cake"))
+
+    def test_follows_tags(self):
+        article = self.create("Untitled")
+        tag = Tag.objects.create(name="Baking")
+        article.tags.add(tag)
+        self.assertEqual(["Untitled"], self.find("baking"))
+        tag.name = "Cooking"
+        tag.save()
+        self.assertEqual(["Untitled"], self.find("cooking"))
+        tag.article_set.clear()
+        self.assertEqual([], self.find("cooking"))
+        article.tags.add(tag)
+        tag.delete()
+        self.assertEqual([], self.find("cooking"))
+
+    @override_settings(SEARCH_MAX_RESULTS=2)
+    def test_ranks_only_newest_matches(self):
+        for title in ("Bread one", "Bread two", "Bread three"):
+            self.create(title)
+        results = search.SearchResults("bread")
+        self.assertEqual(2, results.count())
+        self.assertTrue(results.truncated)
+        self.assertEqual({"Bread two", "Bread three"}, {a.title for a in results[:5]})
+
+    def test_empty_search(self):
+        self.create("Bread")
+        results = search.SearchResults("  ?! ")
+        self.assertEqual(0, results.count())
+        self.assertEqual([], results[:7])
+
+    def test_rebuild_search_index(self):
+        self.create("Bread")
+        with search.connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {0}".format(search.SEARCH_TABLE))
+        self.assertEqual([], self.find("bread"))
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Indexed 1 Article(s)", out.getvalue())
+        self.assertEqual(["Bread"], self.find("bread"))
+
+    def test_benchmark_search(self):
+        out = StringIO()
+        call_command("benchmark_search", articles=50, series=2, authors=1, words=20,
+            repeat=1, stdout=out)
+        self.assertIn("Indexed 50 Articles", out.getvalue())
+        self.assertIn("Slowest search took", out.getvalue())
+        self.assertFalse(Article.objects.filter(slug__startswith="benchmark-").exists())
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class TestSearchView(TestCase):
+    #pylint: disable=E1101
+
+    @classmethod
+    def setUpTestData(cls):
+        series = Series.objects.create(name="Test Series", description="test")
+        author = Author.objects.create(name="Test Author", bio="test")
+        for i in range(9):
+            Article.objects.create(
+                title = "Bread {0}".format(i),
+                content = "<p>Bread.</p>",
+                series = series,
+                author = author,
+                publish_date = fake_now()
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_page(self):
+        response = self.client.get(reverse("article-search"), {"q": "bread"})
+        self.assertEqual(200, response.status_code)
+        self.assertTemplateUsed(response, "articles/search.html")
+        self.assertEqual(9, response.context["page_obj"].paginator.count)
+        self.assertEqual(7, len(response.context["article_list"]))
+        self.assertContains(response, "?q=bread&amp;page=2")
+
+    def test_second_page(self):
+        response = self.client.get(reverse("article-search"), {"q": "bread", "page": 2})
+        self.assertEqual(2, len(response.context["article_list"]))
+
+    def test_no_search(self):
+        response = self.client.get(reverse("article-search"))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(0, response.context["page_obj"].paginator.count)
@@ -0,0 +1,128 @@
+import json
+
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from io import StringIO
+from mock import patch
+
+from articles.models import Author, Series, Article, Tag
+
+
+@override_settings(SITEMAP_SHARD_SIZE=2)
+class TestSitemaps(TestCase):
+    #pylint: disable=E1101
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name="Test Author", bio="test")
+        cls.series = Series.objects.create(name="Test Series", description="test")
+        cls.articles = [cls.create("Article {0}".format(i)) for i in range(3)]
+        cls.create("Hidden", enabled=False)
+        cls.create("Scheduled", publish_date=timezone.now() + timedelta(days=1))
+        cls.articles[0].tags.add(Tag.objects.create(name="Test Tag"))
+
+    @classmethod
+    def create(cls, title, **kwargs) -> Article:
+        kwargs.setdefault("publish_date", timezone.now() - timedelta(days=1))
+        return Article.objects.create(
+            title = title,
+            content = "test",
+            series = cls.series,
+            author = cls.author,
+            **kwargs
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def shard_of(self, article) -> str:
+        return reverse("sitemap-shard", args=[article.pk // 2])
+
+    def test_index_lists_shards(self):
+        response = self.client.get(reverse("sitemap"))
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response["Content-Type"].startswith("application/xml"))
+        self.assertContains(response, "http://testserver/sitemap-pages.xml")
+        for article in self.articles:
+            self.assertContains(response, "http://testserver" + self.shard_of(article))
+
+    def test_shards_list_visible_articles(self):
+        shards = {self.shard_of(a) for a in self.articles}
+        urls = b"".join(self.client.get(shard).content for shard in shards)
+        for article in self.articles:
+            self.assertEqual(1, urls.count(article.get_absolute_url().encode() + b"</loc>"))
+        self.assertNotIn(b"hidden", urls)
+        self.assertNotIn(b"scheduled", urls)
+        self.assertIn(self.articles[0].date_modified.isoformat().encode(), urls)
+
+    def test_pages(self):
+        response = self.client.get(reverse("sitemap-pages"))
+        for url in (self.series.get_absolute_url(), self.author.get_absolute_url(),
+                reverse("tag-detail", args=["test-tag"]), reverse("article-list")):
+            self.assertContains(response, "http://testserver" + url + "</loc>")
+
+    def test_shard_read_in_one_query(self):
+        with self.assertNumQueries(2):
+            self.client.get(self.shard_of(self.articles[0]))
+        with self.assertNumQueries(0):
+            response = self.client.get(self.shard_of(self.articles[0]))
+        with self.assertNumQueries(0):
+            self.client.get(self.shard_of(self.articles[0]), HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_changes_only_invalidate_their_shard(self):
+        first = Article.objects.get(pk=self.articles[0].pk)
+        last = self.articles[-1]
+        self.assertNotEqual(self.shard_of(first), self.shard_of(last))
+        self.client.get(self.shard_of(first))
+        self.client.get(self.shard_of(last))
+        first.enabled = False
+        first.save()
+        self.assertNotContains(self.client.get(self.shard_of(first)), first.get_absolute_url())
+        with self.assertNumQueries(0):
+            self.client.get(self.shard_of(last))
+
+    def test_renaming_series_invalidates_every_shard(self):
+        last = self.articles[-1]
+        self.client.get(self.shard_of(last))
+        series = Series.objects.get(pk=self.series.pk)
+        series.slug = "renamed"
+        series.save()
+        self.assertContains(self.client.get(self.shard_of(last)), "/articles/renamed/")
+
+    def test_tag_changes_invalidate_pages(self):
+        url = reverse("sitemap-pages")
+        self.client.get(url)
+        tag = Tag.objects.create(name="New Tag")
+        self.assertNotContains(self.client.get(url), "/new-tag</loc>")
+        self.articles[1].tags.add(tag)
+        self.assertContains(self.client.get(url), "/new-tag</loc>")
+        tag = Tag.objects.get(pk=tag.pk)
+        tag.slug = "renamed-tag"
+        tag.save()
+        self.assertContains(self.client.get(url), "/renamed-tag</loc>")
+        Tag.objects.get(slug="test-tag").delete()
+        self.assertNotContains(self.client.get(url), "/test-tag</loc>")
+
+    def test_import_invalidates_sitemaps(self):
+        self.client.get(reverse("sitemap"))
+        self.client.get(reverse("sitemap-shard", args=[50]))
+        dump = StringIO(json.dumps([{
+            "model": "articles.article",
+            "pk": 100,
+            "fields": {
+                "title": "Imported",
+                "content": "test",
+                "series": self.series.pk,
+                "publish_date": timezone.now().isoformat(),
+                "date_modified": timezone.now().isoformat(),
+            }
+        }]))
+        # Tests run in a transaction, so run what's left for after it.
+        with patch("sys.stdin", dump), patch("django.db.transaction.on_commit", lambda f: f()):
+            call_command("import_articles", "-", stdout=StringIO())
+        self.assertContains(self.client.get(reverse("sitemap")), "/sitemap-50.xml")
+        self.assertContains(self.client.get(reverse("sitemap-shard", args=[50])), "/imported</loc>")
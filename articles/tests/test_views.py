@@ -1,12 +1,26 @@
-from django.test import TestCase
+import datetime
+
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache
 from django.urls import reverse
-from django.template.exceptions import TemplateDoesNotExist
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from io import StringIO
 from mock import patch
 
-from articles.models import Author, Series, Article, Tag
-from .test_models import fake_now, fake_later, fake_slightly_later
+from articles.caching import get_page_cache_stats
+from articles.models import Author, Series, Article, Tag, RelatedArticle
+from articles.related import refresh_related
+from articles.views import ArticleDetailView
+from .test_models import (fake_now, fake_later, fake_slightly_later, 
+    get_test_image)
 
 
+@override_settings(PAGE_CACHE_TIMEOUT=0)
 class TestHomePage(TestCase):
 
     @classmethod
@@ -44,6 +58,7 @@ class TestHomePage(TestCase):
         self.assertContains(response, expected)
 
 
+@override_settings(PAGE_CACHE_TIMEOUT=0)
 class TestAuthorDetailPage(TestCase):
 
     @classmethod
@@ -112,6 +127,7 @@ class TestAuthorDetailPage(TestCase):
         self.assertTrue(a not in response1.context["author_articles"])
         self.assertTrue(a not in response2.context["author_articles"])
 
+@override_settings(PAGE_CACHE_TIMEOUT=0)
 class TestSeriesListPage(TestCase):
 
     @classmethod
@@ -140,6 +156,43 @@ class TestSeriesListPage(TestCase):
         response = self.client.get(reverse("series-list"))
         self.assertTrue(response.context["is_paginated"])
 
+    def test_query_count_does_not_depend_on_page_size(self):
+        #pylint:disable=E1101
+        a = Author.objects.create(name="Test Author", bio="test")
+        for s in Series.objects.all():
+            for x in range(6):
+                Article.objects.create(
+                    title = s.name + str(x),
+                    series = s,
+                    author = a,
+                    content = "test",
+                    shortline = "test"
+                )
+        cache.clear()
+        with CaptureQueriesContext(connection) as full_page:
+            self.client.get(reverse("series-list"))
+        cache.clear()
+        with CaptureQueriesContext(connection) as short_page:
+            self.client.get(reverse("series-list") + "?page=2")
+        self.assertEqual(len(full_page), len(short_page))
+
+    def test_latest_list_is_limited_to_five(self):
+        #pylint:disable=E1101
+        a = Author.objects.create(name="Test Author", bio="test")
+        s = Series.objects.get(name="Series0")
+        for x in range(7):
+            Article.objects.create(
+                title = "Test" + str(x),
+                series = s,
+                author = a,
+                content = "test",
+                shortline = "test"
+            )
+        response = self.client.get(reverse("series-list"))
+        series = [x for x in response.context["series_list"] if x == s][0]
+        self.assertEqual(5, len(series.latest_list()))
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
 class TestSeriesDetailPage(TestCase):
 
     @classmethod
@@ -229,37 +282,120 @@ class TestSeriesDetailPage(TestCase):
         self.assertTrue(a not in response1.context["article_list"])
         self.assertTrue(a not in response2.context["article_list"])
 
+@override_settings(PAGE_CACHE_TIMEOUT=0)
 class TestTagListView(TestCase):
 
     @classmethod
     def setUpTestData(cls):
         #pylint:disable=E1101
-        Tag.objects.create(name="Test")
+        series = Series.objects.create(name="Test Series", description="test")
+        author = Author.objects.create(name="Test Author", bio="test")
+        cls.popular = Tag.objects.create(name="Popular")
+        cls.rare = Tag.objects.create(name="Rare")
+        cls.unused = Tag.objects.create(name="Unused")
+        for x in range(4):
+            article = Article.objects.create(
+                title = "Test" + str(x),
+                series = series,
+                author = author,
+                content = "test",
+                shortline = "test",
+                publish_date = fake_now(),
+                enabled = x != 3
+            )
+            article.tags.add(cls.popular, cls.unused if x == 3 else cls.rare if x == 0 else cls.popular)
+
+    def setUp(self):
+        cache.clear()
 
     def test_response_code(self):
-        with self.assertRaises(TemplateDoesNotExist):
-            self.client.get(reverse("tag-list"))
+        response = self.client.get(reverse("tag-list"))
+        self.assertEqual(response.status_code, 200)
 
     def test_url_location(self):
-        with self.assertRaises(TemplateDoesNotExist):
-            self.client.get("/articles/tags")
+        response = self.client.get("/articles/tags")
+        self.assertEqual(response.status_code, 200)
+
+    def test_template_used(self):
+        response = self.client.get(reverse("tag-list"))
+        self.assertTemplateUsed(response, "articles/tag_list.html")
+
+    def test_cloud(self):
+        response = self.client.get(reverse("tag-list"))
+        tags = response.context["tag_list"]
+        self.assertEqual([self.popular, self.rare], tags)
+        self.assertEqual([3, 1], [tag.article_count for tag in tags])
+        self.assertEqual([5, 2], [tag.size for tag in tags])
+        self.assertContains(response, self.popular.get_absolute_url())
+
+    def test_cloud_is_one_query(self):
+        self.client.get(reverse("tag-list"))
+        cache.clear()
+        cache.set("articles:tag_counts_until", 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("tag-list"))
+        self.assertEqual(1, sum("articles_tag" in q["sql"] for q in queries.captured_queries))
 
+@override_settings(PAGE_CACHE_TIMEOUT=0)
 class TestTagDetailView(TestCase):
 
     @classmethod
     def setUpTestData(cls):
         #pylint:disable=E1101
-        Tag.objects.create(name="Test")
+        series = Series.objects.create(name="Test Series", description="test")
+        author = Author.objects.create(name="Test Author", bio="test")
+        tag = Tag.objects.create(name="Test")
+        for x in range(10):
+            article = Article.objects.create(
+                title = "Test" + str(x),
+                series = series,
+                author = author,
+                content = "test",
+                shortline = "test",
+                publish_date = timezone.now() + datetime.timedelta(days=1) if x == 8 else fake_now(),
+                enabled = x != 9
+            )
+            article.tags.add(tag)
+        Article.objects.create(
+            title = "Untagged",
+            series = series,
+            author = author,
+            content = "test",
+            shortline = "test",
+            publish_date = fake_now()
+        )
+
+    def setUp(self):
+        cache.clear()
 
     def test_response_code(self):
-        with self.assertRaises(TemplateDoesNotExist):
-            self.client.get(reverse("tag-detail", args=["test"]))
+        response = self.client.get(reverse("tag-detail", args=["test"]))
+        self.assertEqual(response.status_code, 200)
 
     def test_url_location(self):
-        with self.assertRaises(TemplateDoesNotExist):
-            self.client.get("/articles/tags/test")
+        response = self.client.get("/articles/tags/test")
+        self.assertEqual(response.status_code, 200)
 
+    def test_template_used(self):
+        response = self.client.get(reverse("tag-detail", args=["test"]))
+        self.assertTemplateUsed(response, "articles/tag_detail.html")
+
+    def test_missing_tag(self):
+        response = self.client.get(reverse("tag-detail", args=["missing"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_lists_visible_articles(self):
+        response1 = self.client.get(reverse("tag-detail", args=["test"]))
+        response2 = self.client.get(reverse("tag-detail", args=["test"]) + "?page=2")
+        articles = list(response1.context["article_list"]) + list(response2.context["article_list"])
+        self.assertEqual(7, len(response1.context["article_list"]))
+        self.assertEqual(
+            ["Test" + str(x) for x in range(8)],
+            sorted(article.title for article in articles)
+        )
 
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
 class TestArticleListView(TestCase):
 
     @classmethod
@@ -326,6 +462,7 @@ class TestArticleListView(TestCase):
         self.assertTrue(a not in response1.context["article_list"])
         self.assertTrue(a not in response2.context["article_list"])
 
+@override_settings(PAGE_CACHE_TIMEOUT=0)
 class TestArticleDetailView(TestCase):
 
     @classmethod
@@ -370,4 +507,420 @@ class TestArticleDetailView(TestCase):
 
     def test_article_detail_ignores_disabled_articles(self):
         response = self.client.get(reverse("article-detail", args=["test-series", "test2"]))
-        self.assertEqual(response.status_code, 404)
\ No newline at end of file
+        self.assertEqual(response.status_code, 404)
+
+    def test_article_detail_checks_series(self):
+        #pylint:disable=E1101
+        Series.objects.create(name="Other Series", description="test")
+        response = self.client.get(reverse("article-detail", args=["other-series", "test0"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_article_loaded_in_one_query(self):
+        view = ArticleDetailView()
+        view.kwargs = {"series": "test-series", "slug": "test0"}
+        with self.assertNumQueries(1):
+            article = view.get_object()
+            self.assertEqual("Test Series", article.series.name)
+            self.assertEqual("Test Author", article.author.name)
+
+    def test_related_articles(self):
+        response = self.client.get(reverse("article-detail", args=["test-series", "test0"]))
+        self.assertEqual(["Test1"], [a.title for a in response.context["related_articles"]])
+        self.assertContains(response, "More like this")
+
+    @override_settings(IMAGE_DERIVATIVE_EXECUTOR="sync")
+    def test_article_image_is_a_picture(self):
+        #pylint:disable=E1101
+        Article.objects.create(
+            title = "Test Image",
+            content = "test",
+            series = Series.objects.get(name="Test Series"),
+            author = Author.objects.get(name="Test Author"),
+            image_raw = get_test_image()
+        )
+        response = self.client.get(reverse("article-detail", args=["test-series", "test-image"]))
+        self.assertContains(response, "<picture>")
+        self.assertContains(response, 'type="image/webp"')
+
+
+class TestArticleAudio(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        #pylint:disable=E1101
+        a = Author.objects.create(name="Test Author", bio="test")
+        s = Series.objects.create(name="Test Series", description="test")
+        Article.objects.create(
+            title = "Test Audio",
+            content = "test",
+            series = s,
+            author = a,
+            publish_date = fake_now(),
+            audio = SimpleUploadedFile("session.mp3", b"0123456789", "audio/mpeg")
+        )
+        Article.objects.create(
+            title = "No Audio",
+            content = "test",
+            series = s,
+            author = a,
+            publish_date = fake_now()
+        )
+
+    def get(self, **headers):
+        return self.client.get(
+            reverse("article-audio", args=["test-series", "test-audio"]), 
+            **headers
+        )
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b"0123456789", b"".join(response.streaming_content))
+        self.assertEqual("bytes", response["Accept-Ranges"])
+        self.assertEqual("10", response["Content-Length"])
+        self.assertEqual("audio/mpeg", response["Content-Type"])
+
+    def test_player_uses_audio_view(self):
+        response = self.client.get(reverse("article-detail", args=["test-series", "test-audio"]))
+        self.assertContains(response, reverse("article-audio", args=["test-series", "test-audio"]))
+
+    def test_range(self):
+        response = self.get(HTTP_RANGE="bytes=2-5")
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(b"2345", b"".join(response.streaming_content))
+        self.assertEqual("bytes 2-5/10", response["Content-Range"])
+        self.assertEqual("4", response["Content-Length"])
+
+    def test_open_and_suffix_ranges(self):
+        self.assertEqual(b"789", b"".join(self.get(HTTP_RANGE="bytes=7-").streaming_content))
+        self.assertEqual(b"89", b"".join(self.get(HTTP_RANGE="bytes=-2").streaming_content))
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE="bytes=10-")
+        self.assertEqual(416, response.status_code)
+        self.assertEqual("bytes */10", response["Content-Range"])
+
+    def test_if_none_match(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(304, self.get(HTTP_IF_NONE_MATCH=etag).status_code)
+
+    def test_if_modified_since(self):
+        last_modified = self.get()["Last-Modified"]
+        self.assertEqual(304, self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code)
+
+    def test_if_range(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(206, self.get(HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE=etag).status_code)
+        self.assertEqual(200, self.get(HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"stale"').status_code)
+
+    @override_settings(MEDIA_SENDFILE="x-accel-redirect", MEDIA_ACCEL_REDIRECT_LOCATION="/internal/")
+    def test_x_accel_redirect(self):
+        response = self.get()
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response["X-Accel-Redirect"].startswith("/internal/uploads/audio/"))
+        self.assertEqual(b"", response.content)
+
+    def test_only_safe_methods(self):
+        url = reverse("article-audio", args=["test-series", "test-audio"])
+        self.assertEqual(405, self.client.post(url).status_code)
+        self.assertEqual(200, self.client.head(url).status_code)
+
+    def test_missing_audio_file(self):
+        #pylint:disable=E1101
+        article = Article.objects.create(
+            title = "Deleted Audio",
+            content = "test",
+            series = Series.objects.get(slug="test-series"),
+            author = Author.objects.get(),
+            publish_date = fake_now(),
+            audio = SimpleUploadedFile("deleted.mp3", b"0123456789", "audio/mpeg")
+        )
+        article.audio.storage.delete(article.audio.name)
+        response = self.client.get(
+            reverse("article-audio", args=["test-series", "deleted-audio"])
+        )
+        self.assertEqual(404, response.status_code)
+
+    def test_article_without_audio(self):
+        response = self.client.get(reverse("article-audio", args=["test-series", "no-audio"]))
+        self.assertEqual(404, response.status_code)
+
+
+class TestPageCache(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        #pylint:disable=E1101
+        a = Author.objects.create(name="Test Author", bio="test")
+        s = Series.objects.create(name="Test Series", description="test")
+        for index in range(8):
+            Article.objects.create(
+                title = "Test" + str(index),
+                content = "test",
+                series = s,
+                author = a,
+                publish_date = fake_now()
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_request_is_a_hit(self):
+        url = reverse("article-list")
+        self.assertEqual("MISS", self.client.get(url)["X-Page-Cache"])
+        response = self.client.get(url)
+        self.assertEqual("HIT", response["X-Page-Cache"])
+        self.assertContains(response, "Test7")
+
+    def test_hit_does_not_query(self):
+        url = reverse("article-detail", args=["test-series", "test0"])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_pages_are_cached_separately(self):
+        url = reverse("article-list")
+        self.client.get(url)
+        self.assertEqual("MISS", self.client.get(url + "?page=2")["X-Page-Cache"])
+
+    def test_saving_invalidates(self):
+        #pylint:disable=E1101
+        url = reverse("series-detail", args=["test-series"])
+        self.client.get(url)
+        article = Article.objects.get(title="Test0")
+        article.title = "Renamed"
+        article.save()
+        response = self.client.get(url)
+        self.assertEqual("MISS", response["X-Page-Cache"])
+        self.assertContains(response, "Renamed")
+
+    def test_tag_changes_invalidate(self):
+        #pylint:disable=E1101
+        tag = Tag.objects.create(name="Cached Tag")
+        url = reverse("tag-detail", args=["cached-tag"])
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual("HIT", self.client.get(url)["X-Page-Cache"])
+        # Tests run in a transaction, so run what's left for after it.
+        with patch("django.db.transaction.on_commit", lambda f: f()):
+            Article.objects.get(title="Test0").tags.add(tag)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("MISS", response["X-Page-Cache"])
+        self.assertContains(response, "Test0")
+        self.client.get(reverse("tag-list"))
+        with patch("django.db.transaction.on_commit", lambda f: f()):
+            tag = Tag.objects.get(pk=tag.pk)
+            tag.name = "Renamed Tag"
+            tag.save()
+        self.assertContains(self.client.get(reverse("tag-list")), "Renamed Tag")
+
+    def test_refreshing_related_articles_invalidates(self):
+        #pylint:disable=E1101
+        article = Article.objects.get(title="Test0")
+        RelatedArticle.objects.all().delete()
+        url = reverse("article-detail", args=["test-series", "test0"])
+        self.assertNotContains(self.client.get(url), "More like this")
+        self.assertEqual("HIT", self.client.get(url)["X-Page-Cache"])
+        # Tests run in a transaction, so run what's left for after it.
+        with patch("django.db.transaction.on_commit", lambda f: f()):
+            refresh_related([article.pk])
+        response = self.client.get(url)
+        self.assertEqual("MISS", response["X-Page-Cache"])
+        self.assertContains(response, "More like this")
+
+    def test_timeout_capped_at_next_publish_date(self):
+        #pylint:disable=E1101
+        Article.objects.create(
+            title = "Scheduled",
+            content = "test",
+            series = Series.objects.get(),
+            author = Author.objects.get(),
+            publish_date = timezone.now() + datetime.timedelta(seconds=30)
+        )
+        with patch("articles.caching.cache.set", wraps=cache.set) as cache_set:
+            self.client.get(reverse("series-list"))
+        timeouts = [c[0][2] for c in cache_set.call_args_list if c[0][0].startswith("articles:page:")]
+        self.assertEqual(1, len(timeouts))
+        self.assertTrue(0 < timeouts[0] <= 31)
+
+    def test_logged_in_users_are_not_cached(self):
+        user = User.objects.create_user("admin", password="test")
+        self.client.force_login(user)
+        url = reverse("article-list")
+        self.client.get(url)
+        self.assertNotIn("X-Page-Cache", self.client.get(url))
+
+    def test_missing_pages_are_not_cached(self):
+        url = reverse("article-detail", args=["test-series", "missing"])
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(404, response.status_code)
+        self.assertEqual({"hits": 0, "misses": 2}, get_page_cache_stats())
+
+    def test_stats(self):
+        url = reverse("author-detail", args=["test-author"])
+        self.client.get(url)
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual({"hits": 2, "misses": 1}, get_page_cache_stats())
+        out = StringIO()
+        call_command("page_cache_stats", "--reset", stdout=out)
+        self.assertIn("2 hit(s), 1 miss(es)", out.getvalue())
+        self.assertEqual({"hits": 0, "misses": 0}, get_page_cache_stats())
+
+
+@override_settings(PAGE_CACHE_TIMEOUT=0)
+class TestConditionalResponses(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        #pylint:disable=E1101
+        a = Author.objects.create(name="Test Author", bio="test")
+        s = Series.objects.create(name="Test Series", description="test")
+        Article.objects.create(
+            title = "Test0",
+            content = "test",
+            series = s,
+            author = a,
+            publish_date = fake_now()
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_validators(self):
+        response = self.client.get(reverse("article-list"))
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertIn("Last-Modified", response)
+
+    def test_views_share_validators(self):
+        etags = {
+            self.client.get(url)["ETag"] for url in [
+                reverse("article-list"),
+                reverse("series-list"),
+                reverse("series-detail", args=["test-series"]),
+                reverse("author-detail", args=["test-author"]),
+                reverse("article-detail", args=["test-series", "test0"]),
+            ]
+        }
+        self.assertEqual(1, len(etags))
+
+    def test_if_none_match_skips_the_view(self):
+        url = reverse("article-detail", args=["test-series", "test0"])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b"", response.content)
+
+    def test_if_modified_since(self):
+        url = reverse("series-list")
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(304, response.status_code)
+
+    def test_saving_changes_etag(self):
+        #pylint:disable=E1101
+        url = reverse("article-list")
+        etag = self.client.get(url)["ETag"]
+        Series.objects.get().save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+
+    def test_publishing_changes_etag(self):
+        #pylint:disable=E1101
+        Article.objects.create(
+            title = "Scheduled",
+            content = "test",
+            series = Series.objects.get(),
+            author = Author.objects.get(),
+            publish_date = fake_later()
+        )
+        url = reverse("article-list")
+        etag = self.client.get(url)["ETag"]
+        cache.clear()
+        with patch("articles.models.timezone.now", fake_slightly_later):
+            self.assertNotEqual(etag, self.client.get(url)["ETag"])
+
+    def test_cache_control(self):
+        response = self.client.get(reverse("article-list"))
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("s-maxage=", response["Cache-Control"])
+        self.assertIn("max-age=0", response["Cache-Control"])
+        self.assertIn("Cookie", response["Vary"])
+
+    def test_logged_in_users_are_private(self):
+        self.client.force_login(User.objects.create_user("admin", password="test"))
+        response = self.client.get(reverse("article-list"))
+        self.assertIn("private", response["Cache-Control"])
+
+    def test_missing_pages_have_no_validators(self):
+        response = self.client.get(reverse("article-detail", args=["test-series", "missing"]))
+        self.assertEqual(404, response.status_code)
+        self.assertNotIn("ETag", response)
+
+@override_settings(KEYSET_PAGINATION=True, PAGE_CACHE_TIMEOUT=0)
+class TestKeysetPagination(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        #pylint:disable=E1101
+        a = Author.objects.create(name="Test Author", bio="test")
+        s = Series.objects.create(name="Test Series", description="test")
+        for index in range(16):
+            Article.objects.create(
+                title = "Test" + str(index),
+                content = "test",
+                series = s,
+                author = a,
+                publish_date = fake_now()
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def titles(self, page) -> list:
+        return [article.title for article in page]
+
+    def test_pages_do_not_overlap(self):
+        url = reverse("article-list")
+        seen = []
+        page = self.client.get(url).context["page_obj"]
+        seen += self.titles(page)
+        while page.has_next():
+            page = self.client.get(url, {"after": page.next_cursor}).context["page_obj"]
+            seen += self.titles(page)
+        self.assertEqual(16, len(seen))
+        self.assertEqual(16, len(set(seen)))
+
+    def test_before_goes_back(self):
+        url = reverse("series-detail", args=["test-series"])
+        first = self.client.get(url).context["article_list"]
+        second = self.client.get(url, {"after": first.next_cursor}).context["article_list"]
+        back = self.client.get(url, {"before": second.previous_cursor}).context["article_list"]
+        self.assertEqual(self.titles(first), self.titles(back))
+        self.assertFalse(back.has_previous())
+
+    def test_page_number_redirects(self):
+        url = reverse("author-detail", args=["test-author"])
+        first = self.client.get(url).context["author_articles"]
+        response = self.client.get(url, {"page": 2})
+        self.assertEqual(302, response.status_code)
+        self.assertEqual(
+            "{0}?after={1}".format(url, first.next_cursor),
+            response["Location"]
+        )
+
+    def test_invalid_cursor_is_first_page(self):
+        url = reverse("article-list")
+        first = self.client.get(url).context["page_obj"]
+        page = self.client.get(url, {"after": "not-a-cursor"}).context["page_obj"]
+        self.assertEqual(self.titles(first), self.titles(page))
+
+    def test_count_is_cached(self):
+        url = reverse("article-list")
+        self.assertContains(self.client.get(url), "16 articles")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse(any("COUNT(" in q["sql"] for q in queries.captured_queries))
@@ -3,11 +3,20 @@ from . import views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('sitemap.xml', views.sitemap, name='sitemap'),
+    path('sitemap-pages.xml', views.sitemap, {'section': 'pages'}, name='sitemap-pages'),
+    path('sitemap-<int:section>.xml', views.sitemap, name='sitemap-shard'),
     path('author/<slug:slug>', views.AuthorDetailView.as_view(), name='author-detail'),
+    path('author/<slug:slug>/feed.<str:feed_format>', views.feed, {'kind': 'author'}, name='author-feed'),
     path('articles/series', views.SeriesListView.as_view(), name='series-list'),
     path('articles/series/<slug:slug>', views.SeriesDetailView.as_view(), name='series-detail'),
+    path('articles/series/<slug:slug>/feed.<str:feed_format>', views.feed, {'kind': 'series'}, name='series-feed'),
     path('articles/tags', views.TagListView.as_view(), name='tag-list'),
     path('articles/tags/<slug:slug>', views.TagDetailView.as_view(), name='tag-detail'),
+    path('articles/search', views.search, name='article-search'),
+    path('articles/feed.<str:feed_format>', views.feed, name='feed'),
     path('articles', views.ArticleListView.as_view(), name='article-list'),
     path('articles/<slug:series>/<slug:slug>', views.ArticleDetailView.as_view(), name='article-detail'),
+    path('articles/<slug:series>/<slug:slug>/audio', views.article_audio, name='article-audio'),
+    path('images/<str:model>/<int:pk>/<str:field>/<int:width>.<str:extension>', views.image_rendition, name='image-rendition'),
 ]
\ No newline at end of file
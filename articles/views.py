@@ -1,41 +1,123 @@
 import datetime
 
-from django.shortcuts import render
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404, redirect
 from django.views import generic
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
 from django.utils import timezone
-from django.http import Http404, HttpResponse, HttpRequest
+from django.http import Http404, HttpResponse, HttpRequest, QueryDict
 from django.core.paginator import Paginator
 from django.db.models.query import QuerySet
 
-from .models import Article, Author, Series, Tag
+from .caching import cache_anonymous_page, conditional_page, seconds_until
+from .feeds import get_feed
+from .images import FORMAT_EXTENSIONS
+from .media import serve_file
+from .pagination import KeysetPaginator, keyset_enabled, page_redirect_url
+from .search import SearchResults
+from .sitemaps import get_sitemap
+from .models import Article, Author, Series, Tag, ImageRendition
+
+# The models `image_rendition` may create renditions for, by model name.
+IMAGE_MODELS = {
+    "author": Author,
+    "series": Series,
+    "article": Article,
+}
+
+def _prefetch_card_images(articles) -> None:
+    """
+    Loads the image renditions used by the Article cards in one go.
+
+    The cards fall back to the Article's Series' image, so the renditions
+    of each Series are loaded as well.
+
+    Args:
+        articles: The Articles that will be shown as cards.
+    """
+
+    articles = list(articles)
+    ImageRendition.prefetch(articles + [a.series for a in articles])
+
+class ArticlePaginationMixin:
+    """
+    Paginates lists of Articles, by page number or by keyset.
+
+    With `KEYSET_PAGINATION` on (see `articles.pagination`), pages are
+    found with `?after=` and `?before=` cursors, and old `?page=` URLs
+    redirect to the cursor showing the same Articles.
+    """
+
+    paginate_articles_by = 7
+    pagination_redirect = None
+
+    def paginate_articles(self, queryset: QuerySet, count_key: str):
+        """
+        Returns the requested page of `queryset`.
+
+        Args:
+            queryset (QuerySet): The Articles to paginate.
+            count_key (str): Identifies the list, for caching its count.
+
+        Returns:
+            The page, as a `Page` or `KeysetPage`.
+        """
+
+        if not keyset_enabled():
+            paginator = Paginator(queryset, self.paginate_articles_by)
+            return paginator.get_page(self.request.GET.get("page"))
+        paginator = KeysetPaginator(queryset, self.paginate_articles_by, count_key)
+        self.pagination_redirect = page_redirect_url(self.request, paginator)
+        if self.pagination_redirect is not None:
+            return paginator.page()
+        return paginator.page(
+            after = self.request.GET.get("after"),
+            before = self.request.GET.get("before")
+        )
+
+    def render_to_response(self, context: dict, **response_kwargs) -> HttpResponse:
+        """
+        Redirects old `?page=` URLs, and renders the page otherwise.
+        """
+
+        if self.pagination_redirect is not None:
+            return redirect(self.pagination_redirect)
+        return super().render_to_response(context, **response_kwargs)
 
 # Create your views here.
+@conditional_page
+@cache_anonymous_page
 def index(request: HttpRequest) -> HttpResponse:
     """
     The home page for the site. Pulls the content of the Article name "Welcome".
 
     The index page is intended to be a modified version of the article detail
-    page. It essentially shows only the Article's content and nothing else. 
+    page. It essentially shows only the Article's content and nothing else.
     It is therefore required that an Article exits with the slug "welcome", and
     it is recommended that this Article has `enabled` set to False so it does
     not appear in the Article lists.
-    
+
     Args:
         request (HttpRequest): The incoming request.
-    
+
     Returns:
-        HttpResponse: The response object with the article added to context 
+        HttpResponse: The response object with the article added to context
             as `article`.
     """
 
     #pylint: disable=E1101
     welcome_article = Article.objects.get(slug="welcome")
 
-    return render(request, 
-                  'articles/index.html', 
+    return render(request,
+                  'articles/index.html',
                   context={'article': welcome_article})
 
-class AuthorDetailView(generic.DetailView):
+@method_decorator(conditional_page, name="dispatch")
+@method_decorator(cache_anonymous_page, name="dispatch")
+class AuthorDetailView(ArticlePaginationMixin, generic.DetailView):
     """
     View for an individual Author.
     """
@@ -49,7 +131,7 @@ class AuthorDetailView(generic.DetailView):
         This finds all Articles this Author has published, for which those
         Articles are both enabled and the publish date has passed. The
         QuerySet is then paginated to 7 items per page.
-        
+
         Returns:
             dict: The original context, with the Author's Articles as a
                 QuerySet available with the key `author_articles`, paginated
@@ -61,13 +143,17 @@ class AuthorDetailView(generic.DetailView):
         author_article_list = self.object.article_set.filter(
             enabled = True,
             publish_date__lte = timezone.now()
+        ).select_related("series")
+        context["author_articles"] = self.paginate_articles(
+            author_article_list,
+            "author:{0}".format(self.object.pk)
         )
-        paginator = Paginator(author_article_list, 7)
-        page = self.request.GET.get('page')
-        context["author_articles"] = paginator.get_page(page)
+        _prefetch_card_images(context["author_articles"])
         return context
 
 
+@method_decorator(conditional_page, name="dispatch")
+@method_decorator(cache_anonymous_page, name="dispatch")
 class SeriesListView(generic.ListView):
     """
     List view for the Series, paginated to 7 items per page.
@@ -76,8 +162,37 @@ class SeriesListView(generic.ListView):
     model = Series
     paginate_by = 7
 
+    def get_queryset(self) -> QuerySet:
+        """
+        Returns all Series, with each Series' latest Articles prefetched.
+
+        The template shows the latest Articles of every Series on the page,
+        so they are batched into a single query instead of one or more
+        queries per Series.
+
+        Returns:
+            QuerySet: All Series, with `latest_list` prefetched.
+        """
+
+        #pylint: disable=E1101
+        return Series.objects.with_latest_list()
+
+    def get_context_data(self, **kwargs) -> dict:
+        """
+        Loads the image renditions of the Series on this page.
+
+        Returns:
+            dict: The context, unchanged.
+        """
 
-class SeriesDetailView(generic.DetailView):
+        context = super().get_context_data(**kwargs)
+        ImageRendition.prefetch(context["series_list"])
+        return context
+
+
+@method_decorator(conditional_page, name="dispatch")
+@method_decorator(cache_anonymous_page, name="dispatch")
+class SeriesDetailView(ArticlePaginationMixin, generic.DetailView):
     """
     Detail view for a single Series.
     """
@@ -90,7 +205,7 @@ class SeriesDetailView(generic.DetailView):
 
         Any Article for which `visible` returns True is filtered in to a new
         QuerySet, available with the key `article_list`.
-        
+
         Returns:
             dict: The context dictionary with available Articles for this
             Series available as `article_list`.
@@ -101,29 +216,88 @@ class SeriesDetailView(generic.DetailView):
             enabled = True,
             publish_date__lte = timezone.now()
         )
-        paginator = Paginator(article_list, 7)
-        page = self.request.GET.get('page')
-        context["article_list"] = paginator.get_page(page)
+        context["article_list"] = self.paginate_articles(
+            article_list.select_related("author"),
+            "series:{0}".format(self.object.pk)
+        )
+        _prefetch_card_images(context["article_list"])
         return context
 
 
+@method_decorator(conditional_page, name="dispatch")
+@method_decorator(cache_anonymous_page, name="dispatch")
 class TagListView(generic.ListView):
     """
-    List view for Tags. Currently not used.
+    Tag cloud of every Tag with visible Articles.
     """
 
     model = Tag
 
+    # How many sizes Tags are shown in, from least to most used.
+    cloud_sizes = 5
+
+    def get_queryset(self) -> QuerySet:
+        """
+        Returns the Tags in use, most used first, in one indexed query.
+
+        Returns:
+            QuerySet: The Tags, ordered by their stored `article_count`.
+        """
+
+        #pylint: disable=E1101
+        return Tag.objects.in_cloud()
+
+    def get_context_data(self, **kwargs) -> dict:
+        """
+        Gives each Tag a `size`, from 1 to `cloud_sizes`, by how many
+        Articles it has compared to the most used Tag.
+
+        Returns:
+            dict: The context, with the Tags as `tag_list`.
+        """
+
+        context = super().get_context_data(**kwargs)
+        tags = list(context["tag_list"])
+        most = max((tag.article_count for tag in tags), default=1)
+        for tag in tags:
+            tag.size = 1 + (self.cloud_sizes - 1) * tag.article_count // most
+        context["tag_list"] = context["object_list"] = tags
+        return context
+
 
-class TagDetailView(generic.DetailView):
+@method_decorator(conditional_page, name="dispatch")
+@method_decorator(cache_anonymous_page, name="dispatch")
+class TagDetailView(ArticlePaginationMixin, generic.DetailView):
     """
-    Detail view for Tags. Currently not used.
+    Detail view for a single Tag, listing its visible Articles.
     """
 
     model = Tag
 
+    def get_context_data(self, **kwargs) -> dict:
+        """
+        Adds the visible Articles with this Tag to context, paginated like
+        the other Article lists.
+
+        Returns:
+            dict: The context, with the Tag's Articles as `article_list`.
+        """
+
+        context = super().get_context_data(**kwargs)
+        article_list = Article.get_available_articles().filter(
+            tags = self.object
+        ).select_related("series", "author")
+        context["article_list"] = self.paginate_articles(
+            article_list,
+            "tag:{0}".format(self.object.pk)
+        )
+        _prefetch_card_images(context["article_list"])
+        return context
+
 
-class ArticleListView(generic.ListView):
+@method_decorator(conditional_page, name="dispatch")
+@method_decorator(cache_anonymous_page, name="dispatch")
+class ArticleListView(ArticlePaginationMixin, generic.ListView):
     """
     List view for Articles, filtered to only visible Articles and paginated.
     """
@@ -139,16 +313,46 @@ class ArticleListView(generic.ListView):
         server start, while the method version is evaluated on each
         request. This makes the attribute unsuitable for date-based filtering.
 
-        See: 
+        See:
         https://stackoverflow.com/questions/19707237/use-get-queryset-method-or-set-queryset-variable
-        
+
         Returns:
             QuerySet: The available Articles.
         """
 
-        return Article.get_available_articles()
+        return Article.get_available_articles().select_related(
+            "series", "author"
+        )
+
+    def paginate_queryset(self, queryset: QuerySet, page_size: int) -> tuple:
+        """
+        Paginates by keyset instead of page number, if that's turned on.
+
+        Returns:
+            tuple: The paginator, page, Articles on the page, and whether
+                there is more than one page, as `ListView` expects.
+        """
+
+        if not keyset_enabled():
+            return super().paginate_queryset(queryset, page_size)
+        page = self.paginate_articles(queryset, "all")
+        return (page.paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs) -> dict:
+        """
+        Loads the image renditions of the Articles on this page.
+
+        Returns:
+            dict: The context, unchanged.
+        """
+
+        context = super().get_context_data(**kwargs)
+        _prefetch_card_images(context["article_list"])
+        return context
 
 
+@method_decorator(conditional_page, name="dispatch")
+@method_decorator(cache_anonymous_page, name="dispatch")
 class ArticleDetailView(generic.DetailView):
     """
     Detail view for a single Article.
@@ -156,19 +360,245 @@ class ArticleDetailView(generic.DetailView):
 
     #pylint: disable=E1101
     model = Article
-    
-    def get_object(self) -> Article:
+
+    def get_object(self, queryset: QuerySet = None) -> Article:
         """
-        Checks if this Article should be visible. Raise 404 if not.
-        
+        Loads the visible Article with this slug, in this Series.
+
+        The Article, its Series and its Author are loaded in one query, which
+        also checks the Article is visible.
+
+        Args:
+            queryset (QuerySet, optional): Defaults to None. Not used; the
+                visible Articles are always used.
+
         Raises:
-            Http404: Raised if the Article is not visible.
-        
+            Http404: Raised if no visible Article has this slug and Series.
+
         Returns:
             Article: The Article to be viewed.
         """
 
-        a = super().get_object()
-        if not a.visible():
-            raise Http404
-        return a
\ No newline at end of file
+        return get_object_or_404(
+            Article.get_available_articles().select_related("series", "author"),
+            series__slug = self.kwargs["series"],
+            slug = self.kwargs["slug"]
+        )
+
+    def get_context_data(self, **kwargs) -> dict:
+        """
+        Adds the Articles most like this one, as `related_articles`.
+
+        They're precomputed, so this is one query; see `RelatedArticle`.
+
+        Returns:
+            dict: The context, with the related Articles.
+        """
+
+        context = super().get_context_data(**kwargs)
+        context["related_articles"] = self.object.get_related_articles()
+        return context
+
+@conditional_page
+@cache_anonymous_page
+def search(request: HttpRequest) -> HttpResponse:
+    """
+    Searches the visible Articles, showing the best matches first.
+
+    Titles, shortlines, content and Tag names are searched, using the index
+    kept by `articles.search`. Results are paginated to 7 per page by page
+    number, since they're ordered by rank rather than by date.
+
+    Args:
+        request (HttpRequest): The incoming request, with the search as `q`.
+
+    Returns:
+        HttpResponse: The response, with the search as `query`, the page of
+            results as `page_obj`, and the query string to keep when paging
+            as `page_query`.
+    """
+
+    query = request.GET.get("q", "").strip()[:200]
+    results = SearchResults(query)
+    page = Paginator(results, 7).get_page(request.GET.get("page"))
+    _prefetch_card_images(page.object_list)
+    page_query = QueryDict(mutable=True)
+    page_query["q"] = query
+    return render(request, "articles/search.html", context={
+        "query": query,
+        "page_obj": page,
+        "article_list": page.object_list,
+        "is_paginated": page.has_other_pages(),
+        "page_query": page_query.urlencode() + "&",
+    })
+
+@require_safe
+def feed(request: HttpRequest, feed_format: str, kind: str = None,
+        slug: str = None) -> HttpResponse:
+    """
+    Serves an RSS or Atom feed of the newest visible Articles, site-wide or
+    of one Series or Author.
+
+    The rendered feed is cached until an Article in it changes (see
+    `articles.feeds.get_feed`), and its `ETag` is a hash of the content, so
+    a poller which already has it gets a 304 without a query. Responses are
+    `public`, with a `max-age` of `FEED_MAX_AGE` in settings (defaulting to
+    300 seconds), capped at the next scheduled `publish_date`.
+
+    Args:
+        request (HttpRequest): The incoming request.
+        feed_format (str): "rss" or "atom".
+        kind (str, optional): Defaults to None, meaning the site-wide feed.
+            "series" or "author".
+        slug (str, optional): Defaults to None. The slug of the Series or
+            Author.
+
+    Raises:
+        Http404: Raised if there's no such format, Series or Author.
+
+    Returns:
+        HttpResponse: The feed, or a 304.
+    """
+
+    rendered = get_feed(request, feed_format, kind, slug)
+    if rendered is None:
+        raise Http404
+    return _rendered_response(
+        request,
+        rendered,
+        rendered["content_type"],
+        getattr(settings, "FEED_MAX_AGE", 300),
+        rendered["last_modified"]
+    )
+
+@require_safe
+def sitemap(request: HttpRequest, section=None) -> HttpResponse:
+    """
+    Serves the sitemap index, the sitemap of everything but Articles, or a
+    shard of the sitemap of Articles.
+
+    Sitemaps are cached until something in them changes (see
+    `articles.sitemaps.get_sitemap`), and served like feeds, with a
+    `max-age` of `SITEMAP_MAX_AGE` in settings (defaulting to 3600 seconds).
+
+    Args:
+        request (HttpRequest): The incoming request.
+        section (optional): Defaults to None, meaning the sitemap index.
+            "pages", or the number of a shard.
+
+    Returns:
+        HttpResponse: The sitemap, or a 304.
+    """
+
+    return _rendered_response(
+        request,
+        get_sitemap(request, section),
+        "application/xml; charset=utf-8",
+        getattr(settings, "SITEMAP_MAX_AGE", 3600)
+    )
+
+def _rendered_response(request: HttpRequest, rendered: dict, content_type: str,
+        max_age: int, last_modified: datetime.datetime = None) -> HttpResponse:
+    """
+    Returns a response for cached, rendered content, or a 304 if the client
+    already has it.
+
+    Args:
+        request (HttpRequest): The incoming request.
+        rendered (dict): The `content`, its `etag` and the `next_publish`
+            date that may change it.
+        content_type (str): The content type of the response.
+        max_age (int): The `max-age` of the response, in seconds, which is
+            capped at `next_publish`.
+        last_modified (datetime.datetime, optional): Defaults to None. When
+            the content last changed.
+
+    Returns:
+        HttpResponse: The response, marked `public`.
+    """
+
+    response = get_conditional_response(
+        request,
+        etag = rendered["etag"],
+        last_modified = last_modified and int(last_modified.timestamp())
+    )
+    if response is None:
+        response = HttpResponse(rendered["content"], content_type=content_type)
+    response["ETag"] = rendered["etag"]
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, public=True, max_age=seconds_until(
+        rendered["next_publish"],
+        max_age
+    ))
+    return response
+
+@require_safe
+def image_rendition(request: HttpRequest, model: str, pk: int, field: str,
+        width: int, extension: str) -> HttpResponse:
+    """
+    Redirects to a stored image rendition, creating it first if it's missing.
+
+    The `picture` template tag links here for any rendition in the `srcset`
+    ladder which hasn't been made yet, so it is created on first request and
+    stored; pages rendered after that link to the file directly.
+
+    Args:
+        request (HttpRequest): The incoming request.
+        model (str): The model name of the instance, such as "article".
+        pk (int): The primary key of the instance.
+        field (str): The name of the image field, such as "image_full".
+        width (int): The width of the rendition, in pixels.
+        extension (str): The file extension of the rendition's format.
+
+    Raises:
+        Http404: Raised if the instance doesn't exist or is an Article which
+            isn't visible, or the field isn't offered in that width and
+            format.
+
+    Returns:
+        HttpResponse: A redirect to the rendition's file.
+    """
+
+    formats = {ext: name for name, ext in FORMAT_EXTENSIONS.items()}
+    if model not in IMAGE_MODELS or extension not in formats:
+        raise Http404
+    queryset = IMAGE_MODELS[model].objects.all()
+    if queryset.model is Article:
+        # Visitors can't make images of hidden or scheduled Articles.
+        queryset = Article.get_available_articles()
+    instance = get_object_or_404(queryset, pk=pk)
+    rendition = ImageRendition.generate(
+        instance, field, width, formats[extension]
+    )
+    if rendition is None:
+        raise Http404
+    return redirect(rendition.file.url)
+
+@require_safe
+def article_audio(request: HttpRequest, series: str, slug: str) -> HttpResponse:
+    """
+    Serves the audio of a visible Article, supporting ranges so players can
+    seek. See `articles.media.serve_file`.
+
+    Args:
+        request (HttpRequest): The incoming request.
+        series (str): The slug of the Article's Series.
+        slug (str): The slug of the Article.
+
+    Raises:
+        Http404: Raised if the Article isn't visible or has no audio.
+
+    Returns:
+        HttpResponse: The audio, or part of it.
+    """
+
+    #pylint: disable=E1101
+    article = get_object_or_404(
+        Article.get_available_articles(),
+        series__slug = series,
+        slug = slug
+    )
+    if not article.audio:
+        raise Http404
+    return serve_file(request, article.audio)